@@ -102,6 +102,17 @@ DATABASES = {
     }
 }
 
+# Shared by every web worker and the process_tasks worker: a bump of a
+# user's recommendation generation (or any cached count) must reach all
+# of them, which a per-process LocMemCache cannot do. Create the table
+# with `python manage.py createcachetable`; Redis or Memcached work too.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'library_cache',
+    }
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -151,6 +162,36 @@ if DEBUG:
         os.path.join(BASE_DIR, 'static'),
     ]
 
+# Recommendation indexes (rebuilt by background tasks)
+CO_BORROW_INDEX_PATH = os.path.join(BASE_DIR, 'indexes', 'co_borrow.npz')
+CO_BORROW_SIMILARITY = 'cosine'  # or 'jaccard'
+
+# How often the in-process search index checks for other workers' edits
+SEARCH_INDEX_REFRESH_SECONDS = 5
+# Build the search and suggest indexes in the background at server start
+SEARCH_INDEX_WARMUP = True
+
+# QR codes: inline base64 PNGs in API responses and Transaction.qr_data.
+# Turn off once clients load images from the returned qr_image_url instead
+QR_INLINE_BASE64 = True
+QR_CACHE_SIZE = 1024  # rendered images memoized per process
+QR_WORKERS = 1  # processes used by background book QR generation
+REPORT_MUTABLE_TTL = 600  # seconds a PDF report of a range still open is reused
+
+# Cold django.setup() + URLconf load limits (manage.py check_import_budget)
+IMPORT_TIME_BUDGET_MS = 1000
+IMPORT_BUDGET_HEAVY_MODULES = ('numpy', 'pandas', 'scipy', 'sklearn', 'weasyprint')
+
+# notifications/stream/ (SSE, served by an ASGI server such as uvicorn)
+# DatabaseBroker shares events between web workers and process_tasks
+# through the StreamEvent table (one poll per process per interval);
+# RedisBroker does the same over Redis pub/sub. LocalBroker only reaches
+# clients of the publishing process: tests and single-process runs only.
+NOTIFICATION_STREAM_BROKER = 'library.stream_utils.DatabaseBroker'
+NOTIFICATION_STREAM_POLL_INTERVAL = 1  # seconds between DatabaseBroker polls
+NOTIFICATION_STREAM_REDIS_URL = None
+NOTIFICATION_STREAM_KEEPALIVE = 25  # seconds between keepalive comments
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -222,5 +263,14 @@ EMAIL_HOST_USER = 'infinitum.library.ask@gmail.com'
 EMAIL_HOST_PASSWORD = 'kvhg pyhu kknp uscy'
 DEFAULT_FROM_EMAIL = 'Infinitum Library <noreply@infinitum-library.com>'
 
+# Outbound mail queue (OutboundEmail rows drained by a background task)
+# Set OUTBOX_EMAIL_BACKEND to 'django.core.mail.backends.filebased.EmailBackend'
+# to write queued mail to EMAIL_FILE_PATH instead; tests use locmem
+OUTBOX_EMAIL_BACKEND = None  # None: use EMAIL_BACKEND
+EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'logs', 'emails')
+OUTBOX_BATCH_SIZE = 100
+OUTBOX_MAX_ATTEMPTS = 6
+OUTBOX_RETRY_BASE_SECONDS = 60  # doubled after every failed attempt
+
 # Background tasks
 BACKGROUND_TASK_RUN_ASYNC = True
@@ -1,6 +1,9 @@
 # library/apps.py
 from django.apps import AppConfig
 import logging
+import os
+import sys
+import threading
 
 logger = logging.getLogger(__name__)
 
@@ -17,31 +20,41 @@ class LibraryConfig(AppConfig):
         except Exception as e:
             logger.error(f"Error loading signals: {e}")
 
-        # Background tasks - ONLY QR cleanup remains
+        from . import checks  # noqa: F401 - registers the system checks
+
+        # Build the in-process search/suggest indexes before the first query
+        from django.conf import settings
+        if getattr(settings, 'SEARCH_INDEX_WARMUP', True) and self._serving_requests():
+            threading.Thread(target=self._warm_search_indexes, daemon=True).start()
+
+        # Periodic background tasks are scheduled by the task worker
+        # (or `manage.py schedule_tasks`), not by every web worker and command
+        if self._running_task_worker():
+            try:
+                from .tasks import schedule_periodic_tasks
+                schedule_periodic_tasks()
+            except Exception as e:
+                logger.error(f"Error scheduling background tasks: {e}")
+
+    @staticmethod
+    def _serving_requests():
+        """True in a process that will serve HTTP requests"""
+        command = os.path.basename(sys.argv[0]) if sys.argv else ''
+        if command == 'manage.py':
+            # Only the autoreloader's child actually serves
+            return sys.argv[1:2] == ['runserver'] and os.environ.get('RUN_MAIN') == 'true'
+        return command in ('gunicorn', 'uvicorn', 'daphne', 'uwsgi', 'hypercorn')
+
+    @staticmethod
+    def _running_task_worker():
+        """True in the django-background-tasks worker (manage.py process_tasks)"""
+        return sys.argv[1:2] == ['process_tasks']
+
+    @staticmethod
+    def _warm_search_indexes():
         try:
-            from . import tasks
-            # Existing QR cleanup task only
-            tasks.cleanup_expired_qrs_task()
-
-            logger.info("Background tasks scheduled successfully")
-        except Exception as e:
-            logger.error(f"Error scheduling background tasks: {e}")
-
-        # Start automated notification tasks
-        try:
-            from . import tasks
-            if not self.__class__.tasks_started:
-                tasks.check_due_date_reminders()
-                tasks.check_overdue_books()
-                self.__class__.tasks_started = True
-                logger.info("✅ Automated notification tasks started")
-        except Exception as e:
-            logger.error(f"Error starting automated tasks: {e}")
-
-        # Start waitlist cleanup task
-        try:
-            from . import tasks
-            tasks.cleanup_waitlist_task()
-            logger.info("Waitlist cleanup task scheduled")
+            from .search_utils import BookSearchIndex, SuggestIndex
+            BookSearchIndex.get()
+            SuggestIndex.get()
         except Exception as e:
-            logger.error(f"Error scheduling waitlist task: {e}")
+            logger.error(f"Error building search indexes: {e}")
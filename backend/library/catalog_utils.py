@@ -0,0 +1,52 @@
+# library/catalog_utils.py
+import base64
+import hashlib
+import json
+import logging
+
+from django.db.models import Count, Max
+from django.utils.http import quote_etag
+
+from .models import Book
+
+logger = logging.getLogger(__name__)
+
+
+def get_catalog_stamp():
+    """
+    Version stamp of the catalog as (last_modified, book_count)
+
+    Saving a book moves last_modified; deleting one changes the count.
+    """
+    stats = Book.objects.aggregate(last_modified=Max('updated_at'), count=Count('id'))
+    return stats['last_modified'], stats['count']
+
+
+def catalog_etag(stamp, *parts):
+    """Strong ETag for a catalog response derived from the stamp and request parts"""
+    last_modified, count = stamp
+    raw = '|'.join(
+        [last_modified.isoformat() if last_modified else '', str(count)]
+        + [str(part) for part in parts]
+    )
+    return quote_etag(hashlib.sha1(raw.encode()).hexdigest())
+
+
+def encode_cursor(title, book_id):
+    """Opaque cursor pointing just after the (title, id) of a book"""
+    raw = json.dumps([title, book_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor from encode_cursor(), raising ValueError if malformed
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        title, book_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if not isinstance(title, str) or not isinstance(book_id, int):
+        raise ValueError('Invalid cursor')
+    return title, book_id
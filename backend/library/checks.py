@@ -0,0 +1,26 @@
+# library/checks.py
+from django.conf import settings
+from django.core.checks import Warning, register
+
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register()
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Recommendation generations and cache stats must be shared by every
+    web worker and the task worker, or one process's bump never reaches
+    the entries another one serves
+    """
+    backend = settings.CACHES.get('default', {}).get('BACKEND', '')
+    if backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [Warning(
+        f"The default cache ({backend}) is private to each process",
+        hint="Use a cache shared by all workers (DatabaseCache, Redis or Memcached) "
+             "so recommendation invalidations and cache stats reach every process.",
+        id='library.W001',
+    )]
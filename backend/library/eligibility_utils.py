@@ -0,0 +1,115 @@
+# library/eligibility_utils.py
+import logging
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import DecimalField, FilteredRelation, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import Book, Transaction, UserProfile
+
+logger = logging.getLogger(__name__)
+
+ELIGIBILITY_CACHE_TIMEOUT = 300
+MAX_BATCH_BOOKS = 50
+
+# Transactions in these states no longer hold a copy or count towards the limit
+CLOSED_STATUSES = ('cancelled', 'returned', 'expired')
+
+
+def _cache_key(user_id):
+    return f"user_{user_id}_borrowing_summary"
+
+
+def get_borrowing_summary(user_id, use_cache=True):
+    """
+    Everything borrow eligibility depends on for one user, read in a
+    single query: {'borrowing_limit', 'unpaid_fines', 'active_count',
+    'active_book_ids'}. Cached until the user's transactions change.
+    Raises UserProfile.DoesNotExist.
+    """
+    if use_cache:
+        summary = cache.get(_cache_key(user_id))
+        if summary is not None:
+            return summary
+
+    unpaid_fines = Transaction.objects.filter(
+        user_id=OuterRef('user_id'), fine_amount__gt=0, fine_paid=False,
+    ).order_by().values('user_id').annotate(total=Sum('fine_amount')).values('total')
+
+    # One row per active transaction (or a single row with no book)
+    rows = list(UserProfile.objects.filter(user_id=user_id).annotate(
+        active=FilteredRelation(
+            'user__transaction',
+            condition=Q(user__transaction__return_date__isnull=True)
+            & ~Q(user__transaction__status__in=CLOSED_STATUSES),
+        ),
+        unpaid_fines=Coalesce(
+            Subquery(unpaid_fines), Value(Decimal('0')),
+            output_field=DecimalField(max_digits=10, decimal_places=2)),
+    ).values_list('borrowing_limit', 'unpaid_fines', 'active__book_id'))
+    if not rows:
+        raise UserProfile.DoesNotExist(f"No profile for user {user_id}")
+
+    book_ids = [book_id for _, _, book_id in rows if book_id is not None]
+    summary = {
+        'borrowing_limit': rows[0][0],
+        'unpaid_fines': rows[0][1],
+        'active_count': len(book_ids),
+        'active_book_ids': frozenset(book_ids),
+    }
+    cache.set(_cache_key(user_id), summary, ELIGIBILITY_CACHE_TIMEOUT)
+    return summary
+
+
+def invalidate_borrowing_summary(user_id):
+    cache.delete(_cache_key(user_id))
+
+
+def check_eligibility(book, summary):
+    """
+    Whether the user behind `summary` may reserve `book`. Returns a dict
+    with 'eligible' and, when not, a 'reason' code and an 'error' message
+    (plus the flags borrow_book has always sent for that case).
+    """
+    if book.effectively_available <= 0:
+        return {'eligible': False, 'reason': 'unavailable',
+                'error': 'No copies available for reservation'}
+
+    if summary['unpaid_fines'] > 0:
+        return {'eligible': False, 'reason': 'unpaid_fines',
+                'error': f"You have outstanding fines of ₹{summary['unpaid_fines']}. "
+                         f"Please pay before reserving more books.",
+                'unpaid_fines': summary['unpaid_fines'],
+                'block_reservation': True}
+
+    if book.id in summary['active_book_ids']:
+        return {'eligible': False, 'reason': 'already_borrowed',
+                'error': 'You already have an active reservation or borrow for this book.',
+                'already_borrowed': True}
+
+    if summary['active_count'] >= summary['borrowing_limit']:
+        return {'eligible': False, 'reason': 'limit_reached',
+                'error': f"Borrowing limit reached. You can only have {summary['borrowing_limit']} "
+                         f"active books (including reservations) at a time."}
+
+    return {'eligible': True}
+
+
+def batch_eligibility(user_id, book_ids):
+    """
+    check_eligibility() for many books with one summary lookup and one
+    Book query. Returns (summary, {book_id: result}); unknown ids are
+    reported as 'not_found'.
+    """
+    summary = get_borrowing_summary(user_id)
+    books = Book.objects.filter(id__in=book_ids).only(
+        'id', 'available_copies', 'reserved_copies').in_bulk()
+    results = {}
+    for book_id in book_ids:
+        book = books.get(book_id)
+        if book is None:
+            results[book_id] = {'eligible': False, 'reason': 'not_found', 'error': 'Book not found'}
+        else:
+            results[book_id] = check_eligibility(book, summary)
+    return summary, results
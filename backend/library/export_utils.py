@@ -0,0 +1,211 @@
+# library/export_utils.py
+import csv
+import io
+import logging
+from datetime import date
+from itertools import islice
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # Parquet exports are only offered when pyarrow is installed
+    pyarrow = None
+
+logger = logging.getLogger(__name__)
+
+EXPORT_CONTENT_TYPES = {
+    'json': 'application/json',
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+}
+EXPORT_CHUNK_SIZE = 2000
+
+
+class ExportJSONEncoder(DjangoJSONEncoder):
+    """DjangoJSONEncoder, but decimals stay numbers like in the JSON API"""
+
+    def default(self, o):
+        from decimal import Decimal
+        if isinstance(o, Decimal):
+            return float(o)
+        return super().default(o)
+
+
+def iter_json_array(rows):
+    """
+    Yield a JSON array one row at a time so the whole result set is
+    never held in memory
+    """
+    encoder = ExportJSONEncoder()
+    yield '['
+    first = True
+    for row in rows:
+        yield ('' if first else ',') + '\n' + encoder.encode(row)
+        first = False
+    yield '\n]\n'
+
+
+def streaming_json_response(rows, filename):
+    """Stream `rows` (dicts) as a downloadable JSON array"""
+    response = StreamingHttpResponse(iter_json_array(rows), content_type='application/json')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def export_formats():
+    """Formats streaming_export_response can produce in this environment"""
+    return [fmt for fmt in EXPORT_CONTENT_TYPES if fmt != 'parquet' or pyarrow is not None]
+
+
+def parse_date_range(params, default_start=None, default_end=None):
+    """
+    (start, end) dates from the ?start_date=/?end_date= (YYYY-MM-DD)
+    parameters, falling back to the defaults. Raises ValueError.
+    """
+    start, end = default_start, default_end
+    if params.get('start_date'):
+        start = date.fromisoformat(params['start_date'])
+    if params.get('end_date'):
+        end = date.fromisoformat(params['end_date'])
+    if start and end and start > end:
+        raise ValueError('start_date must not be after end_date')
+    return start, end
+
+
+def _batches(rows, size):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+class _Echo:
+    """File-like object for csv.writer that hands back what it is given"""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(header, rows):
+    """Yield CSV text, one chunk per EXPORT_CHUNK_SIZE rows"""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(header)
+    for batch in _batches(rows, EXPORT_CHUNK_SIZE):
+        yield ''.join(writer.writerow(row) for row in batch)
+
+
+def iter_jsonl(header, rows):
+    """Yield one JSON object per line, one chunk per EXPORT_CHUNK_SIZE rows"""
+    encoder = ExportJSONEncoder()
+    for batch in _batches(rows, EXPORT_CHUNK_SIZE):
+        yield ''.join(encoder.encode(dict(zip(header, row))) + '\n' for row in batch)
+
+
+class _ParquetSink(io.RawIOBase):
+    """Write-only stream whose output is collected and drained between row groups"""
+
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _resolve_field(queryset, lookup):
+    """Model field (or annotation output field) behind a values_list() lookup"""
+    annotation = queryset.query.annotations.get(lookup)
+    if annotation is not None:
+        return annotation.output_field
+    model, field = queryset.model, None
+    for part in lookup.split('__'):
+        field = model._meta.get_field(part)
+        if field.is_relation:
+            model = field.related_model
+    if field.is_relation and not field.many_to_many:
+        field = field.target_field
+    return field
+
+
+def _arrow_type(field):
+    internal_type = field.get_internal_type()
+    if internal_type in ('AutoField', 'BigAutoField', 'SmallAutoField', 'IntegerField',
+                         'BigIntegerField', 'SmallIntegerField', 'PositiveIntegerField',
+                         'PositiveBigIntegerField', 'PositiveSmallIntegerField'):
+        return pyarrow.int64()
+    if internal_type == 'BooleanField':
+        return pyarrow.bool_()
+    if internal_type == 'DecimalField':
+        return pyarrow.decimal128(field.max_digits, field.decimal_places)
+    if internal_type == 'FloatField':
+        return pyarrow.float64()
+    if internal_type == 'DateTimeField':
+        return pyarrow.timestamp('us', tz='UTC')
+    if internal_type == 'DateField':
+        return pyarrow.date32()
+    return pyarrow.string()
+
+
+def iter_parquet(queryset, header, lookups, rows):
+    """
+    Yield a Parquet file one row group (EXPORT_CHUNK_SIZE rows) at a time.
+    Column types come from the model fields behind `lookups`.
+    """
+    schema = pyarrow.schema([
+        (name, _arrow_type(_resolve_field(queryset, lookup)))
+        for name, lookup in zip(header, lookups)
+    ])
+    sink = _ParquetSink()
+    with pyarrow.parquet.ParquetWriter(sink, schema) as writer:
+        for batch in _batches(rows, EXPORT_CHUNK_SIZE):
+            columns = list(zip(*batch))
+            writer.write_table(pyarrow.Table.from_arrays(
+                [pyarrow.array(column, type=field.type) for column, field in zip(columns, schema)],
+                schema=schema))
+            yield sink.drain()
+    yield sink.drain()
+
+
+def streaming_export_response(queryset, columns, fmt, filename):
+    """
+    Stream `queryset` as a CSV, JSON lines, Parquet or JSON download.
+
+    `columns` is a sequence of (header, lookup) pairs; rows are read with
+    values_list(*lookups).iterator() so only one chunk is held in memory.
+    """
+    if fmt not in export_formats():
+        raise ValueError(f"Unsupported export format: {fmt}")
+    header = [name for name, _ in columns]
+    lookups = [lookup for _, lookup in columns]
+    rows = queryset.values_list(*lookups).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+    if fmt == 'csv':
+        content = iter_csv(header, rows)
+    elif fmt == 'jsonl':
+        content = iter_jsonl(header, rows)
+    elif fmt == 'parquet':
+        content = iter_parquet(queryset, header, lookups, rows)
+    else:
+        content = iter_json_array(dict(zip(header, row)) for row in rows)
+
+    response = StreamingHttpResponse(content, content_type=EXPORT_CONTENT_TYPES[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{fmt}"'
+    return response
@@ -0,0 +1,264 @@
+# library/import_utils.py
+import csv
+import json
+import logging
+import os
+from collections import deque
+
+from django.db import connection, transaction
+from django.db.models import F
+from django.db.models.functions import Least
+
+from .models import Book
+
+logger = logging.getLogger(__name__)
+
+IMPORT_FORMATS = ('json', 'jsonl', 'csv')
+
+# Always written on insert and on update
+BOOK_CORE_FIELDS = ('title', 'author', 'genre', 'publication_year')
+# Only overwritten on existing books when the record provides them
+BOOK_OPTIONAL_FIELDS = (
+    'total_copies', 'description', 'available_copies', 'cover_image', 'qr_code',
+    'is_academic', 'subject_code',
+)
+
+_JSON_WHITESPACE = ' \t\r\n'
+
+
+def detect_format(path):
+    extension = os.path.splitext(path)[1].lower().lstrip('.')
+    if extension == 'ndjson':
+        return 'jsonl'
+    if extension not in IMPORT_FORMATS:
+        raise ValueError(f"Cannot tell the format of {path}, pass --format")
+    return extension
+
+
+def iter_json_array(fp, chunk_size=1 << 16):
+    """
+    Yield the elements of a top-level JSON array one at a time, reading
+    `fp` in chunks - memory use is bounded by the largest element.
+    """
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = '', 0, False
+
+    def fill():
+        nonlocal buffer, pos, eof
+        chunk = fp.read(chunk_size)
+        if not chunk:
+            eof = True
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+    def skip(chars):
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in chars:
+                pos += 1
+            if pos < len(buffer) or eof:
+                return
+            fill()
+
+    skip(_JSON_WHITESPACE)
+    if pos >= len(buffer) or buffer[pos] != '[':
+        raise ValueError('Expected a JSON array')
+    pos += 1
+
+    while True:
+        skip(_JSON_WHITESPACE + ',')
+        if pos >= len(buffer):
+            raise ValueError('Unterminated JSON array')
+        if buffer[pos] == ']':
+            return
+        while True:
+            try:
+                element, end = decoder.raw_decode(buffer, pos)
+                break
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                fill()
+        pos = end
+        yield element
+
+
+def iter_book_records(fp, fmt):
+    """
+    Stream raw book records from a JSON array, JSON lines or CSV file.
+    Django fixture entries are unwrapped and non-book models skipped.
+    """
+    if fmt == 'json':
+        records = iter_json_array(fp)
+    elif fmt == 'jsonl':
+        records = (json.loads(line) for line in fp if line.strip())
+    elif fmt == 'csv':
+        records = csv.DictReader(fp)
+    else:
+        raise ValueError(f"Unknown import format: {fmt}")
+
+    for record in records:
+        if 'fields' in record:
+            if record.get('model', 'library.book') != 'library.book':
+                continue
+            record = record['fields']
+        yield record
+
+
+def _clean_int(record, field, default=None, minimum=0):
+    value = record.get(field)
+    if value in (None, ''):
+        if default is None:
+            raise ValueError(f"{field} is required")
+        return default
+    value = int(value)
+    if value < minimum:
+        raise ValueError(f"{field} must be at least {minimum}")
+    return value
+
+
+def _clean_text(record, field, max_length=None, required=False):
+    value = record.get(field)
+    value = value.strip() if isinstance(value, str) else value
+    if not value:
+        if required:
+            raise ValueError(f"{field} is required")
+        return None
+    if max_length and len(value) > max_length:
+        raise ValueError(f"{field} is longer than {max_length} characters")
+    return value
+
+
+def validate_book_record(record, genres):
+    """
+    Clean one raw record. Returns (row, provided fields) where row holds
+    Book field values, or raises ValueError. `genres` maps lower-cased
+    genre names to GENRE_CHOICES values.
+    """
+    isbn = str(record.get('isbn') or '').replace('-', '').replace(' ', '').upper()
+    if not isbn:
+        raise ValueError("isbn is required")
+    if len(isbn) > 13 or not isbn.rstrip('X').isdigit():
+        raise ValueError(f"invalid isbn {isbn!r}")
+
+    genre = genres.get(str(record.get('genre') or '').strip().lower())
+    if genre is None:
+        raise ValueError(f"unknown genre {record.get('genre')!r}")
+
+    row = {
+        'isbn': isbn,
+        'title': _clean_text(record, 'title', 200, required=True),
+        'author': _clean_text(record, 'author', 100, required=True),
+        'genre': genre,
+        'publication_year': _clean_int(record, 'publication_year', minimum=-3000),
+        'total_copies': _clean_int(record, 'total_copies', default=1),
+    }
+    provided = set()
+    for field in ('total_copies', 'available_copies'):
+        if record.get(field) not in (None, ''):
+            provided.add(field)
+    # New books start with every copy available, like Book.save does
+    row['available_copies'] = min(
+        _clean_int(record, 'available_copies', default=row['total_copies']),
+        row['total_copies'])
+
+    for field, max_length in (('description', None), ('cover_image', 100),
+                              ('qr_code', 100), ('subject_code', 20)):
+        if field in record:
+            row[field] = _clean_text(record, field, max_length)
+            provided.add(field)
+    if record.get('is_academic') not in (None, ''):
+        value = record['is_academic']
+        row['is_academic'] = value if isinstance(value, bool) else str(value).lower() in ('1', 'true', 'yes')
+        provided.add('is_academic')
+
+    return row, frozenset(provided)
+
+
+def validate_book_batch(start, records, genres):
+    """
+    Validate a batch (process pool worker). Returns (valid, errors) with
+    valid = [(row, provided)] and errors = [(record number, message)].
+    """
+    valid, errors = [], []
+    for number, record in enumerate(records, start):
+        try:
+            valid.append(validate_book_record(record, genres))
+        except (ValueError, TypeError) as e:
+            errors.append((number, str(e)))
+    return valid, errors
+
+
+def genre_lookup():
+    return {value.lower(): value for value, _ in Book.GENRE_CHOICES}
+
+
+def upsert_books(valid):
+    """
+    Insert or update a batch of validated rows keyed on isbn, one
+    bulk_create(update_conflicts=True) per distinct set of provided
+    fields. A provided total_copies is written separately, one UPDATE per
+    value, so stock can be clamped to it. Returns the number of rows written.
+    """
+    # Later duplicates of an isbn win, as they would with sequential saves
+    latest = {row['isbn']: (row, provided) for row, provided in valid}
+
+    groups, totals = {}, {}
+    for row, provided in latest.values():
+        groups.setdefault(provided - {'total_copies'}, []).append(Book(**row))
+        if 'total_copies' in provided:
+            totals.setdefault(row['total_copies'], []).append(row['isbn'])
+
+    with transaction.atomic():
+        for provided, books in groups.items():
+            options = {
+                'update_conflicts': True,
+                'update_fields': list(BOOK_CORE_FIELDS) + sorted(provided) + ['updated_at'],
+            }
+            # MySQL upserts on any unique key and rejects an explicit target
+            if connection.features.supports_update_conflicts_with_target:
+                options['unique_fields'] = ['isbn']
+            Book.objects.bulk_create(books, **options)
+        # Shrinking stock must not leave more copies on the shelf than exist
+        for total, isbns in totals.items():
+            Book.objects.filter(isbn__in=isbns).update(
+                total_copies=total,
+                available_copies=Least(F('available_copies'), total),
+                reserved_copies=Least(F('reserved_copies'), total),
+            )
+    return len(latest)
+
+
+def iter_validated_batches(records, batch_size, executor=None, genres=None, start=0):
+    """
+    Group `records` into batches and validate them, in an executor when
+    given. At most a few batches are in flight, so huge files stream.
+    Yields (records consumed, valid, errors) in file order.
+    """
+    genres = genres or genre_lookup()
+    pending = deque()
+    max_in_flight = (getattr(executor, '_max_workers', 1) or 1) * 2
+
+    def batches():
+        batch, number = [], start
+        for record in records:
+            batch.append(record)
+            if len(batch) >= batch_size:
+                yield number, batch
+                number += len(batch)
+                batch = []
+        if batch:
+            yield number, batch
+
+    for number, batch in batches():
+        if executor is None:
+            yield (len(batch), *validate_book_batch(number, batch, genres))
+            continue
+        pending.append((len(batch), executor.submit(validate_book_batch, number, batch, genres)))
+        if len(pending) >= max_in_flight:
+            size, future = pending.popleft()
+            yield (size, *future.result())
+
+    while pending:
+        size, future = pending.popleft()
+        yield (size, *future.result())
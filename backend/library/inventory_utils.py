@@ -0,0 +1,151 @@
+# library/inventory_utils.py
+import logging
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .eligibility_utils import invalidate_borrowing_summary
+from .models import Book, Transaction
+from .stream_utils import publish_event
+
+logger = logging.getLogger(__name__)
+
+# Copy accounting is done with single conditional UPDATEs, never with
+# read-modify-write saves: the WHERE clause makes the database refuse a
+# change that would over-reserve or over-issue, and the rowcount tells
+# the caller whether it happened.
+
+# available_copies - reserved_copies > 0
+HAS_FREE_COPY = Q(available_copies__gt=F('reserved_copies'))
+
+
+def _update_copies(book_id, condition, **changes):
+    """Apply `changes` to one book if `condition` holds. Returns success."""
+    return Book.objects.filter(condition, id=book_id).update(
+        updated_at=timezone.now(), **changes) == 1
+
+
+def reserve_copy(book_id):
+    """Hold a free copy for a reservation"""
+    return _update_copies(
+        book_id, HAS_FREE_COPY, reserved_copies=F('reserved_copies') + 1)
+
+
+def release_reserved_copy(book_id):
+    """Give back a reservation's copy (cancelled or expired)"""
+    return _update_copies(
+        book_id, Q(reserved_copies__gt=0), reserved_copies=F('reserved_copies') - 1)
+
+
+def issue_reserved_copy(book_id):
+    """Hand out the copy a reservation was holding"""
+    return _update_copies(
+        book_id, Q(reserved_copies__gt=0, available_copies__gt=0),
+        available_copies=F('available_copies') - 1,
+        reserved_copies=F('reserved_copies') - 1)
+
+
+def issue_copy(book_id):
+    """Hand out a free copy without a prior reservation"""
+    return _update_copies(
+        book_id, HAS_FREE_COPY, available_copies=F('available_copies') - 1)
+
+
+def return_copy(book_id):
+    """Put a returned copy back on the shelf (never above total_copies)"""
+    returned = _update_copies(
+        book_id, Q(available_copies__lt=F('total_copies')),
+        available_copies=F('available_copies') + 1)
+    if not returned:
+        logger.warning(f"Book {book_id} already has all copies available, return not counted")
+    return returned
+
+
+def _publish_reservation(reservation):
+    publish_event(reservation.user_id, 'reservation', {
+        'transaction_id': reservation.id,
+        'book_id': reservation.book_id,
+        'status': reservation.status,
+    }, counts=('reservations',))
+
+
+def create_reservation(book, user, due_date):
+    """
+    Reserve a copy of `book` for `user`. Returns the pending Transaction,
+    or None when no copy is free.
+    """
+    with transaction.atomic():
+        if not reserve_copy(book.id):
+            return None
+        reservation = Transaction.objects.create(
+            book=book, user=user, due_date=due_date, status='pending')
+        _publish_reservation(reservation)
+        return reservation
+
+
+def create_direct_issue(book, user, due_date):
+    """Issue a free copy straight away. Returns the Transaction or None."""
+    with transaction.atomic():
+        if not issue_copy(book.id):
+            return None
+        return Transaction.objects.create(book=book, user=user, due_date=due_date)
+
+
+def end_reservation(reservation, status='cancelled'):
+    """
+    Move a pending reservation to `status` ('cancelled' or 'expired') and
+    release its copy. False if another request already processed it.
+    """
+    with transaction.atomic():
+        if not Transaction.objects.filter(id=reservation.id, status='pending').update(status=status):
+            return False
+        release_reserved_copy(reservation.book_id)
+    invalidate_borrowing_summary(reservation.user_id)
+    reservation.status = status
+    _publish_reservation(reservation)
+    return True
+
+
+def issue_reservation(reservation, due_date):
+    """
+    Convert a pending reservation into a loan. False if it was already
+    processed or its copy is no longer on the shelf.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        if not Transaction.objects.filter(id=reservation.id, status='pending').update(
+                status='borrowed', issued_at=now, due_date=due_date):
+            return False
+        if not issue_reserved_copy(reservation.book_id):
+            transaction.set_rollback(True)
+            return False
+    invalidate_borrowing_summary(reservation.user_id)
+    reservation.status = 'borrowed'
+    reservation.issued_at = now
+    reservation.due_date = due_date
+    _publish_reservation(reservation)
+    return True
+
+
+def complete_return(loan, status=None):
+    """
+    Record the return of a loan and put its copy back, storing the fine
+    as Transaction.save() would (and `status` when given). False if it
+    was already returned.
+    """
+    changes = {'return_date': timezone.now()}
+    if not loan.fine_paid:
+        loan.return_date = changes['return_date']
+        changes['fine_amount'] = loan.calculate_fine()
+    if status is not None:
+        changes['status'] = status
+
+    with transaction.atomic():
+        if not Transaction.objects.filter(id=loan.id, return_date__isnull=True).update(**changes):
+            return False
+        return_copy(loan.book_id)
+    invalidate_borrowing_summary(loan.user_id)
+    for field, value in changes.items():
+        setattr(loan, field, value)
+    return True
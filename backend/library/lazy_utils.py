@@ -0,0 +1,38 @@
+# library/lazy_utils.py
+import importlib
+import logging
+import types
+
+logger = logging.getLogger(__name__)
+
+
+class LazyModule(types.ModuleType):
+    """
+    Stand-in for a module that is only imported on first attribute access,
+    so heavy libraries (numpy, scipy, sklearn, qrcode...) stay out of
+    worker boot and management commands that never use them.
+    """
+
+    def _load(self):
+        module = self.__dict__.get('_module')
+        if module is None:
+            # import_module holds the import lock, so racing threads get the same module
+            module = importlib.import_module(self.__name__)
+            self.__dict__['_module'] = module
+            logger.debug(f"Lazily imported {self.__name__}")
+        return module
+
+    def __getattr__(self, name):
+        return getattr(self._load(), name)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = 'loaded' if '_module' in self.__dict__ else 'not loaded'
+        return f"<lazy module {self.__name__!r} ({state})>"
+
+
+def lazy_module(name):
+    """`np = lazy_module('numpy')` - imported the first time `np.<attr>` is used"""
+    return LazyModule(name)
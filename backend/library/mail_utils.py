@@ -0,0 +1,182 @@
+# library/mail_utils.py
+import logging
+import uuid
+from datetime import timedelta
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.db.models import Q
+from django.template.loader import get_template
+from django.utils import timezone
+from django.utils.html import strip_tags
+
+from .models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+# Notification types sent with the critical (red) email template
+CRITICAL_NOTIFICATION_TYPES = {'overdue', 'fine'}
+
+
+@lru_cache(maxsize=32)
+def get_compiled_template(name):
+    """Load and compile an email template once per process"""
+    return get_template(name)
+
+
+def render_email(email):
+    """(plain text, html or None) body of an OutboundEmail"""
+    if not email.template:
+        return email.body, None
+    html = get_compiled_template(email.template).render(email.context)
+    return strip_tags(html), html
+
+
+def _schedule_drain():
+    try:
+        from .tasks import drain_outbox_task
+        drain_outbox_task(schedule=0)
+    except Exception as e:
+        logger.warning(f"Could not schedule the mail queue drain, the periodic run will send it: {e}")
+
+
+def queue_email(to_email, subject, body='', template='', context=None, urgent=False):
+    """
+    Add one email to the outbox. With `urgent` (OTPs, password resets) a
+    drain is scheduled right after the surrounding transaction commits.
+    """
+    email = OutboundEmail.objects.create(
+        to_email=to_email,
+        subject=subject,
+        body=body,
+        template=template,
+        context=context or {},
+    )
+    if urgent:
+        transaction.on_commit(_schedule_drain)
+    return email
+
+
+def queue_notification_emails(notifications):
+    """
+    Queue the notification email for each Notification (with its user
+    loaded). Users without an email address are skipped.
+    """
+    emails = [
+        OutboundEmail(
+            to_email=notification.user.email,
+            subject=notification.title,
+            template='critical_notification_email.html'
+            if notification.notification_type in CRITICAL_NOTIFICATION_TYPES
+            else 'notification_email.html',
+            context={
+                'notification': {
+                    'notification_type': notification.notification_type,
+                    'get_notification_type_display': notification.get_notification_type_display(),
+                    'title': notification.title,
+                    'message': notification.message,
+                    'action_url': notification.action_url,
+                },
+                'current_year': timezone.now().year,
+            },
+        )
+        for notification in notifications if notification.user.email
+    ]
+    OutboundEmail.objects.bulk_create(emails, batch_size=500)
+    return len(emails)
+
+
+def _claim_batch(batch_size, lease):
+    """
+    Claim up to `batch_size` due emails for this worker with a single
+    conditional UPDATE. Rows stuck in 'sending' past their lease (a worker
+    died) are claimable again.
+    """
+    now = timezone.now()
+    due = Q(status='pending') | Q(status='sending')
+    candidates = list(OutboundEmail.objects.filter(
+        due, next_attempt_at__lte=now
+    ).order_by('next_attempt_at').values_list('id', flat=True)[:batch_size])
+    if not candidates:
+        return []
+
+    token = uuid.uuid4().hex
+    OutboundEmail.objects.filter(
+        due, id__in=candidates, next_attempt_at__lte=now
+    ).update(status='sending', claim_token=token, next_attempt_at=now + lease)
+    return list(OutboundEmail.objects.filter(claim_token=token, status='sending'))
+
+
+def _retry_delay(attempts):
+    base = getattr(settings, 'OUTBOX_RETRY_BASE_SECONDS', 60)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), 6 * 3600))
+
+
+def _mark_failed_attempt(email, error, now):
+    email.attempts += 1
+    email.last_error = str(error)[:2000]
+    if email.attempts >= getattr(settings, 'OUTBOX_MAX_ATTEMPTS', 6):
+        email.status = 'failed'
+        logger.error(f"Giving up on email {email.id} to {email.to_email}: {error}")
+    else:
+        email.status = 'pending'
+        email.next_attempt_at = now + _retry_delay(email.attempts)
+
+
+def drain_outbox(batch_size=None, max_batches=None, backend=None):
+    """
+    Send due outbox emails over one reused mail connection per batch.
+
+    Failed messages are retried with exponential backoff up to
+    OUTBOX_MAX_ATTEMPTS. Returns (sent, failed attempts).
+    """
+    batch_size = batch_size or getattr(settings, 'OUTBOX_BATCH_SIZE', 100)
+    backend = backend or getattr(settings, 'OUTBOX_EMAIL_BACKEND', None)
+    lease = timedelta(minutes=10)
+    sent = failed = batches = 0
+
+    while max_batches is None or batches < max_batches:
+        emails = _claim_batch(batch_size, lease)
+        if not emails:
+            break
+        batches += 1
+        now = timezone.now()
+
+        connection = get_connection(backend=backend)
+        try:
+            connection.open()
+        except Exception as e:
+            logger.error(f"Mail connection failed: {e}")
+            for email in emails:
+                _mark_failed_attempt(email, e, now)
+            failed += len(emails)
+        else:
+            try:
+                for email in emails:
+                    try:
+                        text, html = render_email(email)
+                        message = EmailMultiAlternatives(
+                            email.subject, text, settings.DEFAULT_FROM_EMAIL,
+                            [email.to_email], connection=connection)
+                        if html:
+                            message.attach_alternative(html, 'text/html')
+                        connection.send_messages([message])
+                    except Exception as e:
+                        _mark_failed_attempt(email, e, now)
+                        failed += 1
+                    else:
+                        email.status = 'sent'
+                        email.sent_at = timezone.now()
+                        email.attempts += 1
+                        sent += 1
+            finally:
+                connection.close()
+
+        OutboundEmail.objects.bulk_update(
+            emails, ['status', 'attempts', 'next_attempt_at', 'last_error', 'sent_at'])
+
+    if sent or failed:
+        logger.info(f"Mail queue: {sent} sent, {failed} failed attempts")
+    return sent, failed
@@ -0,0 +1,23 @@
+# management/commands/build_co_borrow_index.py
+from django.core.management.base import BaseCommand
+from library.recommendation_utils import CoBorrowIndex, rebuild_co_borrow_index
+
+
+class Command(BaseCommand):
+    help = 'Build or incrementally update the co-borrow recommendation index'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Rebuild from every transaction instead of updating incrementally')
+        parser.add_argument(
+            '--metric', choices=CoBorrowIndex.METRICS,
+            help='Similarity normalisation (defaults to CO_BORROW_SIMILARITY)')
+
+    def handle(self, *args, **options):
+        index = rebuild_co_borrow_index(full=options['full'], metric=options['metric'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Co-borrow index ({index.metric}) covers {index.n_books} book ids, '
+            f'{index.counts.nnz} entries, up to transaction {index.last_transaction_id}'
+        ))
@@ -0,0 +1,94 @@
+# management/commands/check_import_budget.py
+import os
+import re
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Run in a fresh interpreter so nothing is imported yet
+BOOT_SCRIPT = (
+    "import time\n"
+    "started = time.perf_counter()\n"
+    "import django\n"
+    "django.setup()\n"
+    "from django.urls import get_resolver\n"
+    "get_resolver().url_patterns\n"
+    "print(round((time.perf_counter() - started) * 1000))\n"
+)
+IMPORT_TIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def parse_importtime(output):
+    """[(module, self us, cumulative us, depth)] from `python -X importtime` stderr"""
+    imports = []
+    for line in output.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            imports.append((module, int(self_us), int(cumulative_us), len(indent) // 2))
+    return imports
+
+
+def import_chain(imports, index):
+    """Modules that (transitively) imported imports[index], innermost first"""
+    chain = []
+    depth = imports[index][3]
+    # importtime lists a module before the module that imported it
+    for module, _, _, module_depth in imports[index + 1:]:
+        if module_depth < depth:
+            chain.append(module)
+            depth = module_depth
+    return chain
+
+
+class Command(BaseCommand):
+    help = ('Measure a cold django.setup() plus URLconf load with python -X importtime '
+            'and fail if it exceeds the import-time budget or loads a heavy module')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--budget-ms', type=int, default=getattr(settings, 'IMPORT_TIME_BUDGET_MS', 1500),
+            help='Maximum boot time in milliseconds (default: IMPORT_TIME_BUDGET_MS)')
+        parser.add_argument(
+            '--runs', type=int, default=3,
+            help='Boot this many times and judge the fastest run')
+        parser.add_argument(
+            '--top', type=int, default=10,
+            help='Show the N most expensive top-level imports')
+
+    def handle(self, *args, **options):
+        runs = []
+        for _ in range(max(1, options['runs'])):
+            result = subprocess.run(
+                [sys.executable, '-X', 'importtime', '-c', BOOT_SCRIPT],
+                cwd=settings.BASE_DIR, env=os.environ.copy(),
+                capture_output=True, text=True)
+            if result.returncode:
+                raise CommandError(f'Boot failed:\n{result.stderr[-2000:]}')
+            runs.append((int(result.stdout.strip().splitlines()[-1]), parse_importtime(result.stderr)))
+        boot_ms, imports = min(runs, key=lambda run: run[0])
+
+        top_level = sorted(
+            (entry for entry in imports if entry[3] == 0), key=lambda entry: -entry[2])
+        self.stdout.write(f'Most expensive imports (best of {len(runs)} runs):')
+        for module, _, cumulative_us, _ in top_level[:options['top']]:
+            self.stdout.write(f'  {cumulative_us / 1000:8.1f} ms  {module}')
+
+        problems = []
+        heavy = set(getattr(settings, 'IMPORT_BUDGET_HEAVY_MODULES', ()))
+        for index, (module, _, cumulative_us, _) in enumerate(imports):
+            if module in heavy:
+                chain = ' <- '.join(import_chain(imports, index)) or 'top level'
+                problems.append(
+                    f'{module} ({cumulative_us / 1000:.0f} ms) is imported at boot via {chain}; '
+                    f'load it lazily (library.lazy_utils.lazy_module)')
+
+        if boot_ms > options['budget_ms']:
+            problems.append(f'Boot took {boot_ms} ms, over the {options["budget_ms"]} ms budget')
+
+        if problems:
+            raise CommandError('\n'.join(problems))
+        self.stdout.write(self.style.SUCCESS(
+            f'Boot took {boot_ms} ms (budget {options["budget_ms"]} ms), no heavy modules loaded'))
@@ -2,6 +2,7 @@
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 from datetime import timedelta
+from library.inventory_utils import end_reservation
 from library.models import Transaction
 
 class Command(BaseCommand):
@@ -14,5 +15,8 @@ class Command(BaseCommand):
             qr_generated_at__lte=timezone.now() - timedelta(hours=24)
         )
         
-        count = expired_transactions.update(status='cancelled')
-        self.stdout.write(f'Cancelled {count} expired QR transactions')
\ No newline at end of file
+        # Expire each one and release its reserved copy (skipping any that
+        # were issued or cancelled in the meantime)
+        count = sum(
+            end_reservation(reservation, 'expired') for reservation in expired_transactions)
+        self.stdout.write(f'Expired {count} QR reservations')
@@ -0,0 +1,34 @@
+# management/commands/drain_outbox.py
+from django.core.management.base import BaseCommand
+from library.mail_utils import drain_outbox
+
+BACKENDS = {
+    'smtp': 'django.core.mail.backends.smtp.EmailBackend',
+    'console': 'django.core.mail.backends.console.EmailBackend',
+    'file': 'django.core.mail.backends.filebased.EmailBackend',
+    'locmem': 'django.core.mail.backends.locmem.EmailBackend',
+}
+
+
+class Command(BaseCommand):
+    help = 'Send the emails waiting in the outbound mail queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int,
+            help='Emails sent per mail connection (default: OUTBOX_BATCH_SIZE)')
+        parser.add_argument(
+            '--max-batches', type=int,
+            help='Stop after this many batches (default: until the queue is empty)')
+        parser.add_argument(
+            '--backend', choices=sorted(BACKENDS),
+            help='Override the mail backend, e.g. "file" to write to EMAIL_FILE_PATH')
+
+    def handle(self, *args, **options):
+        sent, failed = drain_outbox(
+            batch_size=options['batch_size'],
+            max_batches=options['max_batches'],
+            backend=BACKENDS.get(options['backend']),
+        )
+        style = self.style.WARNING if failed else self.style.SUCCESS
+        self.stdout.write(style(f'Sent {sent} emails, {failed} failed attempts'))
@@ -0,0 +1,31 @@
+# management/commands/evaluate_achievements.py
+from django.core.management.base import BaseCommand, CommandError
+from library.models import Achievement
+from library.reading_utils import ACHIEVEMENT_BATCH_SIZE, evaluate_all_achievements
+
+
+class Command(BaseCommand):
+    help = 'Re-evaluate achievements for every user in batches, awarding any now earned'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--achievement', type=int, action='append', metavar='ID',
+            help='Only evaluate this achievement (repeatable; default: all)')
+        parser.add_argument(
+            '--batch-size', type=int, default=ACHIEVEMENT_BATCH_SIZE,
+            help='Users evaluated per batch')
+        parser.add_argument(
+            '--no-notify', action='store_true',
+            help='Record awards without sending achievement notifications')
+
+    def handle(self, *args, **options):
+        achievements = Achievement.objects.all()
+        if options['achievement']:
+            achievements = achievements.filter(id__in=options['achievement'])
+            missing = set(options['achievement']) - set(achievements.values_list('id', flat=True))
+            if missing:
+                raise CommandError(f"Unknown achievements: {', '.join(map(str, sorted(missing)))}")
+
+        awarded = evaluate_all_achievements(
+            achievements, batch_size=options['batch_size'], notify=not options['no_notify'])
+        self.stdout.write(self.style.SUCCESS(f'Awarded {awarded} achievements'))
@@ -0,0 +1,32 @@
+# management/commands/generate_book_qrs.py
+import os
+
+from django.core.management.base import BaseCommand
+from library.qr_utils import generate_book_qrs
+
+
+class Command(BaseCommand):
+    help = 'Render QR codes for books in parallel and store them in media storage'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Regenerate every book QR code, not only the missing ones')
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Rendering processes (default: one per CPU)')
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Books per bulk update')
+        parser.add_argument(
+            'book_ids', nargs='*', type=int,
+            help='Only these books')
+
+    def handle(self, *args, **options):
+        count = generate_book_qrs(
+            book_ids=options['book_ids'] or None,
+            regenerate=options['all'],
+            workers=options['workers'],
+            batch_size=options['batch_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'Generated QR codes for {count} books'))
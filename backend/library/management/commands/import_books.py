@@ -1,63 +1,108 @@
 # library/management/commands/import_books.py
-import json
 import os
-from django.core.management.base import BaseCommand
-from library.models import Book
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from library.import_utils import (
+    IMPORT_FORMATS, detect_format, genre_lookup, iter_book_records,
+    iter_validated_batches, upsert_books
+)
+from library.qr_utils import schedule_book_qr_generation
+
+MAX_ERRORS_SHOWN = 20
 
 
 class Command(BaseCommand):
-    help = 'Import books from JSON backup'
+    help = ('Stream books from a JSON array (plain or Django fixture), JSON lines '
+            'or CSV file and upsert them by ISBN in batches')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default='books_only.json',
+            help='File to import (default: books_only.json)')
+        parser.add_argument(
+            '--format', choices=IMPORT_FORMATS,
+            help='Input format (default: from the file extension)')
+        parser.add_argument(
+            '--encoding', default='utf-8-sig',
+            help='File encoding, e.g. utf-16 for some Windows dumps')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Records validated and written per batch')
+        parser.add_argument(
+            '--offset', type=int, default=0,
+            help='Skip this many book records (resume an interrupted import)')
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Validation processes (default: validate in this process)')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only validate and report, write nothing')
+        parser.add_argument(
+            '--progress-every', type=int, default=10000,
+            help='Report progress every N records')
 
     def handle(self, *args, **options):
-        json_file = 'books_only.json'
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'{path} not found')
+        try:
+            fmt = options['format'] or detect_format(path)
+        except ValueError as e:
+            raise CommandError(str(e))
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
 
-        if not os.path.exists(json_file):
-            self.stdout.write(
-                self.style.ERROR(
-                    f'{json_file} not found. Run extract_books_fixed.py first.')
-            )
-            return
+        offset = options['offset']
+        dry_run = options['dry_run']
+        executor = ProcessPoolExecutor(options['workers']) if options['workers'] > 1 else None
+
+        consumed = written = invalid = 0
+        next_report = options['progress_every']
+        started = time.monotonic()
 
         try:
-            with open(json_file, 'r', encoding='utf-8') as f:
-                books_data = json.load(f)
-
-            count = 0
-            for book_data in books_data:
-                fields = book_data['fields']
-
-                # Create or update book (this handles duplicates gracefully)
-                book, created = Book.objects.update_or_create(
-                    id=book_data['id'],
-                    defaults={
-                        'title': fields['title'],
-                        'author': fields['author'],
-                        'isbn': fields['isbn'],
-                        'genre': fields['genre'],
-                        'publication_year': fields['publication_year'],
-                        'description': fields['description'],
-                        'total_copies': fields['total_copies'],
-                        'available_copies': fields['available_copies'],
-                        'cover_image': fields['cover_image'],
-                        'qr_code': fields['qr_code'],
-                    }
-                )
-
-                count += 1
-                if created:
-                    self.stdout.write(
-                        self.style.SUCCESS(f'Created: {book.title}')
-                    )
-                else:
-                    self.stdout.write(
-                        self.style.WARNING(f'Updated: {book.title}')
-                    )
-
-            self.stdout.write(
-                self.style.SUCCESS(f'Successfully processed {count} books')
-            )
+            with open(path, encoding=options['encoding'], newline='') as fp:
+                records = islice(iter_book_records(fp, fmt), offset, None)
+                for size, valid, errors in iter_validated_batches(
+                        records, options['batch_size'], executor, genre_lookup(), start=offset + 1):
+                    if not dry_run and valid:
+                        written += upsert_books(valid)
+                    consumed += size
 
+                    for number, message in errors[:max(0, MAX_ERRORS_SHOWN - invalid)]:
+                        self.stdout.write(self.style.WARNING(f'Record {number}: {message}'))
+                    invalid += len(errors)
+
+                    if consumed >= next_report:
+                        next_report += options['progress_every']
+                        self._report(consumed, written, invalid, started, offset)
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.ERROR(
+                f'Interrupted - resume with --offset {offset + consumed}'))
+            raise SystemExit(1)
         except Exception as e:
-            self.stdout.write(
-                self.style.ERROR(f'Error: {e}')
-            )
+            raise CommandError(f'{e} - resume with --offset {offset + consumed}')
+        finally:
+            if executor:
+                executor.shutdown(cancel_futures=True)
+
+        self._report(consumed, written, invalid, started, offset)
+        if dry_run:
+            self.stdout.write(self.style.SUCCESS(
+                f'Dry run: {consumed - invalid} valid, {invalid} invalid records'))
+            return
+
+        if written:
+            # bulk_create bypasses Book's post_save, so queue the QR codes here
+            schedule_book_qr_generation()
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully processed {consumed} books ({written} written, {invalid} invalid)'))
+
+    def _report(self, consumed, written, invalid, started, offset):
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.stdout.write(
+            f'{consumed} records in {elapsed:.1f}s ({consumed / elapsed:.0f}/s): '
+            f'{written} written, {invalid} invalid, next offset {offset + consumed}')
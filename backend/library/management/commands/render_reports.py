@@ -0,0 +1,45 @@
+# management/commands/render_reports.py
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from library.report_utils import (
+    REPORT_TYPES, prune_report_jobs, report_range, run_pending_report_jobs, submit_report
+)
+
+
+class Command(BaseCommand):
+    help = 'Render queued PDF report jobs, optionally queueing one first'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--type', choices=REPORT_TYPES,
+            help='Queue a report of this type before rendering')
+        parser.add_argument('--start', help='Report start date (YYYY-MM-DD)')
+        parser.add_argument('--end', help='Report end date (YYYY-MM-DD)')
+        parser.add_argument(
+            '--limit', type=int,
+            help='Render at most this many jobs')
+        parser.add_argument(
+            '--prune', type=int, metavar='DAYS',
+            help='Also delete failed and superseded jobs older than DAYS')
+
+    def handle(self, *args, **options):
+        if options['type']:
+            try:
+                start, end = report_range(
+                    options['type'],
+                    date.fromisoformat(options['start']) if options['start'] else None,
+                    date.fromisoformat(options['end']) if options['end'] else None,
+                )
+            except ValueError as e:
+                raise CommandError(str(e))
+            job, created = submit_report(options['type'], start, end)
+            self.stdout.write(
+                f"{'Queued' if created else 'Reusing'} report job {job.id} ({start} to {end})")
+
+        rendered = run_pending_report_jobs(limit=options['limit'])
+        self.stdout.write(self.style.SUCCESS(f'Rendered {rendered} report jobs'))
+
+        if options['prune'] is not None:
+            deleted = prune_report_jobs(options['prune'])
+            self.stdout.write(f'Pruned {deleted} old report jobs')
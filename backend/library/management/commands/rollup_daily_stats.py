@@ -0,0 +1,30 @@
+# management/commands/rollup_daily_stats.py
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from library.stats_utils import rollup_daily_stats
+
+
+class Command(BaseCommand):
+    help = 'Roll up closed days into the DailyLibraryStats table used by the admin dashboards'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since', metavar='YYYY-MM-DD',
+            help='Recompute every day from this date (default: only days not rolled up yet)')
+        parser.add_argument(
+            '--until', metavar='YYYY-MM-DD',
+            help='Last day to roll up (default and maximum: yesterday)')
+
+    def handle(self, *args, **options):
+        try:
+            since = date.fromisoformat(options['since']) if options['since'] else None
+            until = date.fromisoformat(options['until']) if options['until'] else None
+        except ValueError as e:
+            raise CommandError(f'Invalid date: {e}')
+
+        days = rollup_daily_stats(since=since, until=until)
+        if days:
+            self.stdout.write(self.style.SUCCESS(f'Rolled up library stats for {days} days'))
+        else:
+            self.stdout.write('Library stats are already up to date')
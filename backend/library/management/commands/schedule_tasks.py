@@ -0,0 +1,13 @@
+# management/commands/schedule_tasks.py
+from django.core.management.base import BaseCommand
+from library.tasks import PERIODIC_TASKS, schedule_periodic_tasks
+
+
+class Command(BaseCommand):
+    help = 'Schedule the periodic background tasks (process_tasks also does this on start)'
+
+    def handle(self, *args, **options):
+        schedule_periodic_tasks()
+        for task, interval in PERIODIC_TASKS:
+            self.stdout.write(f'{task.name}: every {interval}s')
+        self.stdout.write(self.style.SUCCESS(f'Scheduled {len(PERIODIC_TASKS)} periodic tasks'))
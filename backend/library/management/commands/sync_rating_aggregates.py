@@ -0,0 +1,50 @@
+# management/commands/sync_rating_aggregates.py
+from django.core.management.base import BaseCommand
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Now
+from library.models import Book, BookRating
+
+
+class Command(BaseCommand):
+    help = 'Backfill and verify the denormalized rating_sum/rating_count on books'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify', action='store_true',
+            help='Only report books whose aggregates are out of sync')
+
+    def handle(self, *args, **options):
+        ratings = BookRating.objects.filter(book=OuterRef('pk')).order_by().values('book')
+        actual_sum = Coalesce(Subquery(
+            ratings.annotate(total=Sum('rating')).values('total')), 0)
+        actual_count = Coalesce(Subquery(
+            ratings.annotate(total=Count('id')).values('total')), 0)
+
+        if not options['verify']:
+            updated = Book.objects.exclude(
+                rating_sum=actual_sum, rating_count=actual_count
+            ).update(rating_sum=actual_sum, rating_count=actual_count, updated_at=Now())
+            self.stdout.write(f'Corrected rating aggregates on {updated} books')
+
+        mismatched = [
+            (book_id, title, stored_sum, stored_count, real_sum, real_count)
+            for book_id, title, stored_sum, stored_count, real_sum, real_count in
+            Book.objects.annotate(
+                actual_sum=actual_sum, actual_count=actual_count
+            ).values_list(
+                'id', 'title', 'rating_sum', 'rating_count', 'actual_sum', 'actual_count'
+            )
+            if (stored_sum, stored_count) != (real_sum, real_count)
+        ]
+
+        for book_id, title, stored_sum, stored_count, real_sum, real_count in mismatched:
+            self.stdout.write(self.style.WARNING(
+                f'Book {book_id} "{title}": stored {stored_sum}/{stored_count}, '
+                f'actual {real_sum}/{real_count}'
+            ))
+
+        if mismatched:
+            self.stdout.write(self.style.ERROR(
+                f'{len(mismatched)} books have out-of-sync rating aggregates'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Rating aggregates are in sync'))
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0029_book_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyLibraryStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('borrows', models.PositiveIntegerField(default=0)),
+                ('returns', models.PositiveIntegerField(default=0)),
+                ('new_users', models.PositiveIntegerField(default=0)),
+                ('fines_assessed', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('fines_collected', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('overdue_snapshot', models.PositiveIntegerField(default=0)),
+                ('audit_events', models.PositiveIntegerField(default=0)),
+                ('permission_denials', models.PositiveIntegerField(default=0)),
+                ('role_changes', models.PositiveIntegerField(default=0)),
+                ('genre_borrows', models.JSONField(blank=True, default=dict)),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'daily library stats',
+                'ordering': ['date'],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.5 on 2026-10-18 10:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0030_dailylibrarystats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationLedger',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('notification_type', models.CharField(choices=[('due_reminder', 'Due Date Reminder'), ('overdue', 'Overdue Book'), ('fine', 'Fine Applied'), ('achievement', 'Achievement Earned'), ('book_available', 'Book Available'), ('system', 'System Notification'), ('welcome', 'Welcome Message'), ('reservation_confirmation', 'Reservation Confirmed'), ('reservation_ready', 'Reservation Ready'), ('reservation_expiring', 'Reservation Expiring Soon'), ('pickup_reminder', 'Pickup Reminder')], max_length=30)),
+                ('day', models.DateField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('transaction', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='library.transaction')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('transaction', 'notification_type', 'day'), name='unique_notification_per_transaction_day')],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_unread_notifications(apps, schema_editor):
+    UserProfile = apps.get_model('library', 'UserProfile')
+    Notification = apps.get_model('library', 'Notification')
+
+    unread = Notification.objects.filter(
+        user=OuterRef('user'), is_read=False).order_by().values('user')
+    UserProfile.objects.update(
+        unread_notifications=Coalesce(Subquery(
+            unread.annotate(total=Count('id')).values('total')), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0033_reportjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='unread_notifications',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_unread_notifications, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+
+def mark_legacy_awards_earned(apps, schema_editor):
+    # Awards used to be stored with progress 0 (progress rows always had
+    # progress > 0); earned now means progress >= requirement
+    Achievement = apps.get_model('library', 'Achievement')
+    UserAchievement = apps.get_model('library', 'UserAchievement')
+
+    UserAchievement.objects.filter(progress=0).update(
+        progress=Subquery(Achievement.objects.filter(
+            pk=OuterRef('achievement')).values('requirement')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0034_userprofile_unread_notifications'),
+    ]
+
+    operations = [
+        migrations.RunPython(mark_legacy_awards_earned, migrations.RunPython.noop),
+    ]
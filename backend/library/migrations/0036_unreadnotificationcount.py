@@ -0,0 +1,45 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def copy_unread_counts(apps, schema_editor):
+    UserProfile = apps.get_model('library', 'UserProfile')
+    UnreadNotificationCount = apps.get_model('library', 'UnreadNotificationCount')
+
+    UnreadNotificationCount.objects.bulk_create([
+        UnreadNotificationCount(user_id=user_id, count=count)
+        for user_id, count in UserProfile.objects.filter(
+            unread_notifications__gt=0).values_list('user_id', 'unread_notifications').iterator()
+    ], batch_size=1000)
+
+
+def restore_unread_counts(apps, schema_editor):
+    UserProfile = apps.get_model('library', 'UserProfile')
+    UnreadNotificationCount = apps.get_model('library', 'UnreadNotificationCount')
+
+    for user_id, count in UnreadNotificationCount.objects.values_list('user_id', 'count').iterator():
+        UserProfile.objects.filter(user_id=user_id).update(unread_notifications=count)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0035_backfill_earned_achievements'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UnreadNotificationCount',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='unread_notification_count', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(copy_unread_counts, restore_unread_counts),
+        migrations.RemoveField(
+            model_name='userprofile',
+            name='unread_notifications',
+        ),
+    ]
@@ -6,9 +6,6 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
 from datetime import date, timedelta
-import qrcode
-from io import BytesIO
-from django.core.files import File
 import os
 import json
 # backend/library/models.py  (append)
@@ -135,6 +132,17 @@ class Book(models.Model):
     qr_code = models.ImageField(upload_to='qr_codes/', blank=True, null=True)
     is_academic = models.BooleanField(default=True)
     subject_code = models.CharField(max_length=20, blank=True, null=True)
+    # Denormalized BookRating aggregates, kept in sync by handle_book_rating
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    # Drives the catalog version stamp (ETag / Last-Modified)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination of the catalog
+            models.Index(fields=['title', 'id'], name='book_title_id_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -145,51 +153,16 @@ class Book(models.Model):
             self.available_copies = self.total_copies
             self.reserved_copies = 0
 
-        # First save to get the ID (for new books)
+        # QR codes are rendered in batches afterwards (qr_utils.generate_book_qrs)
         super().save(*args, **kwargs)
 
-        # Generate QR code only if it doesn't exist and qrcode is available
-        if qrcode and not self.qr_code:
-            qr = qrcode.QRCode(
-                version=1,
-                error_correction=qrcode.constants.ERROR_CORRECT_L,
-                box_size=10,
-                border=4,
-            )
-            qr.add_data(f"BOOK:{self.id}")
-            qr.make(fit=True)
-
-            img = qr.make_image(fill_color="black", back_color="white")
-            buffer = BytesIO()
-            img.save(buffer, format='PNG')
-            file_name = f'qr_{self.id}.png'
-
-            # Save the QR code without triggering another save
-            self.qr_code.save(file_name, File(buffer), save=False)
-
-            # Update only the qr_code field to avoid recursion
-            super().save(update_fields=['qr_code'])
-
     def generate_qr_code(self):
         if not self.pk:
             return
 
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=10,
-            border=4,
-        )
-        qr.add_data(f"BOOK:{self.id}")
-        qr.make(fit=True)
-
-        img = qr.make_image(fill_color="black", back_color="white")
-        buffer = BytesIO()
-        img.save(buffer, format='PNG')
-
-        file_name = f'book_qr_{self.id}.png'
-        self.qr_code.save(file_name, File(buffer), save=False)
-        super().save(update_fields=['qr_code'])
+        from .qr_utils import generate_book_qrs
+        generate_book_qrs([self.pk], regenerate=True)
+        self.refresh_from_db(fields=['qr_code', 'updated_at'])
 
     @property
     def get_cover_url(self, request=None):
@@ -223,6 +196,13 @@ class Book(models.Model):
         """Check if book can be reserved"""
         return self.effectively_available > 0
 
+    @property
+    def average_rating(self):
+        """Average star rating from the denormalized aggregates"""
+        if not self.rating_count:
+            return 0
+        return round(self.rating_sum / self.rating_count, 1)
+
 # models.py - KEEP THIS (UserProfile model)
 # models.py - KEEP THIS (it's correct)
 
@@ -253,6 +233,20 @@ class UserProfile(models.Model):
         return self.user.username
 
 
+class UnreadNotificationCount(models.Model):
+    """
+    Denormalized unread Notification count. Only ever written by
+    notification_utils.adjust_unread_counts and reconcile_unread_counts,
+    never saved whole, so profile saves (every login) cannot clobber it.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True,
+                                related_name='unread_notification_count')
+    count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user_id}: {self.count} unread"
+
+
 class Transaction(models.Model):
     book = models.ForeignKey(Book, on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -460,15 +454,21 @@ class BookReview(models.Model):
 
 def update_book_rating_stats(self):
     """
-    Update average rating and rating count for a book
+    Recompute rating_sum/rating_count for a book from its BookRating rows
     """
-    from django.db.models import Avg, Count
+    from django.db.models import Count, Sum
     stats = BookRating.objects.filter(book=self).aggregate(
-        average_rating=Avg('rating'),
+        rating_sum=Sum('rating'),
         rating_count=Count('id')
     )
-    # We'll store these in the Book model or calculate on-demand
-    return stats
+    self.rating_sum = stats['rating_sum'] or 0
+    self.rating_count = stats['rating_count']
+    Book.objects.filter(pk=self.pk).update(
+        rating_sum=self.rating_sum, rating_count=self.rating_count)
+    return {
+        'average_rating': self.average_rating,
+        'rating_count': self.rating_count
+    }
 
 
 # Add the method to Book class
@@ -772,6 +772,19 @@ class Notification(models.Model):
         return f"{self.user.username} - {self.title}"
 
 
+class StreamEvent(models.Model):
+    """
+    An event published to notification streams, shared between processes
+    by stream_utils.DatabaseBroker and pruned after a few minutes
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    event = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.user_id} - {self.event.get('type')}"
+
+
 # In models.py - Add these fields to UserNotificationPreference model
 class UserNotificationPreference(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
@@ -796,4 +809,132 @@ class UserNotificationPreference(models.Model):
     push_overdue_alerts = models.BooleanField(default=True)
 
     def __str__(self):
-        return f"Notification preferences for {self.user.username}"
\ No newline at end of file
+        return f"Notification preferences for {self.user.username}"
+
+class DailyLibraryStats(models.Model):
+    """
+    One row of rolled-up activity per closed calendar day, so the admin
+    dashboards never aggregate over the full history (see stats_utils).
+    """
+    date = models.DateField(unique=True)
+    borrows = models.PositiveIntegerField(default=0)
+    returns = models.PositiveIntegerField(default=0)
+    new_users = models.PositiveIntegerField(default=0)
+    fines_assessed = models.DecimalField(
+        max_digits=10, decimal_places=2, default=0)
+    fines_collected = models.DecimalField(
+        max_digits=10, decimal_places=2, default=0)
+    # Loans past due and still out at the end of the day
+    overdue_snapshot = models.PositiveIntegerField(default=0)
+    audit_events = models.PositiveIntegerField(default=0)
+    permission_denials = models.PositiveIntegerField(default=0)
+    role_changes = models.PositiveIntegerField(default=0)
+    genre_borrows = models.JSONField(default=dict, blank=True)  # {genre: borrows}
+    computed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['date']
+        verbose_name_plural = 'daily library stats'
+
+    def __str__(self):
+        return f"Library stats for {self.date}"
+
+
+class NotificationLedger(models.Model):
+    """
+    Records which transaction notifications went out on which day, so the
+    hourly sweeps notify each transaction at most once per type and day.
+    """
+    transaction = models.ForeignKey(Transaction, on_delete=models.CASCADE)
+    notification_type = models.CharField(
+        max_length=30, choices=Notification.NOTIFICATION_TYPES)
+    day = models.DateField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['transaction', 'notification_type', 'day'],
+                name='unique_notification_per_transaction_day'),
+        ]
+
+    def __str__(self):
+        return f"{self.notification_type} for transaction {self.transaction_id} on {self.day}"
+
+
+class OutboundEmail(models.Model):
+    """
+    Outbox of emails waiting to be sent by the mail queue worker
+    (see mail_utils). Rendering and SMTP happen outside the request.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    to_email = models.EmailField()
+    subject = models.CharField(max_length=255)
+    body = models.TextField(blank=True)  # Plain text, when no template is used
+    template = models.CharField(max_length=100, blank=True)
+    context = models.JSONField(default=dict, blank=True)
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claim_token = models.CharField(max_length=32, blank=True, db_index=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} to {self.to_email} ({self.status})"
+
+
+class ReportJob(models.Model):
+    """
+    A PDF report rendered in the background (see report_utils). The
+    finished PDF is stored under its content hash; reports of ranges that
+    have ended never change, so they are rendered once and reused.
+    """
+    REPORT_TYPES = [
+        ('monthly', 'Monthly'),
+        ('custom', 'Custom Date Range'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    report_type = models.CharField(max_length=10, choices=REPORT_TYPES)
+    start_date = models.DateField()
+    end_date = models.DateField()
+    immutable = models.BooleanField(default=False)  # range ended before it was rendered
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default='pending')
+    requested_by = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True)
+    file = models.FileField(upload_to='reports/', blank=True)
+    content_hash = models.CharField(max_length=64, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['report_type', 'start_date', 'end_date', 'status']),
+        ]
+
+    def __str__(self):
+        return f"{self.report_type} report {self.start_date} to {self.end_date} ({self.status})"
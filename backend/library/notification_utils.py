@@ -1,7 +1,21 @@
 # backend/library/notification_utils.py
-from .models import Notification, UserNotificationPreference
+from .models import Notification, NotificationLedger, UnreadNotificationCount
+from .preference_utils import NotificationPreferenceResolver
+from .mail_utils import queue_notification_emails
+from .stream_utils import publish_event
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db import transaction as db_transaction
+from django.db.models import Case, Count, F, Q, When
 from django.utils import timezone
-from datetime import timedelta
+from django.utils.timesince import timesince
+from datetime import datetime, timedelta
+from collections import Counter
+from itertools import islice
+import base64
+import hashlib
+import json
 import logging
 
 logger = logging.getLogger(__name__)
@@ -63,6 +77,8 @@ class NotificationManager:
         }
     }
 
+    BULK_BATCH_SIZE = 1000
+
     @staticmethod
     def create_notification(user, notification_type, title=None, message=None,
                             related_book=None, related_transaction=None, action_url=None):
@@ -70,17 +86,8 @@ class NotificationManager:
         Create a notification with enhanced reservation support
         """
         try:
-            # Check user preferences
-            preferences = UserNotificationPreference.objects.filter(
-                user=user).first()
-
-            # If no preferences exist, create default ones
-            if not preferences:
-                preferences = UserNotificationPreference.objects.create(
-                    user=user)
-
-            # Check if user wants this type of notification
-            if not NotificationManager._should_send_notification(notification_type, preferences):
+            # Check if user wants this type of notification (cached)
+            if not NotificationPreferenceResolver.resolve(user.id, notification_type):
                 logger.info(
                     f"Notification {notification_type} skipped due to user preferences for {user.username}")
                 return None
@@ -93,16 +100,19 @@ class NotificationManager:
                 message = message or template.get(
                     'message', 'You have a new notification.')
 
-            # Create the notification
-            notification = Notification.objects.create(
-                user=user,
-                notification_type=notification_type,
-                title=title,
-                message=message,
-                related_book=related_book,
-                related_transaction=related_transaction,
-                action_url=action_url
-            )
+            # Create the notification and count it as unread together
+            with db_transaction.atomic():
+                notification = Notification.objects.create(
+                    user=user,
+                    notification_type=notification_type,
+                    title=title,
+                    message=message,
+                    related_book=related_book,
+                    related_transaction=related_transaction,
+                    action_url=action_url
+                )
+                adjust_unread_count(user.id, 1)
+                publish_event(user.id, 'notification', notification_event_data(notification))
 
             logger.info(
                 f"Notification created for {user.username}: {notification_type}")
@@ -114,28 +124,71 @@ class NotificationManager:
             return None
 
     @staticmethod
-    def _should_send_notification(notification_type, preferences):
+    def send_transaction_notifications(transactions, notification_type, message_for=None,
+                                       action_url=None, batch_size=None):
         """
-        Check if notification should be sent based on user preferences
+        Batch counterpart of create_notification for sweeps over many
+        transactions (pass a queryset with select_related('book', 'user')).
+
+        Per batch: one ledger lookup, one (cached) preference lookup, then bulk
+        INSERTs of ledger entries, notifications and their queued emails.
+        A transaction is notified at most once per type and day. Returns
+        the number of notifications created.
         """
-        preference_map = {
-            # Reservation notifications
-            'reservation_confirmation': preferences.email_reservation_confirmation,
-            'reservation_ready': preferences.email_book_available,  # Use existing preference
-            'reservation_expiring': preferences.email_due_reminders,  # Use existing preference
-            'pickup_reminder': preferences.email_due_reminders,  # Use existing preference
-
-            # Existing notifications
-            'due_reminder': preferences.email_due_reminders,
-            'overdue': preferences.email_overdue_alerts,
-            'fine': preferences.email_fine_notifications,
-            'achievement': preferences.email_achievements,
-            'book_available': preferences.email_book_available,
-            'system': True,  # Always send system notifications
-            'welcome': True,  # Always send welcome notifications
-        }
+        batch_size = batch_size or NotificationManager.BULK_BATCH_SIZE
+        template = NotificationManager.NOTIFICATION_TEMPLATES.get(notification_type, {})
+        today = timezone.localdate()
+        created = 0
+
+        rows = transactions.iterator(chunk_size=batch_size)
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+
+            already_sent = set(NotificationLedger.objects.filter(
+                transaction_id__in=[t.id for t in batch],
+                notification_type=notification_type,
+                day=today
+            ).values_list('transaction_id', flat=True))
+            batch = [t for t in batch if t.id not in already_sent]
+            if not batch:
+                continue
 
-        return preference_map.get(notification_type, True)
+            accepting = NotificationPreferenceResolver.bulk_resolve(
+                {t.user_id for t in batch}, notification_type)
+
+            notifications = [
+                Notification(
+                    user=t.user,
+                    notification_type=notification_type,
+                    title=template.get('title', 'Notification'),
+                    message=message_for(t) if message_for else template.get(
+                        'message', 'You have a new notification.').format(book_title=t.book.title),
+                    related_book_id=t.book_id,
+                    related_transaction_id=t.id,
+                    action_url=action_url
+                )
+                for t in batch if t.user_id in accepting
+            ]
+
+            # Skipped users are recorded too, so they are not re-checked all day
+            with db_transaction.atomic():
+                NotificationLedger.objects.bulk_create([
+                    NotificationLedger(transaction_id=t.id,
+                                       notification_type=notification_type, day=today)
+                    for t in batch
+                ], ignore_conflicts=True)
+                Notification.objects.bulk_create(notifications)
+                adjust_unread_counts(Counter(n.user_id for n in notifications))
+                for notification in notifications:
+                    publish_event(notification.user_id, 'notification',
+                                  notification_event_data(notification))
+                queue_notification_emails(notifications)
+            created += len(notifications)
+
+        logger.info(f"Created {created} {notification_type} notifications")
+        return created
 
     # RESERVATION-SPECIFIC NOTIFICATION METHODS - NEW
 
@@ -239,3 +292,244 @@ class NotificationManager:
             message=f'You earned the "{achievement.name}" achievement!',
             action_url='/achievements'
         )
+
+
+# Notification feed: keyset pages over (created_at, id), newest first
+
+FEED_MAX_PAGE_SIZE = 100
+FEED_TOTAL_CACHE_TIMEOUT = 60
+FEED_DATE_RANGES = {'today': 0, 'week': 7, 'month': 30}
+
+FEED_COLUMNS = (
+    'id', 'notification_type', 'title', 'message', 'is_read', 'created_at', 'action_url',
+    'related_book_id', 'related_book__title', 'related_book__cover_image',
+    'related_transaction_id',
+)
+
+
+def encode_feed_cursor(created_at, notification_id):
+    """Opaque cursor pointing just after the (created_at, id) of a notification"""
+    raw = json.dumps([created_at.isoformat(), notification_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_feed_cursor(cursor):
+    """
+    Decode a cursor from encode_feed_cursor(), raising ValueError if malformed
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, notification_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        created_at = datetime.fromisoformat(created_at)
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if not isinstance(notification_id, int):
+        raise ValueError('Invalid cursor')
+    return created_at, notification_id
+
+
+def notification_feed_queryset(user_id, status='all', categories=(), date_range='all'):
+    """
+    A user's notifications with the feed filters applied, newest first.
+    Every filter is a plain range/equality on indexed columns, so the
+    (user, is_read, created_at) index serves the read/unread views.
+    """
+    notifications = Notification.objects.filter(user_id=user_id)
+    if status == 'unread':
+        notifications = notifications.filter(is_read=False)
+    elif status == 'read':
+        notifications = notifications.filter(is_read=True)
+    if categories:
+        notifications = notifications.filter(notification_type__in=categories)
+    if date_range in FEED_DATE_RANGES:
+        # Start of the local day, instead of a non-sargable created_at__date lookup
+        today = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+        notifications = notifications.filter(
+            created_at__gte=today - timedelta(days=FEED_DATE_RANGES[date_range]))
+    return notifications.order_by('-created_at', '-id')
+
+
+def cached_feed_total(user_id, notifications, *filter_parts):
+    """
+    Total for a filtered feed, counted once and then served from the
+    cache for FEED_TOTAL_CACHE_TIMEOUT seconds (so it may lag slightly)
+    """
+    digest = hashlib.sha1(repr(filter_parts).encode()).hexdigest()[:16]
+    key = f"user_{user_id}_notification_feed_total_{digest}"
+    return cache.get_or_set(key, notifications.count, FEED_TOTAL_CACHE_TIMEOUT)
+
+
+def get_notification_feed(user_id, cursor=None, page_size=20, media_origin='',
+                          **filters):
+    """
+    One page of the notification feed as (items, next_cursor). Reads only
+    the feed columns, with the related book title and cover joined in the
+    same query. Raises ValueError for a malformed cursor.
+    """
+    notifications = notification_feed_queryset(user_id, **filters)
+    if cursor:
+        after_created_at, after_id = decode_feed_cursor(cursor)
+        notifications = notifications.filter(
+            Q(created_at__lt=after_created_at)
+            | Q(created_at=after_created_at, id__lt=after_id))
+
+    rows = list(notifications.values(*FEED_COLUMNS)[:page_size + 1])
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+
+    items = []
+    for row in rows:
+        cover = row['related_book__cover_image']
+        items.append({
+            'id': row['id'],
+            'type': row['notification_type'],
+            'title': row['title'],
+            'message': row['message'],
+            'is_read': row['is_read'],
+            'created_at': row['created_at'],
+            'action_url': row['action_url'],
+            'time_ago': timesince(row['created_at']),
+            'related_book_id': row['related_book_id'],
+            'related_book_title': row['related_book__title'],
+            'related_book_cover': _cover_url(cover, media_origin) if cover else None,
+            'related_transaction_id': row['related_transaction_id'],
+        })
+
+    next_cursor = None
+    if has_more:
+        next_cursor = encode_feed_cursor(rows[-1]['created_at'], rows[-1]['id'])
+    return items, next_cursor
+
+
+def notification_event_data(notification):
+    """A new notification as pushed to notification streams (feed item shape)"""
+    return {
+        'id': notification.id,
+        'type': notification.notification_type,
+        'title': notification.title,
+        'message': notification.message,
+        'is_read': notification.is_read,
+        'created_at': notification.created_at,
+        'action_url': notification.action_url,
+        'time_ago': timesince(notification.created_at),
+        'related_book_id': notification.related_book_id,
+        'related_transaction_id': notification.related_transaction_id,
+    }
+
+
+def _cover_url(name, origin):
+    url = default_storage.url(name)
+    # Relative media URLs get the request origin, resolved once per page by the caller
+    return url if '://' in url else f"{origin}{url}"
+
+
+# Unread counters: UnreadNotificationCount holds one row per user, moved
+# by deltas alongside the write that changes read state and read by
+# primary key, so every process sees the same value.
+# reconcile_unread_counts repairs drift.
+
+RECONCILE_BATCH_SIZE = 1000
+
+
+def adjust_unread_counts(deltas):
+    """
+    Apply {user_id: delta} to the unread counters: one conditional UPDATE
+    per distinct delta (never below zero). Clients are told once the
+    surrounding transaction commits.
+    """
+    by_delta = {}
+    for user_id, delta in deltas.items():
+        if delta:
+            by_delta.setdefault(delta, []).append(user_id)
+
+    for delta, user_ids in by_delta.items():
+        if delta > 0:
+            # Users who never had an unread notification have no row yet
+            UnreadNotificationCount.objects.bulk_create(
+                [UnreadNotificationCount(user_id=user_id) for user_id in user_ids],
+                ignore_conflicts=True)
+            value = F('count') + delta
+        else:
+            # Clamp in SQL so an unsigned column never goes negative
+            value = Case(When(count__gt=-delta, then=F('count') + delta), default=0)
+        UnreadNotificationCount.objects.filter(user_id__in=user_ids).update(count=value)
+        for user_id in user_ids:
+            publish_event(user_id, 'unread_changed', counts=('unread',))
+
+
+def adjust_unread_count(user_id, delta):
+    adjust_unread_counts({user_id: delta})
+
+
+def get_unread_count(user_id):
+    """A user's unread notification count without counting Notification rows"""
+    count = UnreadNotificationCount.objects.filter(user_id=user_id).values_list(
+        'count', flat=True).first()
+    return count or 0
+
+
+def mark_notifications_read(user_id, notification_ids=None):
+    """
+    Mark a user's unread notifications read (all, or just `notification_ids`)
+    and decrement the counter. Returns how many were unread.
+    """
+    with db_transaction.atomic():
+        unread = Notification.objects.filter(user_id=user_id, is_read=False)
+        if notification_ids is not None:
+            unread = unread.filter(id__in=notification_ids)
+        marked = unread.update(is_read=True)
+        adjust_unread_count(user_id, -marked)
+    return marked
+
+
+def delete_notifications(user_id, notification_ids):
+    """Delete some of a user's notifications, keeping the counter in step. Returns the count."""
+    label = Notification._meta.label
+    with db_transaction.atomic():
+        notifications = Notification.objects.filter(user_id=user_id, id__in=notification_ids)
+        unread_deleted = notifications.filter(is_read=False).delete()[1].get(label, 0)
+        read_deleted = notifications.delete()[1].get(label, 0)
+        adjust_unread_count(user_id, -unread_deleted)
+    return unread_deleted + read_deleted
+
+
+def reconcile_unread_counts(batch_size=RECONCILE_BATCH_SIZE):
+    """
+    Repair unread counters that drifted from the Notification table (cascade
+    deletes, admin edits...), one batch of users at a time. A counter that
+    changes while it is being checked is left for the next run.
+    Returns the number of counters fixed.
+    """
+    fixed = 0
+    last_user_id = 0
+    while True:
+        user_ids = list(User.objects.filter(pk__gt=last_user_id).order_by(
+            'pk').values_list('pk', flat=True)[:batch_size])
+        if not user_ids:
+            break
+        last_user_id = user_ids[-1]
+
+        stored = dict(UnreadNotificationCount.objects.filter(
+            user_id__in=user_ids).values_list('user_id', 'count'))
+        actual = dict(Notification.objects.filter(
+            user_id__in=user_ids, is_read=False,
+        ).order_by().values('user_id').annotate(total=Count('id')).values_list('user_id', 'total'))
+
+        missing = [
+            UnreadNotificationCount(user_id=user_id, count=count)
+            for user_id, count in actual.items() if user_id not in stored
+        ]
+        UnreadNotificationCount.objects.bulk_create(missing, ignore_conflicts=True)
+        for counter in missing:
+            publish_event(counter.user_id, 'unread_changed', counts=('unread',))
+        fixed += len(missing)
+        for user_id, count in stored.items():
+            real = actual.get(user_id, 0)
+            if real != count and UnreadNotificationCount.objects.filter(
+                    user_id=user_id, count=count).update(count=real):
+                publish_event(user_id, 'unread_changed', counts=('unread',))
+                fixed += 1
+
+    if fixed:
+        logger.warning(f"Repaired {fixed} drifted unread notification counters")
+    return fixed
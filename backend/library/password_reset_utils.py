@@ -2,11 +2,8 @@
 import secrets
 import string
 from django.utils import timezone
-from django.core.mail import send_mail
-from django.conf import settings
-from django.template.loader import render_to_string
-from django.utils.html import strip_tags
 from .models import PasswordResetToken, User
+from .mail_utils import queue_email
 import logging
 
 logger = logging.getLogger(__name__)
@@ -54,25 +51,23 @@ def send_password_reset_email(user_email, reset_token):
     try:
         reset_url = f"http://localhost:3000/reset-password?token={reset_token.token}"
         
-        # HTML email content
-        html_message = render_to_string('password_reset_email.html', {
-            'user': reset_token.user,
-            'reset_url': reset_url,
-            'expiry_hours': 1
-        })
-        
-        plain_message = strip_tags(html_message)
-        
-        send_mail(
-            subject='Infinitum Library - Password Reset Request',
-            message=plain_message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[user_email],
-            html_message=html_message,
-            fail_silently=False,
+        # Rendered and sent by the mail queue worker
+        queue_email(
+            user_email,
+            'Infinitum Library - Password Reset Request',
+            template='password_reset_email.html',
+            context={
+                'user': {
+                    'first_name': reset_token.user.first_name,
+                    'username': reset_token.user.username,
+                },
+                'reset_url': reset_url,
+                'expiry_hours': 1
+            },
+            urgent=True
         )
         
-        logger.info(f"Password reset email sent to {user_email}")
+        logger.info(f"Password reset email queued for {user_email}")
         return True
         
     except Exception as e:
@@ -0,0 +1,184 @@
+# library/preference_utils.py
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import UserNotificationPreference
+
+logger = logging.getLogger(__name__)
+
+# Bit position of every preference flag - only ever append to this list
+PREFERENCE_BITS = (
+    'email_reservation_confirmation',
+    'email_reservation_ready',
+    'email_reservation_expiring',
+    'email_pickup_reminder',
+    'push_reservation_confirmation',
+    'push_reservation_ready',
+    'push_reservation_expiring',
+    'push_pickup_reminder',
+    'email_due_reminders',
+    'email_overdue_alerts',
+    'email_fine_notifications',
+    'email_achievements',
+    'email_book_available',
+    'push_due_reminders',
+    'push_overdue_alerts',
+)
+DEFAULT_MASK = (1 << len(PREFERENCE_BITS)) - 1  # every flag defaults to True
+
+# Preference flag consulted for each notification type (None: always sent)
+NOTIFICATION_PREFERENCE_FIELDS = {
+    # Reservation notifications
+    'reservation_confirmation': 'email_reservation_confirmation',
+    'reservation_ready': 'email_book_available',  # Use existing preference
+    'reservation_expiring': 'email_due_reminders',  # Use existing preference
+    'pickup_reminder': 'email_due_reminders',  # Use existing preference
+
+    # Existing notifications
+    'due_reminder': 'email_due_reminders',
+    'overdue': 'email_overdue_alerts',
+    'fine': 'email_fine_notifications',
+    'achievement': 'email_achievements',
+    'book_available': 'email_book_available',
+    'system': None,  # Always send system notifications
+    'welcome': None,  # Always send welcome notifications
+}
+
+
+class NotificationPreferenceResolver:
+    """
+    Resolves whether users accept a notification type
+
+    Each user's preferences are stored as an int bitmask (PREFERENCE_BITS)
+    in the Django cache and in a small per-process LRU. LRU entries live
+    only LOCAL_TTL seconds, so an invalidation made by another process is
+    picked up shortly after.
+    """
+
+    TIMEOUT = 3600
+    LOCAL_TTL = 30
+    LRU_SIZE = getattr(settings, 'NOTIFICATION_PREFERENCE_LRU_SIZE', 4096)
+
+    _local = OrderedDict()  # user_id -> (mask, expires_at)
+    _lock = threading.Lock()
+
+    @staticmethod
+    def _cache_key(user_id):
+        return f"user_{user_id}_notification_preference_mask"
+
+    @staticmethod
+    def to_mask(preferences):
+        """Pack a UserNotificationPreference (or a dict of flags) into an int"""
+        if not isinstance(preferences, dict):
+            preferences = {field: getattr(preferences, field) for field in PREFERENCE_BITS}
+        return sum(1 << bit for bit, field in enumerate(PREFERENCE_BITS) if preferences[field])
+
+    @staticmethod
+    def mask_allows(mask, notification_type):
+        field = NOTIFICATION_PREFERENCE_FIELDS.get(notification_type)
+        if not field:
+            return True
+        return bool(mask & (1 << PREFERENCE_BITS.index(field)))
+
+    @classmethod
+    def _local_get(cls, user_id, now):
+        with cls._lock:
+            entry = cls._local.get(user_id)
+            if entry is None:
+                return None
+            if entry[1] < now:
+                del cls._local[user_id]
+                return None
+            cls._local.move_to_end(user_id)
+            return entry[0]
+
+    @classmethod
+    def _remember(cls, masks):
+        expires_at = time.monotonic() + cls.LOCAL_TTL
+        with cls._lock:
+            for user_id, mask in masks.items():
+                cls._local[user_id] = (mask, expires_at)
+                cls._local.move_to_end(user_id)
+            while len(cls._local) > cls.LRU_SIZE:
+                cls._local.popitem(last=False)
+
+    @classmethod
+    def get_masks(cls, user_ids):
+        """
+        {user_id: mask} for every user - LRU first, then one cache
+        get_many, then one query. Missing preference rows are created
+        with the defaults.
+        """
+        now = time.monotonic()
+        masks = {}
+        remaining = []
+        for user_id in set(user_ids):
+            mask = cls._local_get(user_id, now)
+            if mask is None:
+                remaining.append(user_id)
+            else:
+                masks[user_id] = mask
+        if not remaining:
+            return masks
+
+        keys = {cls._cache_key(user_id): user_id for user_id in remaining}
+        cached = {keys[key]: mask for key, mask in cache.get_many(list(keys)).items()}
+
+        loaded = {}
+        missing = set(remaining) - cached.keys()
+        if missing:
+            for row in UserNotificationPreference.objects.filter(
+                    user_id__in=missing).values('user_id', *PREFERENCE_BITS):
+                loaded[row['user_id']] = cls.to_mask(row)
+            defaults = missing - loaded.keys()
+            if defaults:
+                UserNotificationPreference.objects.bulk_create(
+                    [UserNotificationPreference(user_id=user_id) for user_id in defaults],
+                    ignore_conflicts=True)
+                loaded.update(dict.fromkeys(defaults, DEFAULT_MASK))
+            cache.set_many(
+                {cls._cache_key(user_id): mask for user_id, mask in loaded.items()},
+                cls.TIMEOUT)
+
+        cls._remember({**cached, **loaded})
+        masks.update(cached)
+        masks.update(loaded)
+        return masks
+
+    @classmethod
+    def get_mask(cls, user_id):
+        return cls.get_masks([user_id])[user_id]
+
+    @classmethod
+    def resolve(cls, user_id, notification_type):
+        """Whether one user accepts `notification_type`"""
+        if not NOTIFICATION_PREFERENCE_FIELDS.get(notification_type):
+            return True
+        return cls.mask_allows(cls.get_mask(user_id), notification_type)
+
+    @classmethod
+    def bulk_resolve(cls, user_ids, notification_type):
+        """The subset of `user_ids` that accept `notification_type`"""
+        if not NOTIFICATION_PREFERENCE_FIELDS.get(notification_type):
+            return set(user_ids)
+        return {
+            user_id for user_id, mask in cls.get_masks(user_ids).items()
+            if cls.mask_allows(mask, notification_type)
+        }
+
+    @classmethod
+    def invalidate(cls, user_id):
+        """Forget a user's cached preferences after they change"""
+        with cls._lock:
+            cls._local.pop(user_id, None)
+        cache.delete(cls._cache_key(user_id))
+
+    @classmethod
+    def clear_local(cls):
+        with cls._lock:
+            cls._local.clear()
@@ -0,0 +1,206 @@
+# library/qr_utils.py
+import base64
+import hashlib
+import logging
+from functools import lru_cache
+from io import BytesIO
+
+from django.conf import settings
+from django.core import signing
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.urls import reverse
+
+from .lazy_utils import lazy_module
+
+qrcode = lazy_module('qrcode')
+qrcode_svg = lazy_module('qrcode.image.svg')
+
+logger = logging.getLogger(__name__)
+
+QR_FORMATS = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+}
+QR_SIGNING_SALT = 'library.qr'
+
+
+def _make_qr(payload, box_size, border):
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        box_size=box_size,
+        border=border,
+    )
+    qr.add_data(payload)
+    qr.make(fit=True)
+    return qr
+
+
+@lru_cache(maxsize=getattr(settings, 'QR_CACHE_SIZE', 1024))
+def render_qr(payload, fmt='png', box_size=10, border=4):
+    """
+    QR image bytes for `payload`, memoized per process.
+
+    PNGs are 1-bit and optimized. SVGs are a single scalable path - use
+    them where the image is resized in the browser.
+    """
+    if fmt not in QR_FORMATS:
+        raise ValueError(f"Unknown QR format: {fmt}")
+    qr = _make_qr(payload, box_size, border)
+
+    if fmt == 'svg':
+        return qr.make_image(image_factory=qrcode_svg.SvgPathImage).to_string()
+
+    image = qr.make_image(fill_color="black", back_color="white")
+    buffer = BytesIO()
+    image.get_image().convert('1').save(buffer, format='PNG', optimize=True)
+    return buffer.getvalue()
+
+
+def qr_base64(payload):
+    """Base64 PNG for inlining into JSON (what the frontend renders today)"""
+    return base64.b64encode(render_qr(payload)).decode()
+
+
+def qr_digest(payload, fmt='png'):
+    """Content address of a QR image (stable for a payload and format)"""
+    return hashlib.sha256(f"{fmt}:{payload}".encode()).hexdigest()
+
+
+def qr_token(payload):
+    return signing.dumps(payload, salt=QR_SIGNING_SALT, compress=True)
+
+
+def payload_from_token(token):
+    """The payload a qr_token() was made for, or None if tampered with"""
+    try:
+        return signing.loads(token, salt=QR_SIGNING_SALT)
+    except signing.BadSignature:
+        return None
+
+
+def qr_url(payload, fmt='png'):
+    """URL of the cacheable image endpoint for `payload`"""
+    return reverse('qr_image', kwargs={'token': qr_token(payload), 'fmt': fmt})
+
+
+def qr_file_url(payload, fmt='png'):
+    """
+    Write the QR image once to media storage under its content address
+    and return its URL, for serving straight from the web server.
+    """
+    name = f"qr_codes/cas/{qr_digest(payload, fmt)}.{fmt}"
+    if not default_storage.exists(name):
+        default_storage.save(name, ContentFile(render_qr(payload, fmt)))
+    return default_storage.url(name)
+
+
+def qr_response_fields(payload):
+    """
+    QR fields for an API response: 'qr_image_url', and the inline base64
+    'qr_data' (None when QR_INLINE_BASE64 is off).
+    """
+    inline = getattr(settings, 'QR_INLINE_BASE64', True)
+    return {
+        'qr_data': qr_base64(payload) if inline else None,
+        'qr_image_url': qr_url(payload),
+    }
+
+
+def transaction_qr_fields(transaction):
+    """qr_response_fields() of a reservation, if its borrow QR was generated"""
+    if not transaction.qr_data:
+        return {'qr_data': None, 'qr_image_url': None}
+    return qr_response_fields(borrow_qr_payload(transaction))
+
+
+def stored_qr_value(payload):
+    """
+    What goes into Transaction.qr_data: the base64 image while responses
+    inline it, otherwise just the short payload.
+    """
+    if getattr(settings, 'QR_INLINE_BASE64', True):
+        return qr_base64(payload)
+    return payload
+
+
+def borrow_qr_payload(transaction):
+    return f"BORROW:{transaction.id}:{transaction.book_id}:{transaction.user_id}"
+
+
+def return_qr_payload(transaction):
+    return f"RETURN:{transaction.id}:{transaction.book_id}:{transaction.user_id}"
+
+
+def book_qr_payload(book_id):
+    return f"BOOK:{book_id}"
+
+
+def _render_book_qr(book_id):
+    """Process pool worker: (book id, PNG bytes)"""
+    return book_id, render_qr(book_qr_payload(book_id))
+
+
+def generate_book_qrs(book_ids=None, regenerate=False, workers=None, batch_size=500):
+    """
+    Render book QR codes in parallel, write them to media storage and
+    bulk-update Book.qr_code - one UPDATE batch per `batch_size` books.
+
+    Without `book_ids`, every book missing a QR code is processed.
+    Returns the number of books updated.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    from django.db.models import Q
+    from django.utils import timezone
+    from .models import Book
+
+    books = Book.objects.all()
+    if book_ids is not None:
+        books = books.filter(id__in=book_ids)
+    if not regenerate:
+        books = books.filter(Q(qr_code__isnull=True) | Q(qr_code=''))
+    ids = list(books.order_by('id').values_list('id', flat=True))
+    if not ids:
+        return 0
+
+    workers = workers or getattr(settings, 'QR_WORKERS', 1)
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 and len(ids) > 1 else None
+    updated = 0
+    try:
+        for start in range(0, len(ids), batch_size):
+            chunk = ids[start:start + batch_size]
+            if executor:
+                rendered = executor.map(_render_book_qr, chunk, chunksize=max(1, len(chunk) // (workers * 4)))
+            else:
+                rendered = map(_render_book_qr, chunk)
+
+            now = timezone.now()
+            updates = []
+            for book_id, png in rendered:
+                name = f'qr_codes/qr_{book_id}.png'
+                if default_storage.exists(name):
+                    default_storage.delete(name)
+                updates.append(Book(
+                    id=book_id,
+                    qr_code=default_storage.save(name, ContentFile(png)),
+                    updated_at=now,
+                ))
+
+            Book.objects.bulk_update(updates, ['qr_code', 'updated_at'])
+            updated += len(updates)
+    finally:
+        if executor:
+            executor.shutdown()
+
+    logger.info(f"Generated QR codes for {updated} books")
+    return updated
+
+
+def schedule_book_qr_generation():
+    """Queue a background run of generate_book_qrs (bursts collapse into one run)"""
+    try:
+        from .tasks import generate_book_qrs_task
+        generate_book_qrs_task(schedule=5, remove_existing_tasks=True)
+    except Exception as e:
+        logger.warning(f"Could not schedule book QR generation, run generate_book_qrs: {e}")
@@ -1,114 +1,165 @@
-# Create new file: library/reading_utils.py
+# library/reading_utils.py
 import logging
+from collections import defaultdict
+
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.utils import timezone
-from .models import Achievement, UserAchievement, Transaction, BookRating, BookReview
-from django.db.models import Count
+
+from .models import Achievement, UserAchievement, Transaction, BookReview
 
 logger = logging.getLogger(__name__)
 
-# In reading_utils.py - UPDATE with debug logging
+ACHIEVEMENT_BATCH_SIZE = 500
 
 
-def check_and_award_achievements(user):
-    """
-    Check if user qualifies for any achievements and award them
-    """
-    try:
-        from .notification_utils import NotificationManager
-        achievements = Achievement.objects.all()
-        awarded = []
+# Achievement engine: every metric the rules need is read for a chunk of
+# users in one query, their UserAchievement rows in another, and the rules
+# are then evaluated in memory. An achievement is earned once its progress
+# reaches the requirement; earned rows are never re-evaluated.
 
-        print(f"🔍 Checking achievements for user: {user.username}")
-        print(f"🔍 Total achievements in system: {achievements.count()}")
+def _count(queryset):
+    return Coalesce(Subquery(queryset.annotate(total=Count('id')).values('total')), 0)
 
-        for achievement in achievements:
-            print(
-                f"🔍 Checking achievement: {achievement.name} (type: {achievement.achievement_type})")
 
-            # Check if user already has this achievement
-            if UserAchievement.objects.filter(user=user, achievement=achievement).exists():
-                print(f"🔍 User already has achievement: {achievement.name}")
+def _metric_expressions(achievement_types):
+    """Subquery per metric (keyed by achievement type) over the outer User"""
+    returned = Transaction.objects.filter(
+        user=OuterRef('pk'), return_date__isnull=False).order_by().values('user')
+    month_start = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+    metrics = {
+        'books_read': lambda: _count(returned),
+        'genres_explored': lambda: Coalesce(Subquery(
+            returned.annotate(total=Count('book__genre', distinct=True)).values('total')), 0),
+        'speed_reader': lambda: _count(returned.filter(return_date__gte=month_start)),
+        'reviewer': lambda: _count(
+            BookReview.objects.filter(user=OuterRef('pk')).order_by().values('user')),
+    }
+    # reading_streak has no metric yet, so it is never evaluated
+    return {name: metrics[name]() for name in achievement_types if name in metrics}
+
+
+def get_achievement_metrics(user_ids, achievement_types):
+    """{user_id: {achievement_type: value}} in a single query"""
+    expressions = _metric_expressions(achievement_types)
+    if not expressions:
+        return {user_id: {} for user_id in user_ids}
+    rows = User.objects.filter(pk__in=user_ids).annotate(**expressions).values('pk', *expressions)
+    return {row.pop('pk'): row for row in rows}
+
+
+def _evaluate_chunk(user_ids, achievements):
+    """
+    Evaluate every achievement for `user_ids` and write the changes.
+    Returns {user_id: [newly earned Achievement]}.
+    """
+    metrics = get_achievement_metrics(user_ids, {a.achievement_type for a in achievements})
+    existing = {
+        (row.user_id, row.achievement_id): row
+        for row in UserAchievement.objects.filter(
+            user_id__in=user_ids, achievement__in=achievements)
+    }
+
+    now = timezone.now()
+    to_create, to_update, to_award = [], [], []
+    awarded = defaultdict(list)
+    for user_id, values in metrics.items():
+        for achievement in achievements:
+            progress = values.get(achievement.achievement_type)
+            if progress is None:
                 continue
+            earned = progress >= achievement.requirement
+            row = existing.get((user_id, achievement.id))
+
+            if row is None:
+                if earned or progress > 0:
+                    to_create.append(UserAchievement(
+                        user_id=user_id, achievement=achievement, progress=progress))
+                    if earned:
+                        awarded[user_id].append(achievement)
+            elif row.progress >= achievement.requirement:
+                continue  # already earned
+            elif earned:
+                to_award.append((row, achievement, progress))
+            elif row.progress != progress:
+                row.progress = progress
+                to_update.append(row)
+
+    with transaction.atomic():
+        UserAchievement.objects.bulk_create(to_create)
+        UserAchievement.objects.bulk_update(to_update, ['progress'])
+        for row, achievement, progress in to_award:
+            # Conditional, so a concurrent evaluation cannot award it twice
+            if UserAchievement.objects.filter(
+                    id=row.id, progress__lt=achievement.requirement,
+            ).update(progress=progress, earned_at=now):
+                awarded[row.user_id].append(achievement)
+    return awarded
+
+
+def evaluate_achievements(user_ids, achievements=None, notify=True):
+    """
+    Award achievements and record progress for `user_ids`, notifying users
+    of what they newly earned. Returns {user_id: [achievement names]}.
+    """
+    from .notification_utils import NotificationManager
+
+    achievements = list(achievements if achievements is not None else Achievement.objects.all())
+    if not achievements or not user_ids:
+        return {}
+
+    try:
+        awarded = _evaluate_chunk(user_ids, achievements)
+    except IntegrityError:
+        # Another evaluation inserted some of the same rows first; re-read them
+        awarded = _evaluate_chunk(user_ids, achievements)
+
+    users = User.objects.in_bulk(awarded) if notify and awarded else {}
+    result = {}
+    for user_id, earned in awarded.items():
+        result[user_id] = [achievement.name for achievement in earned]
+        for achievement in earned:
+            if user_id in users:
+                NotificationManager.send_achievement_notification(users[user_id], achievement)
+        logger.info(f"Awarded {result[user_id]} to user {user_id}")
+    return result
+
+
+def evaluate_all_achievements(achievements=None, batch_size=ACHIEVEMENT_BATCH_SIZE, notify=True):
+    """
+    Re-evaluate every active user in chunks of `batch_size`, e.g. after a
+    new achievement is added. Returns the number of achievements awarded.
+    """
+    achievements = list(achievements if achievements is not None else Achievement.objects.all())
+    total = 0
+    last_id = 0
+    while True:
+        user_ids = list(User.objects.filter(pk__gt=last_id, is_active=True).order_by(
+            'pk').values_list('pk', flat=True)[:batch_size])
+        if not user_ids:
+            break
+        last_id = user_ids[-1]
+        awarded = evaluate_achievements(user_ids, achievements, notify=notify)
+        total += sum(len(names) for names in awarded.values())
+    logger.info(f"Achievement re-evaluation awarded {total} achievements")
+    return total
 
-            progress = 0
-            earned = False
-
-            if achievement.achievement_type == 'books_read':
-                books_read = Transaction.objects.filter(
-                    user=user, return_date__isnull=False).count()
-                progress = books_read
-                earned = progress >= achievement.requirement
-                print(
-                    f"📚 Books read: {books_read}, Required: {achievement.requirement}, Earned: {earned}")
-
-            elif achievement.achievement_type == 'genres_explored':
-                unique_genres = Transaction.objects.filter(
-                    user=user,
-                    return_date__isnull=False
-                ).values('book__genre').distinct().count()
-                progress = unique_genres
-                earned = progress >= achievement.requirement
-                print(
-                    f"🎭 Unique genres: {unique_genres}, Required: {achievement.requirement}, Earned: {earned}")
-
-            elif achievement.achievement_type == 'reviewer':
-                reviews_count = BookReview.objects.filter(user=user).count()
-                progress = reviews_count
-                earned = progress >= achievement.requirement
-                print(
-                    f"✍️ Reviews written: {reviews_count}, Required: {achievement.requirement}, Earned: {earned}")
-
-            elif achievement.achievement_type == 'speed_reader':
-                # Books read in current month
-                from datetime import timedelta
-                month_start = timezone.now().replace(
-                    day=1, hour=0, minute=0, second=0, microsecond=0)
-                monthly_books = Transaction.objects.filter(
-                    user=user,
-                    return_date__isnull=False,
-                    return_date__gte=month_start
-                ).count()
-                progress = monthly_books
-                earned = progress >= achievement.requirement
-                print(
-                    f"⚡ Monthly books: {monthly_books}, Required: {achievement.requirement}, Earned: {earned}")
-
-            if earned:
-                # Award achievement
-                user_achievement = UserAchievement.objects.create(
-                    user=user, achievement=achievement)
-                awarded.append(achievement.name)
-
-                # Send notification
-                NotificationManager.create_achievement_notification(
-                    user, achievement)
-
-                print(f"🎉 AWARDED: {achievement.name} to {user.username}")
-                logger.info(f"Awarded {achievement.name} to {user.username}")
-            elif progress > 0:
-                # Update progress if not earned
-                user_achievement, created = UserAchievement.objects.get_or_create(
-                    user=user,
-                    achievement=achievement,
-                    defaults={'progress': progress}
-                )
-                if not created and user_achievement.progress != progress:
-                    user_achievement.progress = progress
-                    user_achievement.save()
-                print(
-                    f"📊 Progress updated: {achievement.name} - {progress}/{achievement.requirement}")
-
-        print(f"✅ Achievement check complete. Awarded: {awarded}")
-        return awarded
 
+def check_and_award_achievements(user):
+    """
+    Check if user qualifies for any achievements and award them.
+    Returns the names of newly earned achievements.
+    """
+    try:
+        return evaluate_achievements([user.id]).get(user.id, [])
     except Exception as e:
-        print(f"❌ Error in achievement check: {e}")
         logger.error(f"Error awarding achievements: {e}")
         return []
 
 
-# ADD to your existing reading_utils.py - at the bottom
-
 def check_achievements_on_book_return(user, book):
     """
     Automatically check achievements when a book is returned
@@ -0,0 +1,584 @@
+# library/recommendation_utils.py
+import logging
+import os
+import struct
+import threading
+import time
+import zipfile
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max
+
+from .lazy_utils import lazy_module
+from .models import Book, Transaction
+
+# Only the recommender needs these - import them on first use
+np = lazy_module('numpy')
+sparse = lazy_module('scipy.sparse')
+feature_extraction = lazy_module('sklearn.feature_extraction')
+
+logger = logging.getLogger(__name__)
+
+# Same weights the old per-book scoring loop used
+GENRE_WEIGHT = 3.0
+AUTHOR_WEIGHT = 2.0
+RECENT_GENRE_BOOST = 1.5
+POPULARITY_WEIGHT = 0.1
+POPULARITY_CAP = 20
+
+AUTHOR_HASH_FEATURES = 2 ** 14
+
+
+class ContentRecommender:
+    """
+    Vectorized content-based recommender over the whole catalog
+
+    Every book is one sparse row laid out as
+    [genre one-hot | hashed author | capped popularity]. A user's
+    genre/author preferences are turned into a query vector with the same
+    layout, so scoring the catalog is a single matrix-vector product.
+    """
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __init__(self):
+        self.built_at = time.monotonic()
+        rows = list(
+            Book.objects.values('id', 'genre', 'author')
+            .annotate(borrow_count=Count('transaction'))
+            .order_by('id')
+            .values_list('id', 'genre', 'author', 'borrow_count')
+        )
+
+        # Imported books may carry genres outside GENRE_CHOICES, so the
+        # vocabulary is the declared choices plus whatever the catalog holds
+        self.genre_index = {}
+        for genre in [choice for choice, _ in Book.GENRE_CHOICES] + [row[1] for row in rows]:
+            self.genre_index.setdefault(genre, len(self.genre_index))
+        self.n_genres = len(self.genre_index)
+
+        self.hasher = feature_extraction.FeatureHasher(
+            n_features=AUTHOR_HASH_FEATURES,
+            input_type='string',
+            alternate_sign=False
+        )
+        self.author_offset = self.n_genres
+        self.popularity_column = self.author_offset + AUTHOR_HASH_FEATURES
+
+        self.book_ids = np.array([row[0] for row in rows], dtype=np.int64)
+        self.features = self._build_features(rows)
+
+        logger.info(
+            f"Content recommender built over {len(self.book_ids)} books")
+
+    def _build_features(self, rows):
+        n_books = len(rows)
+        n_columns = self.popularity_column + 1
+        if not n_books:
+            return sparse.csr_matrix((0, n_columns), dtype=np.float32)
+
+        genre_columns = np.array(
+            [self.genre_index[row[1]] for row in rows], dtype=np.int64)
+        genres = sparse.csr_matrix(
+            (np.ones(n_books, dtype=np.float32),
+             (np.arange(n_books), genre_columns)),
+            shape=(n_books, self.n_genres)
+        )
+
+        authors = self.hasher.transform(
+            [[self._author_key(row[2])] for row in rows]).astype(np.float32)
+
+        popularity = np.minimum(
+            np.array([row[3] for row in rows], dtype=np.float32), POPULARITY_CAP)
+
+        return sparse.hstack(
+            [genres, authors, sparse.csr_matrix(popularity.reshape(-1, 1))],
+            format='csr'
+        )
+
+    @staticmethod
+    def _author_key(author):
+        return (author or '').strip().lower()
+
+    def _author_column(self, author):
+        hashed = self.hasher.transform([[self._author_key(author)]])
+        return self.author_offset + int(hashed.indices[0])
+
+    def query_vector(self, preferences):
+        """
+        Turn get_enhanced_user_preferences() output into a query vector
+        """
+        query = np.zeros(self.popularity_column + 1, dtype=np.float32)
+
+        for genre, weight in preferences.get('genres', {}).items():
+            if genre in self.genre_index:
+                query[self.genre_index[genre]] += GENRE_WEIGHT * weight
+
+        for genre in preferences.get('recent_genres', ()):
+            if genre in self.genre_index:
+                query[self.genre_index[genre]] += RECENT_GENRE_BOOST
+
+        for author, weight in preferences.get('authors', {}).items():
+            query[self._author_column(author)] += AUTHOR_WEIGHT * weight
+
+        query[self.popularity_column] = POPULARITY_WEIGHT
+        return query
+
+    def rank(self, preferences, exclude_ids=(), limit=8):
+        """
+        Score the catalog and return the top (book_id, score) pairs
+        """
+        if limit <= 0 or not len(self.book_ids):
+            return []
+
+        scores = self.features @ self.query_vector(preferences)
+
+        if exclude_ids:
+            exclude = np.fromiter(exclude_ids, dtype=np.int64)
+            scores[np.isin(self.book_ids, exclude, assume_unique=False)] = 0
+
+        candidates = np.flatnonzero(scores > 0)
+        if not len(candidates):
+            return []
+
+        k = min(limit, len(candidates))
+        top = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(int(self.book_ids[i]), float(scores[i])) for i in top]
+
+    @classmethod
+    def get(cls):
+        """
+        Return the process-wide recommender, rebuilding it when stale
+        """
+        max_age = getattr(settings, 'RECOMMENDER_REBUILD_SECONDS', 600)
+        instance = cls._instance
+        if instance is None or time.monotonic() - instance.built_at > max_age:
+            with cls._lock:
+                instance = cls._instance
+                if instance is None or time.monotonic() - instance.built_at > max_age:
+                    instance = cls._instance = cls()
+        return instance
+
+    @classmethod
+    def reset(cls):
+        """Drop the cached matrices so the next call rebuilds them"""
+        with cls._lock:
+            cls._instance = None
+
+
+def _mmap_npz(path):
+    """
+    Memory-map every array of an uncompressed .npz archive
+
+    np.load() ignores mmap_mode for .npz files, so locate each member's
+    data inside the zip and map it directly.
+    """
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, open(path, 'rb') as fh:
+        for info in archive.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"{path} is compressed and cannot be memory-mapped")
+
+            # Local file header: 30 fixed bytes, then name and extra field
+            fh.seek(info.header_offset)
+            local_header = fh.read(30)
+            name_length, extra_length = struct.unpack('<HH', local_header[26:30])
+            fh.seek(info.header_offset + 30 + name_length + extra_length)
+
+            version = np.lib.format.read_magic(fh)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(fh)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(fh)
+
+            name = info.filename[:-4] if info.filename.endswith('.npy') else info.filename
+            if not int(np.prod(shape)):
+                arrays[name] = np.empty(shape, dtype=dtype)
+                continue
+            arrays[name] = np.memmap(
+                path, dtype=dtype, mode='r', offset=fh.tell(), shape=shape,
+                order='F' if fortran_order else 'C'
+            )
+    return arrays
+
+
+class CoBorrowIndex:
+    """
+    Item-item co-borrow similarity over Transaction(user, book) pairs
+
+    B is the binary user x book matrix and C = B.T @ B counts how many
+    readers borrowed both books (the diagonal is each book's reader count).
+    C is normalised to cosine or Jaccard similarity and kept in CSR form
+    indexed directly by book id, so a request only gathers the rows of
+    the books a user has read and sums them.
+    """
+
+    METRICS = ('cosine', 'jaccard')
+
+    _instance = None
+    _loaded_mtime = None
+    _lock = threading.Lock()
+
+    def __init__(self, user_books, counts, metric='cosine', last_transaction_id=0):
+        if metric not in self.METRICS:
+            raise ValueError(f"Unknown similarity metric: {metric}")
+        self.metric = metric
+        self._set_matrices(user_books, counts, last_transaction_id)
+
+    def _set_matrices(self, user_books, counts, last_transaction_id):
+        self.user_books = user_books
+        self.counts = counts
+        self.last_transaction_id = int(last_transaction_id)
+
+        self.indptr = counts.indptr
+        self.indices = counts.indices
+        self.similarity = self._normalise(counts, self.metric)
+
+    @property
+    def n_books(self):
+        return self.counts.shape[0]
+
+    @staticmethod
+    def _normalise(counts, metric):
+        co_counts = counts.data.astype(np.float32)
+        if not len(co_counts):
+            return co_counts
+
+        rows = np.repeat(
+            np.arange(counts.shape[0], dtype=np.int64), np.diff(counts.indptr))
+        cols = counts.indices
+        readers = counts.diagonal().astype(np.float32)
+
+        if metric == 'cosine':
+            denominator = np.sqrt(readers[rows] * readers[cols])
+        else:
+            denominator = readers[rows] + readers[cols] - co_counts
+
+        similarity = np.divide(
+            co_counts, denominator,
+            out=np.zeros_like(co_counts), where=denominator > 0)
+        # A book is not its own recommendation
+        similarity[rows == cols] = 0
+        return similarity
+
+    @staticmethod
+    def _pair_matrix(pairs, shape, row_ids=None):
+        """Binary CSR matrix from (user_id, book_id) pairs"""
+        if row_ids is not None:
+            position = {user_id: i for i, user_id in enumerate(row_ids)}
+            pairs = [(position[user_id], book_id) for user_id, book_id in pairs]
+        users = np.fromiter((p[0] for p in pairs), dtype=np.int64, count=len(pairs))
+        books = np.fromiter((p[1] for p in pairs), dtype=np.int64, count=len(pairs))
+        matrix = sparse.csr_matrix(
+            (np.ones(len(pairs), dtype=np.int32), (users, books)), shape=shape)
+        matrix.sum_duplicates()
+        matrix.data[:] = 1
+        return matrix
+
+    @staticmethod
+    def _shape_for(pairs, n_users=1, n_books=1):
+        max_book_id = Book.objects.aggregate(max_id=Max('id'))['max_id'] or 0
+        n_users = max([n_users] + [user_id + 1 for user_id, _ in pairs])
+        n_books = max([n_books, max_book_id + 1] + [book_id + 1 for _, book_id in pairs])
+        return n_users, n_books
+
+    @classmethod
+    def build(cls, metric='cosine'):
+        """
+        Build the index from scratch over every transaction
+        """
+        last_id = Transaction.objects.aggregate(max_id=Max('id'))['max_id'] or 0
+        pairs = list(
+            Transaction.objects.filter(id__lte=last_id)
+            .values_list('user_id', 'book_id').distinct()
+        )
+        shape = cls._shape_for(pairs)
+        user_books = cls._pair_matrix(pairs, shape)
+        counts = (user_books.T @ user_books).tocsr()
+        counts.sort_indices()
+
+        logger.info(
+            f"Co-borrow index built: {len(pairs)} pairs, {counts.nnz} co-borrow entries")
+        return cls(user_books, counts, metric, last_id)
+
+    def update(self):
+        """
+        Fold in transactions created since the last build
+
+        Only the rows of users with new transactions change, so
+        C += B_new.T @ B_new - B_old.T @ B_old over those users.
+        Returns the number of users whose rows were refreshed.
+        """
+        last_id = Transaction.objects.aggregate(max_id=Max('id'))['max_id'] or 0
+        if last_id <= self.last_transaction_id:
+            return 0
+
+        user_ids = sorted(set(
+            Transaction.objects.filter(
+                id__gt=self.last_transaction_id, id__lte=last_id
+            ).values_list('user_id', flat=True)
+        ))
+        pairs = list(
+            Transaction.objects.filter(user_id__in=user_ids, id__lte=last_id)
+            .values_list('user_id', 'book_id').distinct()
+        )
+
+        n_users, n_books = self._shape_for(pairs, *self.user_books.shape)
+        user_books = sparse.csr_matrix(self.user_books, dtype=np.int32, copy=True)
+        counts = sparse.csr_matrix(self.counts, dtype=np.int32, copy=True)
+        user_books.resize((n_users, n_books))
+        counts.resize((n_books, n_books))
+
+        old_rows = user_books[user_ids]
+        new_rows = self._pair_matrix(pairs, (len(user_ids), n_books), row_ids=user_ids)
+        counts = counts + (new_rows.T @ new_rows) - (old_rows.T @ old_rows)
+        counts.eliminate_zeros()
+        counts.sort_indices()
+
+        affected = np.zeros(n_users, dtype=np.int32)
+        affected[user_ids] = 1
+        user_books = (
+            user_books
+            - sparse.diags(affected, dtype=np.int32) @ user_books
+            + self._pair_matrix(pairs, (n_users, n_books))
+        ).tocsr()
+        user_books.eliminate_zeros()
+
+        self._set_matrices(user_books, counts, last_id)
+        logger.info(
+            f"Co-borrow index updated for {len(user_ids)} users up to transaction {last_id}")
+        return len(user_ids)
+
+    def save(self, path):
+        """
+        Write the index as an uncompressed .npz so it can be memory-mapped
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as fh:
+            np.savez(
+                fh,
+                meta=np.array([
+                    self.last_transaction_id,
+                    self.METRICS.index(self.metric),
+                    self.user_books.shape[0],
+                    self.n_books,
+                ], dtype=np.int64),
+                user_indptr=self.user_books.indptr,
+                user_indices=self.user_books.indices,
+                indptr=self.counts.indptr,
+                indices=self.counts.indices,
+                counts=self.counts.data,
+                similarity=self.similarity,
+            )
+        # Readers keep mapping the old file until the rename lands
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def open(cls, path):
+        """
+        Load a saved index with every array memory-mapped
+        """
+        arrays = _mmap_npz(path)
+        last_id, metric, n_users, n_books = (int(v) for v in arrays['meta'])
+
+        user_books = sparse.csr_matrix(
+            (np.ones(len(arrays['user_indices']), dtype=np.int32),
+             arrays['user_indices'], arrays['user_indptr']),
+            shape=(n_users, n_books), copy=False)
+        counts = sparse.csr_matrix(
+            (arrays['counts'], arrays['indices'], arrays['indptr']),
+            shape=(n_books, n_books), copy=False)
+
+        index = cls.__new__(cls)
+        index.user_books = user_books
+        index.counts = counts
+        index.metric = cls.METRICS[metric]
+        index.last_transaction_id = last_id
+        index.indptr = arrays['indptr']
+        index.indices = arrays['indices']
+        index.similarity = arrays['similarity']
+        return index
+
+    def rank(self, book_ids, exclude_ids=(), limit=5):
+        """
+        Sum the similarity rows of `book_ids` and return the top
+        (book_id, score) pairs
+        """
+        book_ids = [b for b in set(book_ids) if 0 <= b < self.n_books]
+        if limit <= 0 or not book_ids:
+            return []
+
+        starts = self.indptr[book_ids]
+        ends = self.indptr[np.asarray(book_ids) + 1]
+        columns = np.concatenate(
+            [self.indices[start:end] for start, end in zip(starts, ends)])
+        weights = np.concatenate(
+            [self.similarity[start:end] for start, end in zip(starts, ends)])
+        scores = np.bincount(columns, weights=weights, minlength=self.n_books)
+
+        exclude = [b for b in set(exclude_ids) | set(book_ids) if 0 <= b < self.n_books]
+        scores[exclude] = 0
+
+        candidates = np.flatnonzero(scores > 0)
+        if not len(candidates):
+            return []
+
+        k = min(limit, len(candidates))
+        top = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(int(i), float(scores[i])) for i in top]
+
+    @staticmethod
+    def index_path():
+        return getattr(
+            settings, 'CO_BORROW_INDEX_PATH',
+            os.path.join(settings.BASE_DIR, 'indexes', 'co_borrow.npz'))
+
+    @classmethod
+    def get(cls):
+        """
+        Return the saved index for this process, or None if none is built
+
+        The file is re-mapped whenever a rebuild has replaced it.
+        """
+        path = cls.index_path()
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            return None
+
+        if cls._instance is None or cls._loaded_mtime != mtime:
+            with cls._lock:
+                if cls._instance is None or cls._loaded_mtime != mtime:
+                    cls._instance = cls.open(path)
+                    cls._loaded_mtime = mtime
+        return cls._instance
+
+
+def rebuild_co_borrow_index(full=False, metric=None):
+    """
+    Update the saved co-borrow index incrementally, or rebuild it from
+    scratch when `full` is set, no index exists yet or the metric changed
+    """
+    path = CoBorrowIndex.index_path()
+    metric = metric or getattr(settings, 'CO_BORROW_SIMILARITY', 'cosine')
+
+    index = None
+    if not full and os.path.exists(path):
+        try:
+            index = CoBorrowIndex.open(path)
+        except Exception as e:
+            logger.warning(f"Could not open co-borrow index, rebuilding: {e}")
+
+    if index is None or index.metric != metric:
+        index = CoBorrowIndex.build(metric)
+    elif not index.update():
+        return index
+
+    index.save(path)
+    return index
+
+
+class RecommendationCache:
+    """
+    Per-user cache of ranked (book_id, score) pairs
+
+    Entries are keyed by a per-user generation counter. Reserving,
+    borrowing, returning or cancelling bumps the counter, which makes the
+    previous entry unreachable, so a user never sees recommendations
+    computed before their latest activity. Counters and stats live in the
+    default cache, which must be shared by every process (check library.W001).
+    """
+
+    TIMEOUT = 900
+    STATS_KEYS = {
+        'hits': 'recommendation_cache_hits',
+        'misses': 'recommendation_cache_misses',
+        'evictions': 'recommendation_cache_evictions',
+    }
+
+    @staticmethod
+    def _generation_key(user_id):
+        return f"user_{user_id}_recommendation_generation"
+
+    @staticmethod
+    def _entry_key(user_id, generation):
+        return f"user_{user_id}_recommendations_v{generation}"
+
+    @staticmethod
+    def _count(stat):
+        key = RecommendationCache.STATS_KEYS[stat]
+        try:
+            cache.incr(key)
+        except ValueError:
+            if not cache.add(key, 1, None):
+                cache.incr(key)
+
+    @staticmethod
+    def generation(user_id):
+        """Current generation for a user, seeding it on first use"""
+        key = RecommendationCache._generation_key(user_id)
+        generation = cache.get(key)
+        if generation is None:
+            # Seed from the clock so a counter lost to cache eviction can
+            # never come back at a value an old entry was stored under
+            seed = time.time_ns()
+            cache.add(key, seed, None)
+            generation = cache.get(key, seed)
+        return generation
+
+    @staticmethod
+    def bump(user_id):
+        """
+        Invalidate a user's cached recommendations
+        """
+        key = RecommendationCache._generation_key(user_id)
+        generation = cache.get(key)
+        if generation is None:
+            return
+
+        if cache.delete(RecommendationCache._entry_key(user_id, generation)):
+            RecommendationCache._count('evictions')
+        try:
+            cache.incr(key)
+        except ValueError:
+            pass
+
+    @staticmethod
+    def get_or_set(user_id, compute):
+        """
+        Return the cached ranking for a user, computing it on a miss
+        """
+        generation = RecommendationCache.generation(user_id)
+        entry_key = RecommendationCache._entry_key(user_id, generation)
+
+        ranked = cache.get(entry_key)
+        if ranked is not None:
+            RecommendationCache._count('hits')
+            return ranked
+
+        RecommendationCache._count('misses')
+        ranked = [(int(book_id), float(score)) for book_id, score in compute()]
+        # Stored under the generation read before computing: a bump that
+        # lands meanwhile leaves this entry unreachable rather than stale
+        cache.set(entry_key, ranked, RecommendationCache.TIMEOUT)
+        return ranked
+
+    @staticmethod
+    def stats():
+        values = cache.get_many(RecommendationCache.STATS_KEYS.values())
+        stats = {
+            stat: values.get(key, 0)
+            for stat, key in RecommendationCache.STATS_KEYS.items()
+        }
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else 0.0
+        return stats
+
+    @staticmethod
+    def reset_stats():
+        cache.delete_many(RecommendationCache.STATS_KEYS.values())
@@ -0,0 +1,174 @@
+# library/report_utils.py
+import hashlib
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Count, DecimalField, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import ReportJob, Transaction
+from .timeseries_utils import day_bounds, next_bucket
+
+logger = logging.getLogger(__name__)
+
+REPORT_TYPES = [value for value, _ in ReportJob.REPORT_TYPES]
+
+
+def report_range(report_type, start=None, end=None):
+    """
+    Normalized (start, end) dates of a report. Monthly reports cover the
+    whole calendar month of `start` (default: this month); custom ranges
+    end today unless told otherwise. Raises ValueError.
+    """
+    today = timezone.localdate()
+    if report_type == 'monthly':
+        start = (start or today).replace(day=1)
+        return start, next_bucket(start, 'month') - timedelta(days=1)
+    if report_type == 'custom':
+        if start is None:
+            raise ValueError('start_date is required for custom reports')
+        end = end or today
+        if start > end:
+            raise ValueError('start_date must not be after end_date')
+        return start, end
+    raise ValueError(f"Unknown report type: {report_type}")
+
+
+def reusable_jobs(report_type, start, end):
+    """
+    Jobs whose PDF can answer a request for this report: finished reports
+    of ended ranges forever, others for REPORT_MUTABLE_TTL seconds.
+    """
+    fresh_after = timezone.now() - timedelta(seconds=getattr(settings, 'REPORT_MUTABLE_TTL', 600))
+    return ReportJob.objects.filter(
+        report_type=report_type, start_date=start, end_date=end, status='done',
+    ).filter(Q(immutable=True) | Q(finished_at__gte=fresh_after)).order_by('-finished_at')
+
+
+def _schedule_render(job_id):
+    try:
+        from .tasks import render_report_job_task
+        render_report_job_task(job_id, schedule=0)
+    except Exception as e:
+        logger.warning(f"Could not schedule report job {job_id}, the periodic run will render it: {e}")
+
+
+def submit_report(report_type, start, end, user=None):
+    """
+    The job answering a report request: a reusable finished one, one
+    already queued or running, or a new pending job. Returns (job, created).
+    """
+    job = reusable_jobs(report_type, start, end).first()
+    if job:
+        return job, False
+
+    job = ReportJob.objects.filter(
+        report_type=report_type, start_date=start, end_date=end,
+        status__in=['pending', 'running'],
+    ).order_by('created_at').first()
+    if job:
+        return job, False
+
+    job = ReportJob.objects.create(
+        report_type=report_type, start_date=start, end_date=end, requested_by=user)
+    transaction.on_commit(lambda: _schedule_render(job.id))
+    return job, True
+
+
+def render_report_pdf(report_type, start, end):
+    """Render the report PDF for a date range (slow - run it in a worker)"""
+    import weasyprint
+
+    lower, upper = day_bounds(start, end)
+    transactions = Transaction.objects.filter(
+        issue_date__gte=lower, issue_date__lt=upper,
+    ).select_related('book', 'user').only(
+        'issue_date', 'due_date', 'return_date', 'fine_amount', 'book__title', 'user__username',
+    ).order_by('issue_date')
+    totals = transactions.aggregate(
+        total_borrows=Count('id'),
+        total_returns=Count('id', filter=Q(return_date__isnull=False)),
+        total_fines=Coalesce(Sum('fine_amount'), Value(0),
+                             output_field=DecimalField(max_digits=10, decimal_places=2)),
+    )
+
+    html_string = render_to_string('monthly_report.html', {
+        'report_type': report_type,
+        'period': start.strftime('%B %Y') if report_type == 'monthly' else f"{start} to {end}",
+        'transactions': transactions,
+        **totals,
+    })
+    return weasyprint.HTML(string=html_string).write_pdf()
+
+
+def run_report_job(job_id):
+    """
+    Render one pending job and store its PDF under its content hash.
+    The job is claimed with a conditional UPDATE, so duplicate runs are
+    harmless. Returns True if this call rendered it.
+    """
+    claimed = ReportJob.objects.filter(id=job_id, status='pending').update(
+        status='running', started_at=timezone.now())
+    if not claimed:
+        return False
+
+    job = ReportJob.objects.get(id=job_id)
+    try:
+        # Decided before rendering: data of a range still open may change
+        immutable = job.end_date < timezone.localdate()
+        pdf = render_report_pdf(job.report_type, job.start_date, job.end_date)
+        content_hash = hashlib.sha256(pdf).hexdigest()
+        name = f"reports/{content_hash}.pdf"
+        if not default_storage.exists(name):
+            name = default_storage.save(name, ContentFile(pdf))
+    except Exception as e:
+        logger.error(f"Report job {job_id} failed: {e}")
+        ReportJob.objects.filter(id=job_id).update(
+            status='failed', error=str(e)[:2000], finished_at=timezone.now())
+        return True
+
+    ReportJob.objects.filter(id=job_id).update(
+        status='done', file=name, content_hash=content_hash,
+        immutable=immutable, finished_at=timezone.now())
+    logger.info(f"Rendered {job.report_type} report {job.start_date} to {job.end_date} ({len(pdf)} bytes)")
+    return True
+
+
+def run_pending_report_jobs(limit=None, stale_after=timedelta(minutes=30)):
+    """
+    Render every pending job, first re-queueing jobs stuck 'running' past
+    `stale_after` (their worker died). Returns the number rendered.
+    """
+    ReportJob.objects.filter(
+        status='running', started_at__lt=timezone.now() - stale_after,
+    ).update(status='pending')
+
+    job_ids = ReportJob.objects.filter(status='pending').order_by('created_at').values_list('id', flat=True)
+    if limit:
+        job_ids = job_ids[:limit]
+    return sum(run_report_job(job_id) for job_id in list(job_ids))
+
+
+def prune_report_jobs(days=7):
+    """
+    Delete failed jobs and superseded reports of open ranges older than
+    `days`, with PDFs no remaining job points at. Returns jobs deleted.
+    """
+    cutoff = timezone.now() - timedelta(days=days)
+    stale = ReportJob.objects.filter(
+        Q(status='failed') | Q(status='done', immutable=False),
+        created_at__lt=cutoff,
+    )
+    files = set(stale.exclude(file='').values_list('file', flat=True))
+    deleted, _ = stale.delete()
+
+    in_use = set(ReportJob.objects.filter(file__in=files).values_list('file', flat=True))
+    for name in files - in_use:
+        default_storage.delete(name)
+    return deleted
@@ -0,0 +1,491 @@
+# library/search_utils.py
+import bisect
+import logging
+import math
+import re
+import threading
+import time
+
+from django.conf import settings
+
+from .catalog_utils import get_catalog_stamp
+from .lazy_utils import lazy_module
+from .models import Book
+
+np = lazy_module('numpy')
+
+logger = logging.getLogger(__name__)
+
+TOKEN_RE = re.compile(r'\w+')
+
+
+def tokenize(text):
+    return TOKEN_RE.findall((text or '').lower())
+
+
+class BookSearchIndex:
+    """
+    In-process inverted index over book title/author/description
+
+    Hits are ranked with BM25 over field-weighted term frequencies. The
+    last query token is matched as a prefix for search-as-you-type; every
+    token must match. The index is updated in place from Book signals and
+    catches up with other processes' writes via the catalog stamp.
+    """
+
+    FIELD_WEIGHTS = (('title', 3.0), ('author', 2.0), ('description', 1.0))
+    K1 = 1.2
+    B = 0.75
+    MAX_PREFIX_EXPANSIONS = 50
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __init__(self):
+        self.postings = {}      # term -> {book_id: weighted term frequency}
+        self.doc_terms = {}     # book_id -> {term: weighted term frequency}
+        self.doc_lengths = {}   # book_id -> weighted document length
+        self.total_length = 0.0
+        self.terms = []         # sorted vocabulary for prefix lookups
+        self.stamp = (None, 0)
+        self.checked_at = time.monotonic()
+        self.lock = threading.RLock()
+
+    @classmethod
+    def build(cls):
+        index = cls()
+        stamp = get_catalog_stamp()
+        for row in Book.objects.values_list(
+                'id', 'title', 'author', 'description').iterator(chunk_size=2000):
+            index.add(*row)
+        index.stamp = stamp
+        logger.info(
+            f"Search index built: {len(index.doc_lengths)} books, {len(index.terms)} terms")
+        return index
+
+    def add(self, book_id, title, author, description):
+        """Index (or re-index) one book"""
+        weighted = {}
+        length = 0.0
+        for text, (_, weight) in zip((title, author, description), self.FIELD_WEIGHTS):
+            tokens = tokenize(text)
+            length += weight * len(tokens)
+            for token in tokens:
+                weighted[token] = weighted.get(token, 0.0) + weight
+
+        with self.lock:
+            self.remove(book_id)
+            for term, frequency in weighted.items():
+                postings = self.postings.get(term)
+                if postings is None:
+                    postings = self.postings[term] = {}
+                    bisect.insort(self.terms, term)
+                postings[book_id] = frequency
+            self.doc_terms[book_id] = weighted
+            self.doc_lengths[book_id] = length
+            self.total_length += length
+
+    def remove(self, book_id):
+        with self.lock:
+            weighted = self.doc_terms.pop(book_id, None)
+            if weighted is None:
+                return
+            for term in weighted:
+                postings = self.postings[term]
+                postings.pop(book_id, None)
+                if not postings:
+                    del self.postings[term]
+                    del self.terms[bisect.bisect_left(self.terms, term)]
+            self.total_length -= self.doc_lengths.pop(book_id)
+
+    def _expand(self, token, prefix):
+        if not prefix:
+            return [token] if token in self.postings else []
+        start = bisect.bisect_left(self.terms, token)
+        expansions = []
+        for term in self.terms[start:start + self.MAX_PREFIX_EXPANSIONS]:
+            if not term.startswith(token):
+                break
+            expansions.append(term)
+        return expansions
+
+    def search(self, query):
+        """
+        Ranked [(book_id, score)] for a free-text query, best first
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        # Still typing the last word unless the query ends with a space
+        prefix_last = not query[-1:].isspace()
+
+        with self.lock:
+            n_docs = len(self.doc_lengths)
+            if not n_docs:
+                return []
+            average_length = self.total_length / n_docs or 1.0
+
+            scores = None
+            for position, token in enumerate(tokens):
+                prefix = prefix_last and position == len(tokens) - 1
+                token_scores = {}
+                for term in self._expand(token, prefix):
+                    postings = self.postings[term]
+                    idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                    for book_id, frequency in postings.items():
+                        norm = self.K1 * (1 - self.B + self.B * self.doc_lengths[book_id] / average_length)
+                        score = idf * frequency * (self.K1 + 1) / (frequency + norm)
+                        # Several expansions of one prefix count once
+                        if score > token_scores.get(book_id, 0.0):
+                            token_scores[book_id] = score
+
+                if scores is None:
+                    scores = token_scores
+                else:
+                    scores = {
+                        book_id: score + token_scores[book_id]
+                        for book_id, score in scores.items() if book_id in token_scores
+                    }
+                if not scores:
+                    return []
+
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+    def refresh(self):
+        """
+        Catch up with books saved or deleted by other processes
+        """
+        stamp = get_catalog_stamp()
+        self.checked_at = time.monotonic()
+        if stamp == self.stamp:
+            return
+
+        last_modified = self.stamp[0]
+        changed = Book.objects.all()
+        if last_modified is not None:
+            changed = changed.filter(updated_at__gte=last_modified)
+        for row in changed.values_list('id', 'title', 'author', 'description'):
+            self.add(*row)
+
+        if len(self.doc_lengths) != stamp[1]:
+            live_ids = set(Book.objects.values_list('id', flat=True))
+            for book_id in set(self.doc_lengths) - live_ids:
+                self.remove(book_id)
+        self.stamp = stamp
+
+    @classmethod
+    def get(cls):
+        """
+        Return the process-wide index, building or refreshing it as needed
+        """
+        max_age = getattr(settings, 'SEARCH_INDEX_REFRESH_SECONDS', 5)
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = cls.build()
+            elif time.monotonic() - cls._instance.checked_at > max_age:
+                cls._instance.refresh()
+            return cls._instance
+
+    @classmethod
+    def book_saved(cls, book):
+        """post_save hook: re-index the book if the index is loaded"""
+        if cls._instance is not None:
+            cls._instance.add(book.id, book.title, book.author, book.description)
+
+    @classmethod
+    def book_deleted(cls, book_id):
+        """post_delete hook: drop the book if the index is loaded"""
+        if cls._instance is not None:
+            cls._instance.remove(book_id)
+
+
+def post_filter_ranked(ranked_ids, queryset, chunk_size=500):
+    """
+    Keep the ranked ids that also match `queryset`, preserving rank order
+    """
+    matching = set()
+    for start in range(0, len(ranked_ids), chunk_size):
+        matching.update(queryset.filter(
+            id__in=ranked_ids[start:start + chunk_size]
+        ).values_list('id', flat=True))
+    return [book_id for book_id in ranked_ids if book_id in matching]
+
+
+def _trigram_keys(padded):
+    """
+    Integer keys of every trigram in `padded` (a str or a list of str),
+    computed over UTF-32 code points; trigrams spanning a NUL are dropped
+    """
+    text = '\0'.join(padded) if isinstance(padded, list) else padded
+    codes = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+    if len(codes) < 3:
+        return codes[:0], np.zeros(0, dtype=bool)
+    keys = (codes[:-2] << np.uint64(42)) | (codes[1:-1] << np.uint64(21)) | codes[2:]
+    valid = (codes[:-2] != 0) & (codes[1:-1] != 0) & (codes[2:] != 0)
+    return keys, valid
+
+
+def prefix_edit_distance(query, text, max_edits):
+    """
+    Smallest edit distance (adjacent transpositions count as one edit)
+    between `query` and a prefix of any word-aligned suffix of `text`,
+    or None when it exceeds `max_edits`
+    """
+    best = None
+    starts = [0] + [i + 1 for i, char in enumerate(text) if char == ' ']
+    for start in starts:
+        window = text[start:start + len(query) + max_edits]
+        if window.startswith(query):
+            return 0
+        before_previous = None
+        previous = list(range(len(window) + 1))
+        for i, query_char in enumerate(query, 1):
+            current = [i]
+            for j, text_char in enumerate(window, 1):
+                cost = min(
+                    previous[j] + 1,
+                    current[j - 1] + 1,
+                    previous[j - 1] + (query_char != text_char)
+                )
+                if (i > 1 and j > 1 and query_char == window[j - 2]
+                        and query[i - 2] == text_char):
+                    cost = min(cost, before_previous[j - 2] + 1)
+                current.append(cost)
+            if min(current) > max_edits:
+                break
+            before_previous, previous = previous, current
+        else:
+            distance = min(previous)
+            if distance <= max_edits and (best is None or distance < best):
+                best = distance
+    return best
+
+
+class SuggestIndex:
+    """
+    Typo-tolerant autocomplete over book titles and authors
+
+    Entries live in two joined strings (normalised and display form)
+    addressed by offset arrays, and the trigram postings are a CSR pair
+    of numpy arrays, so memory stays flat as the catalog grows. Trigram
+    overlap picks candidates and a bounded prefix edit distance verifies
+    them. Edits since the last build go to a small overlay plus a
+    tombstone mask; the arrays are rebuilt once the overlay fills up.
+    """
+
+    TITLE, AUTHOR = 0, 1
+    KINDS = ('title', 'author')
+    OVERLAY_LIMIT = 256
+    MAX_CANDIDATES = 64
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __init__(self, rows):
+        # Titles first, in book id order, so a book's entry is found by bisection
+        rows = sorted(rows)
+        authors = {}
+        for _, _, author in rows:
+            key = self.normalise(author)
+            if key:
+                authors.setdefault(key, author.strip())
+
+        displays = [title.strip() for _, title, _ in rows] + list(authors.values())
+        normalised = [self.normalise(title) for _, title, _ in rows] + list(authors)
+
+        self.n_titles = len(rows)
+        self.book_ids = np.array([row[0] for row in rows], dtype=np.int64)
+        self.kinds = np.array(
+            [self.TITLE] * len(rows) + [self.AUTHOR] * len(authors), dtype=np.int8)
+
+        self.display_blob, self.display_offsets = self._pack(displays)
+        self.norm_blob, self.norm_offsets = self._pack(normalised)
+        self.dead = np.zeros(len(normalised), dtype=bool)
+        self._build_postings(normalised)
+
+        self.overlay = []  # (normalised, display, kind, book_id)
+        self.stale = False
+        self.stamp = (None, 0)
+        self.checked_at = time.monotonic()
+        self.lock = threading.RLock()
+
+    @staticmethod
+    def normalise(text):
+        return ' '.join(tokenize(text))
+
+    @staticmethod
+    def _pack(strings):
+        offsets = np.zeros(len(strings) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(s) for s in strings])
+        return ''.join(strings), offsets
+
+    def _build_postings(self, normalised):
+        padded = [f' {text} ' for text in normalised]
+        keys, valid = _trigram_keys(padded)
+        # Code point i of the joined text belongs to entry owner[i]
+        lengths = np.array([len(p) + 1 for p in padded], dtype=np.int64)
+        owner = np.repeat(np.arange(len(padded), dtype=np.int32), lengths)[:len(keys)]
+        keys, owner = keys[valid], owner[valid]
+
+        order = np.lexsort((owner, keys))
+        keys, owner = keys[order], owner[order]
+        distinct = np.ones(len(keys), dtype=bool)
+        distinct[1:] = (keys[1:] != keys[:-1]) | (owner[1:] != owner[:-1])
+        keys, owner = keys[distinct], owner[distinct]
+
+        self.keys, starts = np.unique(keys, return_index=True)
+        self.indptr = np.append(starts, len(keys)).astype(np.int64)
+        self.postings = owner
+
+    def _norm(self, entry):
+        return self.norm_blob[self.norm_offsets[entry]:self.norm_offsets[entry + 1]]
+
+    def _display(self, entry):
+        return self.display_blob[self.display_offsets[entry]:self.display_offsets[entry + 1]]
+
+    @classmethod
+    def build(cls):
+        stamp = get_catalog_stamp()
+        index = cls(list(Book.objects.values_list('id', 'title', 'author')))
+        index.stamp = stamp
+        logger.info(
+            f"Suggest index built: {len(index.kinds)} entries, {len(index.keys)} trigrams")
+        return index
+
+    @staticmethod
+    def max_edits_for(query):
+        if len(query) < 4:
+            return 0
+        return 1 if len(query) < 8 else 2
+
+    def suggest(self, query, limit=8):
+        """
+        Top title/author suggestions for a partially typed, possibly
+        misspelt query
+        """
+        query = self.normalise(query)
+        if len(query) < 2:
+            return []
+        max_edits = self.max_edits_for(query)
+
+        keys, valid = _trigram_keys(f' {query}')
+        keys = np.unique(keys[valid])
+        positions = np.searchsorted(self.keys, keys)
+        found = positions < len(self.keys)
+        found[found] = self.keys[positions[found]] == keys[found]
+        positions = positions[found]
+
+        with self.lock:
+            matches = []
+            if len(positions):
+                hits = np.concatenate([
+                    self.postings[self.indptr[p]:self.indptr[p + 1]] for p in positions])
+                overlap = np.bincount(hits, minlength=len(self.kinds))
+                overlap[self.dead] = 0
+                # Each edit can break at most three of the query's trigrams
+                needed = max(1, len(keys) - 3 * max_edits)
+                candidates = np.flatnonzero(overlap >= needed)
+                if len(candidates) > self.MAX_CANDIDATES:
+                    top = np.argpartition(-overlap[candidates], self.MAX_CANDIDATES - 1)
+                    candidates = candidates[top[:self.MAX_CANDIDATES]]
+
+                for entry in candidates:
+                    distance = prefix_edit_distance(query, self._norm(entry), max_edits)
+                    if distance is not None:
+                        book_id = int(self.book_ids[entry]) if entry < self.n_titles else None
+                        matches.append((
+                            distance, -int(overlap[entry]), len(self._norm(entry)),
+                            self._display(entry), int(self.kinds[entry]), book_id))
+
+            for normalised, display, kind, book_id in self.overlay:
+                distance = prefix_edit_distance(query, normalised, max_edits)
+                if distance is not None:
+                    matches.append((distance, 0, len(normalised), display, kind, book_id))
+
+        suggestions, seen = [], set()
+        for distance, _, _, display, kind, book_id in sorted(matches, key=lambda m: m[:3]):
+            # An author appears once however many books they wrote
+            key = (kind, display.lower()) if kind == self.AUTHOR else (kind, book_id)
+            if key in seen:
+                continue
+            seen.add(key)
+            suggestion = {'text': display, 'type': self.KINDS[kind], 'distance': distance}
+            if book_id is not None:
+                suggestion['book_id'] = book_id
+            suggestions.append(suggestion)
+            if len(suggestions) >= limit:
+                break
+        return suggestions
+
+    def _title_entry(self, book_id):
+        position = int(np.searchsorted(self.book_ids, book_id))
+        if position < self.n_titles and self.book_ids[position] == book_id:
+            return position
+        return None
+
+    def remove_book(self, book_id):
+        with self.lock:
+            entry = self._title_entry(book_id)
+            if entry is not None:
+                self.dead[entry] = True
+            self.overlay = [item for item in self.overlay if item[3] != book_id]
+
+    def upsert_book(self, book_id, title, author):
+        with self.lock:
+            self.remove_book(book_id)
+            self.overlay.append((self.normalise(title), title.strip(), self.TITLE, book_id))
+            author_key = self.normalise(author)
+            if author_key and not any(
+                    item[2] == self.AUTHOR and item[0] == author_key for item in self.overlay):
+                self.overlay.append((author_key, author.strip(), self.AUTHOR, None))
+            if len(self.overlay) > self.OVERLAY_LIMIT:
+                self.stale = True
+
+    def refresh(self):
+        """
+        Catch up with books saved or deleted by other processes
+        """
+        stamp = get_catalog_stamp()
+        self.checked_at = time.monotonic()
+        if stamp == self.stamp:
+            return
+        if self.stamp[0] is None:
+            self.stale = True
+            return
+
+        for row in Book.objects.filter(
+                updated_at__gte=self.stamp[0]).values_list('id', 'title', 'author'):
+            self.upsert_book(*row)
+
+        live_titles = self.n_titles - int(self.dead[:self.n_titles].sum()) + sum(
+            1 for item in self.overlay if item[2] == self.TITLE)
+        if live_titles != stamp[1]:
+            # Deletions elsewhere: cheaper to rebuild than to diff ids here
+            self.stale = True
+        self.stamp = stamp
+
+    @classmethod
+    def get(cls):
+        """
+        Return the process-wide suggest index, building or refreshing it as needed
+        """
+        max_age = getattr(settings, 'SEARCH_INDEX_REFRESH_SECONDS', 5)
+        with cls._lock:
+            instance = cls._instance
+            if instance is not None and time.monotonic() - instance.checked_at > max_age:
+                instance.refresh()
+            if instance is None or instance.stale:
+                instance = cls._instance = cls.build()
+            return instance
+
+    @classmethod
+    def book_saved(cls, book):
+        """post_save hook: overlay the book if the index is loaded"""
+        if cls._instance is not None:
+            cls._instance.upsert_book(book.id, book.title, book.author)
+
+    @classmethod
+    def book_deleted(cls, book_id):
+        """post_delete hook: tombstone the book if the index is loaded"""
+        if cls._instance is not None:
+            cls._instance.remove_book(book_id)
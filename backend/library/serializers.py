@@ -166,11 +166,65 @@ class BookReviewSerializer(serializers.ModelSerializer):
 # REPLACE your existing BookSerializer with this enhanced version:
 
 
+class BookCatalogSerializer(serializers.ModelSerializer):
+    """
+    Slim book representation for catalog listings.
+    Pass fields=[...] to serialize only a subset of the fields.
+    """
+    cover_image_url = serializers.SerializerMethodField()
+    effectively_available = serializers.ReadOnlyField()
+    average_rating = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = Book
+        fields = [
+            'id', 'title', 'author', 'genre', 'publication_year', 'is_academic',
+            'available_copies', 'effectively_available', 'average_rating',
+            'rating_count', 'cover_image_url'
+        ]
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    def get_cover_image_url(self, obj):
+        if obj.cover_image:
+            request = self.context.get('request')
+            if request:
+                return request.build_absolute_uri(obj.cover_image.url)
+            return obj.cover_image.url
+        return None
+
+
+class BookListSerializer(serializers.ListSerializer):
+    """
+    Prefetches the current user's ratings for the whole page in one query
+    """
+
+    def to_representation(self, data):
+        books = data.all() if hasattr(data, 'all') else data
+        books = list(books)
+
+        request = self.context.get('request')
+        if request and request.user.is_authenticated:
+            user_ratings = self.context.setdefault('user_ratings', {})
+            user_ratings.update(BookRating.objects.filter(
+                user=request.user,
+                book_id__in=[book.id for book in books]
+            ).values_list('book_id', 'rating'))
+
+        return super().to_representation(books)
+
+
 class BookSerializer(serializers.ModelSerializer):
     cover_image_url = serializers.SerializerMethodField()
     qr_code_url = serializers.SerializerMethodField()
-    average_rating = serializers.SerializerMethodField()
-    rating_count = serializers.SerializerMethodField()
+    average_rating = serializers.FloatField(read_only=True)
+    rating_count = serializers.IntegerField(read_only=True)
+    rating_sum = serializers.IntegerField(read_only=True)
     user_rating = serializers.SerializerMethodField()
     # ✅ ADD these new fields for reservation system
     effectively_available = serializers.ReadOnlyField()
@@ -180,6 +234,7 @@ class BookSerializer(serializers.ModelSerializer):
     class Meta:
         model = Book
         fields = '__all__'
+        list_serializer_class = BookListSerializer
 
     def get_cover_image_url(self, obj):
         if obj.cover_image:
@@ -197,22 +252,13 @@ class BookSerializer(serializers.ModelSerializer):
             return obj.qr_code.url
         return None
 
-    def get_average_rating(self, obj):
-        """Calculate average rating for the book - FIXED to always return a number"""
-        from django.db.models import Avg
-        result = BookRating.objects.filter(book=obj).aggregate(Avg('rating'))
-        avg_rating = result['rating__avg'] or 0
-        return round(avg_rating, 1)  # Always return a number, never None
-
-    def get_rating_count(self, obj):
-        """Get total number of ratings - FIXED to always return a number"""
-        count = BookRating.objects.filter(book=obj).count()
-        return count  # Always return a number, never None
-
     def get_user_rating(self, obj):
         """Get current user's rating for this book"""
         request = self.context.get('request')
         if request and request.user.is_authenticated:
+            # Prefetched by BookListSerializer when serializing many books
+            if isinstance(self.parent, BookListSerializer):
+                return self.context.get('user_ratings', {}).get(obj.id)
             try:
                 rating = BookRating.objects.get(book=obj, user=request.user)
                 return rating.rating
@@ -1,9 +1,11 @@
 # library/signals.py
 import logging
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import UserProfile, UserNotificationPreference, UserAchievement
+from .models import (
+    Achievement, Book, Transaction, UserProfile, UserNotificationPreference, UserAchievement
+)
 
 logger = logging.getLogger(__name__)
 
@@ -44,13 +46,86 @@ def create_user_notification_preferences(sender, instance, created, **kwargs):
         UserNotificationPreference.objects.create(user=instance)
         logger.info(f"Created notification preferences for user: {instance.username}")
 
+
+@receiver(post_save, sender=UserNotificationPreference)
+@receiver(post_delete, sender=UserNotificationPreference)
+def invalidate_notification_preferences(sender, instance, **kwargs):
+    """
+    Drop the cached preference bitmask whenever preferences are created,
+    updated (e.g. by the notification_preferences PUT view) or deleted
+    """
+    from .preference_utils import NotificationPreferenceResolver
+    NotificationPreferenceResolver.invalidate(instance.user_id)
+
+
+@receiver(post_save, sender=Transaction)
+@receiver(post_delete, sender=Transaction)
+def invalidate_borrowing_summary(sender, instance, **kwargs):
+    """
+    Drop the user's cached borrow eligibility summary when one of their
+    transactions changes (queryset updates call this themselves)
+    """
+    from .eligibility_utils import invalidate_borrowing_summary
+    invalidate_borrowing_summary(instance.user_id)
+
 # Add achievement notification signal
 @receiver(post_save, sender=UserAchievement)
 def handle_achievement_earned(sender, instance, created, **kwargs):
     """
     Send notification when user earns an achievement
     """
-    if created:
+    # The achievement engine bulk-creates rows and notifies by itself;
+    # this covers rows saved one at a time (e.g. from the admin)
+    if created and instance.progress >= instance.achievement.requirement:
         from .notification_utils import NotificationManager
-        NotificationManager.create_achievement_notification(instance.user, instance.achievement)
-        logger.info(f"Achievement notification sent for {instance.user.username}")
\ No newline at end of file
+        NotificationManager.send_achievement_notification(instance.user, instance.achievement)
+        logger.info(f"Achievement notification sent for {instance.user.username}")
+
+
+@receiver(post_save, sender=Achievement)
+def reevaluate_new_achievement(sender, instance, created, **kwargs):
+    """
+    Award a newly added achievement to users who already qualify, in a
+    background batch over all users
+    """
+    if created:
+        from django.db import transaction
+        from .tasks import reevaluate_achievement_task
+        transaction.on_commit(lambda: reevaluate_achievement_task(instance.id))
+
+
+@receiver(post_save, sender=Book)
+def queue_book_qr_code(sender, instance, created, **kwargs):
+    """
+    Render the QR code of new books in a background batch instead of
+    inside Book.save
+    """
+    if created and not instance.qr_code:
+        from django.db import transaction
+        from .qr_utils import schedule_book_qr_generation
+        transaction.on_commit(schedule_book_qr_generation)
+
+
+SEARCHABLE_BOOK_FIELDS = {'title', 'author', 'description'}
+
+
+@receiver(post_save, sender=Book)
+def index_saved_book(sender, instance, update_fields=None, **kwargs):
+    """
+    Keep the in-process search and suggest indexes in step with book edits
+    """
+    if update_fields and not SEARCHABLE_BOOK_FIELDS & set(update_fields):
+        return
+    from .search_utils import BookSearchIndex, SuggestIndex
+    BookSearchIndex.book_saved(instance)
+    SuggestIndex.book_saved(instance)
+
+
+@receiver(post_delete, sender=Book)
+def unindex_deleted_book(sender, instance, **kwargs):
+    """
+    Drop deleted books from the in-process search and suggest indexes
+    """
+    from .search_utils import BookSearchIndex, SuggestIndex
+    BookSearchIndex.book_deleted(instance.id)
+    SuggestIndex.book_deleted(instance.id)
@@ -0,0 +1,223 @@
+# library/stats_utils.py
+import logging
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import Count, Max, Min, Q, Sum
+from django.utils import timezone
+
+from .models import AuditLog, DailyLibraryStats, Transaction
+from .timeseries_utils import (
+    bucket_range, bucket_start, day_bounds, grouped_time_series, time_series
+)
+
+logger = logging.getLogger(__name__)
+
+# Per-day counters that add up across days
+SUMMED_FIELDS = (
+    'borrows', 'returns', 'new_users', 'fines_assessed', 'fines_collected',
+    'audit_events', 'permission_denials', 'role_changes',
+)
+STAT_FIELDS = SUMMED_FIELDS + ('overdue_snapshot', 'genre_borrows')
+
+ROLLUP_CHUNK_DAYS = 31
+# Minimum seconds between rollups queued by dashboards that found a gap
+ROLLUP_TRIGGER_INTERVAL = 600
+
+
+def _overdue_at(moment):
+    """Loans that were past due and still out at `moment`"""
+    return Transaction.objects.filter(
+        issue_date__lt=moment,
+        due_date__lt=moment
+    ).filter(
+        Q(return_date__isnull=True) | Q(return_date__gte=moment)
+    ).count()
+
+
+def compute_daily_stats(start, end, overdue=True):
+    """
+    Compute the stats of every day from `start` to `end` straight from the
+    source tables - a handful of GROUP BY queries for the whole range plus,
+    unless `overdue` is False, one overdue count per day (overdue_snapshot
+    is None then).
+    """
+    days = {
+        day: {'date': day, **{field: 0 for field in SUMMED_FIELDS}, 'genre_borrows': {}}
+        for day in bucket_range(start, end, 'day')
+    }
+    if not days:
+        return []
+
+    sources = [
+        (Transaction.objects.all(), 'issue_date', {
+            'borrows': Count('id'),
+        }),
+        (Transaction.objects.all(), 'return_date', {
+            'returns': Count('id'),
+            'fines_assessed': Sum('fine_amount'),
+        }),
+        (Transaction.objects.filter(fine_paid=True), 'fine_paid_date', {
+            'fines_collected': Sum('fine_amount'),
+        }),
+        (User.objects.all(), 'date_joined', {
+            'new_users': Count('id'),
+        }),
+        (AuditLog.objects.all(), 'timestamp', {
+            'audit_events': Count('id'),
+            'permission_denials': Count('id', filter=Q(action_type='permission_denied')),
+            'role_changes': Count('id', filter=Q(action_type='role_change')),
+        }),
+    ]
+    for queryset, date_field, aggregates in sources:
+        for bucket in time_series(queryset, date_field, start, end, 'day', **aggregates):
+            days[bucket['period']].update(
+                (name, bucket[name]) for name in aggregates)
+
+    genres = grouped_time_series(
+        Transaction.objects.all(), 'issue_date', 'book__genre', start, end,
+        'day', borrows=Count('id'))
+    for genre, series in genres.items():
+        for bucket in series:
+            if bucket['borrows']:
+                days[bucket['period']]['genre_borrows'][genre or ''] = bucket['borrows']
+
+    now = timezone.now()
+    for day, stats in days.items():
+        stats['overdue_snapshot'] = (
+            _overdue_at(min(day_bounds(day, day)[1], now)) if overdue else None)
+
+    return list(days.values())
+
+
+def _first_activity_date():
+    """Local date of the oldest transaction, user or audit event"""
+    firsts = [
+        Transaction.objects.aggregate(first=Min('issue_date'))['first'],
+        User.objects.aggregate(first=Min('date_joined'))['first'],
+        AuditLog.objects.aggregate(first=Min('timestamp'))['first'],
+    ]
+    firsts = [first for first in firsts if first is not None]
+    return timezone.localdate(min(firsts)) if firsts else None
+
+
+def rollup_daily_stats(since=None, until=None):
+    """
+    Write DailyLibraryStats rows for closed days (never today).
+
+    By default only the days after the last rolled-up one are processed;
+    pass `since` to recompute from that date. Returns the number of days
+    written.
+    """
+    yesterday = timezone.localdate() - timedelta(days=1)
+    until = min(until or yesterday, yesterday)
+
+    if since is None:
+        last = DailyLibraryStats.objects.aggregate(last=Max('date'))['last']
+        since = last + timedelta(days=1) if last else _first_activity_date()
+    if since is None or since > until:
+        return 0
+
+    written = 0
+    chunk_start = since
+    while chunk_start <= until:
+        chunk_end = min(chunk_start + timedelta(days=ROLLUP_CHUNK_DAYS - 1), until)
+        DailyLibraryStats.objects.bulk_create(
+            [DailyLibraryStats(**stats) for stats in compute_daily_stats(chunk_start, chunk_end)],
+            update_conflicts=True,
+            unique_fields=['date'],
+            update_fields=list(STAT_FIELDS),
+        )
+        written += (chunk_end - chunk_start).days + 1
+        chunk_start = chunk_end + timedelta(days=1)
+
+    logger.info(f"Rolled up library stats for {since} - {until} ({written} days)")
+    return written
+
+
+def _trigger_rollup():
+    """Queue a rollup for days a dashboard found missing, at most every few minutes"""
+    if cache.add('library_stats_rollup_triggered', True, ROLLUP_TRIGGER_INTERVAL):
+        from .tasks import rollup_daily_stats_task
+        rollup_daily_stats_task(schedule=0)
+
+
+def get_daily_stats(start, end):
+    """
+    Stats of every day from `start` to `end` (capped at today), oldest
+    first. Closed days come from the rollup table; today, and any day the
+    rollup has not reached yet, are computed live. Only today gets a live
+    overdue_snapshot (None on other live days); missing closed days queue
+    the rollup instead.
+    """
+    today = timezone.localdate()
+    end = min(end, today)
+    if start > end:
+        return []
+
+    stored = {
+        row['date']: row
+        for row in DailyLibraryStats.objects.filter(
+            date__range=(start, end)
+        ).values('date', *STAT_FIELDS)
+    }
+    missing = [day for day in bucket_range(start, end, 'day') if day not in stored]
+    if missing:
+        if missing[0] != today:
+            logger.warning(f"Library stats not rolled up for {missing[0]} - {missing[-1]}, computing live")
+            _trigger_rollup()
+        for stats in compute_daily_stats(missing[0], missing[-1], overdue=False):
+            stored.setdefault(stats['date'], stats)
+        if today in missing:
+            stored[today]['overdue_snapshot'] = _overdue_at(timezone.now())
+
+    return [stored[day] for day in bucket_range(start, end, 'day')]
+
+
+def get_stats_series(start, end, granularity='day', fields=SUMMED_FIELDS):
+    """Summed daily stats regrouped into day/week/month buckets"""
+    buckets = {
+        period: {'period': period, **{field: 0 for field in fields}}
+        for period in bucket_range(start, end, granularity)
+    }
+    for stats in get_daily_stats(start, end):
+        bucket = buckets[bucket_start(stats['date'], granularity)]
+        for field in fields:
+            bucket[field] += stats[field]
+    return list(buckets.values())
+
+
+def merge_genre_borrows(rows):
+    """Add up the genre_borrows dicts of several days"""
+    totals = {}
+    for row in rows:
+        for genre, borrows in row['genre_borrows'].items():
+            totals[genre] = totals.get(genre, 0) + borrows
+    return totals
+
+
+def get_stats_totals(include_genres=False):
+    """
+    All-time totals of the summed fields: one aggregate over the rollup
+    table plus the live days after the last rolled-up one (GROUP BY queries
+    only; a gap before today also queues the rollup).
+    """
+    totals = DailyLibraryStats.objects.aggregate(
+        last=Max('date'), **{field: Sum(field) for field in SUMMED_FIELDS})
+    last = totals.pop('last')
+    totals = {field: value or 0 for field, value in totals.items()}
+
+    since = last + timedelta(days=1) if last else _first_activity_date()
+    today = timezone.localdate()
+    if since is not None and since < today:
+        _trigger_rollup()
+    live = compute_daily_stats(since, today, overdue=False) if since else []
+    for stats in live:
+        for field in SUMMED_FIELDS:
+            totals[field] += stats[field]
+
+    if include_genres:
+        stored = DailyLibraryStats.objects.values('genre_borrows')
+        totals['genre_borrows'] = merge_genre_borrows(list(stored) + live)
+    return totals
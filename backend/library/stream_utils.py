@@ -0,0 +1,325 @@
+# library/stream_utils.py
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+from datetime import timedelta
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+try:
+    import redis
+    import redis.asyncio as aioredis
+except ImportError:  # optional, only needed by RedisBroker
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+# Events buffered per connection before the client is told to resync
+STREAM_QUEUE_SIZE = 100
+# How long DatabaseBroker keeps published events
+STREAM_EVENT_RETENTION = timedelta(minutes=10)
+
+
+class Subscription:
+    """One connected client's event queue, bound to the loop that reads it"""
+
+    def __init__(self, user_id, loop):
+        self.user_id = user_id
+        self.loop = loop
+        self.queue = asyncio.Queue(STREAM_QUEUE_SIZE)
+        self.overflowed = False
+
+    def push(self, event):
+        # Publishers run in sync code (views, background tasks), off the loop
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            pass  # loop already closed, the connection is gone
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+
+class LocalBroker:
+    """
+    In-process pub/sub: events only reach clients connected to this
+    process, so events published by process_tasks or another web worker
+    are lost. For tests and single-process deployments only.
+    """
+
+    def __init__(self):
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        """Register a client of `user_id`; call from the event loop"""
+        subscription = Subscription(user_id, asyncio.get_running_loop())
+        with self._lock:
+            self._subscriptions[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+    def publish(self, user_id, event):
+        self.deliver(user_id, event)
+
+    def deliver(self, user_id, event):
+        """Hand an event to this process's clients of `user_id`"""
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+        for subscription in subscriptions:
+            subscription.push(event)
+
+    def connection_count(self):
+        with self._lock:
+            return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+
+class DatabaseBroker(LocalBroker):
+    """
+    Shares events between processes through the StreamEvent table: publish
+    inserts a row, and while a process has clients, one poller per process
+    reads new rows every NOTIFICATION_STREAM_POLL_INTERVAL seconds and fans
+    them out. That is one query per process per interval, however many
+    connections are open. prune_stream_events deletes old rows.
+    """
+
+    def __init__(self, poll_interval=None):
+        super().__init__()
+        self.poll_interval = poll_interval or getattr(
+            settings, 'NOTIFICATION_STREAM_POLL_INTERVAL', 1)
+        self._listener = None
+
+    def publish(self, user_id, event):
+        from .models import StreamEvent
+        StreamEvent.objects.create(user_id=user_id, event=event)
+
+    def subscribe(self, user_id):
+        subscription = super().subscribe(user_id)
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.get_running_loop().create_task(self._listen())
+        return subscription
+
+    async def _listen(self):
+        # Each poll re-reads a few seconds back so a row whose transaction
+        # committed late is not missed; rows the last poll saw are skipped
+        overlap = timedelta(seconds=self.poll_interval * 2)
+        since, seen = timezone.now(), set()
+        while self.connection_count():
+            await asyncio.sleep(self.poll_interval)
+            polled_at = timezone.now()
+            try:
+                rows = await fetch_stream_events(since - overlap)
+            except Exception as e:
+                logger.error(f"Notification stream poll failed: {e}")
+                continue
+            since = polled_at
+            for row_id, user_id, event in rows:
+                if row_id not in seen:
+                    self.deliver(user_id, event)
+            seen = {row[0] for row in rows}
+
+
+def _fetch_stream_events(since):
+    from .models import StreamEvent
+    return list(StreamEvent.objects.filter(created_at__gte=since).order_by(
+        'id').values_list('id', 'user_id', 'event'))
+
+
+fetch_stream_events = sync_to_async(_fetch_stream_events, thread_sensitive=False)
+
+
+def prune_stream_events(retention=STREAM_EVENT_RETENTION):
+    """Delete stream events older than `retention`. Returns the number deleted."""
+    from .models import StreamEvent
+    deleted, _ = StreamEvent.objects.filter(created_at__lt=timezone.now() - retention).delete()
+    return deleted
+
+
+class RedisBroker(LocalBroker):
+    """
+    Shares events between worker processes over Redis pub/sub. Each
+    process holds one pattern subscription and fans messages out to its
+    own clients. Needs the redis package and NOTIFICATION_STREAM_REDIS_URL.
+    """
+
+    CHANNEL_PREFIX = 'library:stream:'
+
+    def __init__(self, url=None):
+        if redis is None:
+            raise ImproperlyConfigured('RedisBroker requires the redis package')
+        url = url or getattr(settings, 'NOTIFICATION_STREAM_REDIS_URL', None)
+        if not url:
+            raise ImproperlyConfigured('RedisBroker requires NOTIFICATION_STREAM_REDIS_URL')
+        super().__init__()
+        self.url = url
+        self._client = redis.Redis.from_url(url)
+        self._listener = None
+
+    def publish(self, user_id, event):
+        self._client.publish(f"{self.CHANNEL_PREFIX}{user_id}", json.dumps(event))
+
+    def subscribe(self, user_id):
+        subscription = super().subscribe(user_id)
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.get_running_loop().create_task(self._listen())
+        return subscription
+
+    async def _listen(self):
+        while True:
+            try:
+                client = aioredis.Redis.from_url(self.url)
+                async with client.pubsub() as pubsub:
+                    await pubsub.psubscribe(f"{self.CHANNEL_PREFIX}*")
+                    async for message in pubsub.listen():
+                        if message['type'] != 'pmessage':
+                            continue
+                        user_id = int(message['channel'].decode().rsplit(':', 1)[1])
+                        self.deliver(user_id, json.loads(message['data']))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Notification stream listener lost Redis: {e}")
+                await asyncio.sleep(1)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """The process-wide broker named by NOTIFICATION_STREAM_BROKER"""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                path = getattr(settings, 'NOTIFICATION_STREAM_BROKER',
+                               'library.stream_utils.DatabaseBroker')
+                _broker = import_string(path)()
+    return _broker
+
+
+@receiver(setting_changed)
+def _reset_broker(setting, **kwargs):
+    global _broker
+    if setting.startswith('NOTIFICATION_STREAM_'):
+        _broker = None
+
+
+def _publish(user_id, event, counts=()):
+    try:
+        if counts:
+            # Read once here rather than by every connection receiving it
+            event['counts'] = _stream_counts(
+                user_id, unread='unread' in counts, reservations='reservations' in counts)
+        get_broker().publish(user_id, event)
+    except Exception as e:
+        # Streaming is best effort; clients resync on reconnect
+        logger.error(f"Failed to publish {event['type']} event for user {user_id}: {e}")
+
+
+def publish_event(user_id, event_type, data=None, counts=()):
+    """
+    Push an event to `user_id`'s connected clients once the current
+    transaction commits (immediately outside one). `counts` names the
+    counts the event changed ('unread', 'reservations'); they are read
+    at commit and sent along.
+    """
+    event = {'type': event_type, 'data': json.loads(json.dumps(data, cls=DjangoJSONEncoder))}
+    transaction.on_commit(partial(_publish, user_id, event, counts))
+
+
+# SSE stream
+
+def sse_message(event_type, data):
+    return f"event: {event_type}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
+
+
+def _stream_counts(user_id, unread=True, reservations=True):
+    from .models import Transaction
+    from .notification_utils import get_unread_count
+
+    counts = {}
+    if unread:
+        counts['unread_count'] = get_unread_count(user_id)
+    if reservations:
+        counts['reservation_count'] = Transaction.objects.filter(
+            user_id=user_id, status='pending').count()
+    return counts
+
+
+# Not thread-sensitive: idle connections must not each pin a thread
+stream_counts = sync_to_async(_stream_counts, thread_sensitive=False)
+
+
+async def event_stream(user_id, keepalive=None):
+    """
+    SSE body for one client: current counts first, then pushed
+    notifications, reservation changes and the counts they carry. Idle
+    connections cost one coroutine and one queue, no thread and no query.
+    """
+    keepalive = keepalive or getattr(settings, 'NOTIFICATION_STREAM_KEEPALIVE', 25)
+    broker = get_broker()
+    # Subscribe before reading counts so no change falls in between
+    subscription = broker.subscribe(user_id)
+    try:
+        yield 'retry: 5000\n\n'
+        for name, value in (await stream_counts(user_id)).items():
+            yield sse_message(name, {'count': value})
+
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), keepalive)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+
+            # Drain what is already queued so a burst sends counts once
+            events = [event]
+            while not subscription.queue.empty():
+                events.append(subscription.queue.get_nowait())
+
+            counts = {}
+            for event in events:
+                if event['type'] != 'unread_changed':
+                    yield sse_message(event['type'], event['data'])
+                # Later events carry newer counts
+                counts.update(event.get('counts', {}))
+
+            if subscription.overflowed:
+                subscription.overflowed = False
+                yield sse_message('resync', {})
+                counts = await stream_counts(user_id)
+            for name, value in counts.items():
+                yield sse_message(name, {'count': value})
+    finally:
+        broker.unsubscribe(subscription)
+
+
+def snapshot_messages(counts, retry_ms=30000):
+    """
+    Body sent when there is no ASGI server to hold the connection: the
+    `counts` from stream_counts(), then EventSource reconnects after `retry_ms`
+    """
+    return [f"retry: {retry_ms}\n\n"] + [
+        sse_message(name, {'count': value}) for name, value in counts.items()]
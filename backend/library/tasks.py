@@ -8,26 +8,10 @@ import logging
 
 logger = logging.getLogger(__name__)
 
-@background(schedule=60)  # Run every 60 minutes
-def cleanup_expired_qrs_task():
-    """
-    Background task to clean up expired QR codes
-    """
-    from .models import Transaction
-    
-    # Find all pending transactions that have expired
-    expired_transactions = Transaction.objects.filter(
-        status='pending',
-        qr_generated_at__lte=timezone.now() - timedelta(hours=24)
-    )
-    
-    count = expired_transactions.update(status='cancelled')
-    print(f'Cancelled {count} expired QR transactions')
-
 @background(schedule=60)
 def check_due_date_reminders():
     """
-    Automated due date reminders - runs every hour
+    Automated due date reminders - runs every hour, notifies once a day
     """
     tomorrow = timezone.now().date() + timedelta(days=1)
     three_days = timezone.now().date() + timedelta(days=3)
@@ -37,32 +21,34 @@ def check_due_date_reminders():
     upcoming_due = Transaction.objects.filter(
         return_date__isnull=True,
         due_date__date__in=[tomorrow, three_days, seven_days]
-    )
+    ).select_related('book', 'user')
     
-    for transaction in upcoming_due:
-        days_until_due = (transaction.due_date.date() - timezone.now().date()).days
-        NotificationManager.create_due_date_reminder(transaction)
+    sent = NotificationManager.send_transaction_notifications(
+        upcoming_due,
+        'due_reminder',
+        message_for=lambda transaction: (
+            f'Your book "{transaction.book.title}" is due on '
+            f'{transaction.due_date.strftime("%B %d, %Y")}. Please return it soon.'
+        ),
+        action_url='/my-borrows'
+    )
     
-    print(f"✅ Due date check: {upcoming_due.count()} books due soon")
+    print(f"✅ Due date check: {sent} reminders sent")
 
 @background(schedule=60)
 def check_overdue_books():
     """
-    Automated overdue notifications - runs every hour
+    Automated overdue notifications - runs every hour, notifies once a day
     """
     overdue_transactions = Transaction.objects.filter(
         return_date__isnull=True,
         due_date__lt=timezone.now()
-    )
+    ).select_related('book', 'user')
     
-    for transaction in overdue_transactions:
-        NotificationManager.create_overdue_notification(transaction)
+    sent = NotificationManager.send_transaction_notifications(
+        overdue_transactions, 'overdue', action_url='/my-borrows')
     
-    print(f"⚠️ Overdue check: {overdue_transactions.count()} books overdue")
-
-# Schedule tasks
-check_due_date_reminders(repeat=3600)  # Every hour
-check_overdue_books(repeat=3600)       # Every hour
+    print(f"⚠️ Overdue check: {sent} overdue notices sent")
 
 @background(schedule=3600)  # Run every hour
 def cleanup_waitlist_task():
@@ -73,9 +59,6 @@ def cleanup_waitlist_task():
     count = cleanup_expired_waitlist()
     print(f'Cleaned up {count} expired waitlist entries')
 
-# Schedule the task
-cleanup_waitlist_task(repeat=3600)  # Every hour
-
 # Add to existing tasks.py
 @background(schedule=60)  # Run every hour
 def cleanup_expired_reservations():
@@ -83,22 +66,20 @@ def cleanup_expired_reservations():
     Automatically cancel expired reservations and free up copies
     """
     from .models import Transaction
+    from .inventory_utils import end_reservation
     
     expired_reservations = Transaction.objects.filter(
         status='pending',
         qr_generated_at__lte=timezone.now() - timedelta(hours=24)
-    ).select_related('book')
+    ).select_related('book', 'user')
     
     count = 0
     for reservation in expired_reservations:
-        # Free up the reserved copy
+        # Mark as expired and free up the reserved copy (skip it if the
+        # reservation was issued or cancelled in the meantime)
+        if not end_reservation(reservation, 'expired'):
+            continue
         book = reservation.book
-        book.reserved_copies -= 1
-        book.save()
-        
-        # Mark as expired
-        reservation.status = 'expired'
-        reservation.save()
         
         # Notify user about expiry
         from .notification_utils import NotificationManager
@@ -146,7 +127,109 @@ def send_pickup_reminders():
     
     print(f"📚 Pickup reminders: {pending_pickups.count()} reminders sent")
 
-# Schedule the new tasks
-check_reservation_expiry(repeat=3600)  # Every hour
-send_pickup_reminders(repeat=7200)     # Every 2 hours
+@background(schedule=300)
+def rebuild_co_borrow_index_task():
+    """
+    Fold new transactions into the co-borrow recommendation index
+    """
+    from .recommendation_utils import rebuild_co_borrow_index
+    index = rebuild_co_borrow_index()
+    logger.info(
+        f"Co-borrow index up to date at transaction {index.last_transaction_id}")
+
+@background(schedule=300)
+def rollup_daily_stats_task():
+    """
+    Roll up any closed days not yet in DailyLibraryStats
+    """
+    from .stats_utils import rollup_daily_stats
+    days = rollup_daily_stats()
+    if days:
+        logger.info(f"Rolled up library stats for {days} days")
+
+@background(schedule=60)
+def drain_outbox_task():
+    """
+    Send queued emails from the OutboundEmail outbox
+    """
+    from .mail_utils import drain_outbox
+    drain_outbox()
+
+@background(schedule=5)
+def generate_book_qrs_task():
+    """
+    Render QR codes for books that don't have one yet
+    """
+    from .qr_utils import generate_book_qrs
+    generate_book_qrs()
+
+@background(schedule=0)
+def render_report_job_task(job_id):
+    """
+    Render one queued PDF report
+    """
+    from .report_utils import run_report_job
+    run_report_job(job_id)
+
+@background(schedule=300)
+def run_pending_report_jobs_task():
+    """
+    Render report jobs whose scheduled run was lost and prune old ones
+    """
+    from .report_utils import prune_report_jobs, run_pending_report_jobs
+    run_pending_report_jobs()
+    prune_report_jobs()
+
+@background(schedule=600)
+def reconcile_unread_counts_task():
+    """
+    Repair drifted unread notification counters
+    """
+    from .notification_utils import reconcile_unread_counts
+    reconcile_unread_counts()
+
+@background(schedule=600)
+def prune_stream_events_task():
+    """
+    Delete notification stream events every process has already read
+    """
+    from .stream_utils import prune_stream_events
+    prune_stream_events()
+
+@background(schedule=0)
+def reevaluate_achievement_task(achievement_id):
+    """
+    Award a newly added achievement to every user who already qualifies
+    """
+    from .models import Achievement
+    from .reading_utils import evaluate_all_achievements
+    achievement = Achievement.objects.filter(id=achievement_id).first()
+    if achievement is not None:
+        evaluate_all_achievements([achievement])
+
+# Periodic tasks and their interval in seconds. Importing this module
+# schedules nothing - the task worker calls schedule_periodic_tasks().
+PERIODIC_TASKS = (
+    (check_due_date_reminders, 3600),       # Every hour
+    (check_overdue_books, 3600),            # Every hour
+    (cleanup_waitlist_task, 3600),          # Every hour
+    (cleanup_expired_reservations, 3600),   # Every hour
+    (send_pickup_reminders, 7200),          # Every 2 hours
+    (rebuild_co_borrow_index_task, 1800),   # Every 30 minutes
+    (rollup_daily_stats_task, 3600),        # Every hour
+    (drain_outbox_task, 60),                # Every minute
+    (run_pending_report_jobs_task, 900),    # Every 15 minutes
+    (reconcile_unread_counts_task, 3600),   # Every hour
+    (prune_stream_events_task, 600),        # Every 10 minutes
+)
+
+
+def schedule_periodic_tasks():
+    """
+    Schedule every periodic task, replacing schedules left by earlier
+    runs (unless a worker holds them), so restarts don't pile up copies
+    """
+    for task, interval in PERIODIC_TASKS:
+        task(repeat=interval, remove_existing_tasks=True)
+    logger.info(f"Scheduled {len(PERIODIC_TASKS)} periodic background tasks")
 
@@ -1,3 +1,402 @@
-from django.test import TestCase
+import asyncio
+import json
+import threading
+from datetime import timedelta
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from asgiref.sync import sync_to_async
+from django.db import OperationalError, connection, transaction
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from .import_utils import iter_book_records, iter_json_array, iter_validated_batches, upsert_books
+from .inventory_utils import (
+    create_reservation, end_reservation, issue_reservation, release_reserved_copy, reserve_copy
+)
+from .models import (
+    Achievement, Book, Notification, StreamEvent, Transaction, UnreadNotificationCount, UserAchievement
+)
+from .notification_utils import (
+    NotificationManager, adjust_unread_counts, delete_notifications, get_unread_count,
+    mark_notifications_read, reconcile_unread_counts
+)
+from .reading_utils import evaluate_achievements
+from .stream_utils import STREAM_QUEUE_SIZE, event_stream, get_broker, publish_event
+
+
+def run_concurrently(target, count):
+    """
+    Run `target(i)` in `count` threads released at the same moment and
+    return their results. Each thread uses (and closes) its own connection.
+    """
+    barrier = threading.Barrier(count)
+    results = [None] * count
+
+    def worker(i):
+        try:
+            barrier.wait()
+            for _ in range(50):
+                try:
+                    results[i] = target(i)
+                    break
+                except OperationalError:
+                    # SQLite reports a busy table instead of waiting for the lock
+                    continue
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def make_book(copies):
+    return Book.objects.create(
+        title='Hot Title', author='Author', isbn='9780000000001',
+        genre='Fantasy', publication_year=2024, total_copies=copies)
+
+
+class InventoryConcurrencyTests(TransactionTestCase):
+    """Copy accounting must hold up under concurrent requests for one book"""
+
+    THREADS = 12
+
+    def test_concurrent_reservations_never_over_reserve(self):
+        book = make_book(copies=3)
+
+        results = run_concurrently(lambda i: reserve_copy(book.id), self.THREADS)
+
+        book.refresh_from_db()
+        self.assertEqual(results.count(True), 3)
+        self.assertEqual(book.reserved_copies, 3)
+        self.assertEqual(book.effectively_available, 0)
+
+    def test_concurrent_reservation_requests_create_one_transaction_per_copy(self):
+        book = make_book(copies=2)
+        users = [User.objects.create_user(f'reader{i}', password='x') for i in range(self.THREADS)]
+        due_date = timezone.now() + timedelta(days=14)
+
+        results = run_concurrently(
+            lambda i: create_reservation(book, users[i], due_date), self.THREADS)
+
+        book.refresh_from_db()
+        created = [reservation for reservation in results if reservation is not None]
+        self.assertEqual(len(created), 2)
+        self.assertEqual(book.reserved_copies, 2)
+        self.assertEqual(book.transaction_set.filter(status='pending').count(), 2)
+
+    def test_reservation_is_released_once(self):
+        book = make_book(copies=2)
+        user = User.objects.create_user('reader', password='x')
+        reservation = create_reservation(book, user, timezone.now() + timedelta(days=14))
+
+        results = run_concurrently(
+            lambda i: end_reservation(reservation, 'cancelled'), self.THREADS)
+
+        book.refresh_from_db()
+        self.assertEqual(results.count(True), 1)
+        self.assertEqual(book.reserved_copies, 0)
+        self.assertEqual(book.available_copies, 2)
+
+    def test_reserve_and_release_keep_counts_consistent(self):
+        book = make_book(copies=4)
+
+        def churn(i):
+            return reserve_copy(book.id) if i % 2 == 0 else release_reserved_copy(book.id)
+
+        run_concurrently(churn, self.THREADS)
+
+        book.refresh_from_db()
+        self.assertGreaterEqual(book.reserved_copies, 0)
+        self.assertLessEqual(book.reserved_copies, book.available_copies)
+
+
+class InventoryTests(TestCase):
+    def setUp(self):
+        self.book = make_book(copies=1)
+        self.user = User.objects.create_user('reader', password='x')
+
+    def test_reservation_fails_without_free_copy(self):
+        due_date = timezone.now() + timedelta(days=14)
+        self.assertIsNotNone(create_reservation(self.book, self.user, due_date))
+        self.assertIsNone(create_reservation(self.book, self.user, due_date))
+
+    def test_issue_moves_reserved_copy_off_the_shelf(self):
+        reservation = create_reservation(self.book, self.user, timezone.now())
+        self.assertTrue(issue_reservation(reservation, timezone.now() + timedelta(days=14)))
+        self.assertFalse(issue_reservation(reservation, timezone.now() + timedelta(days=14)))
+
+        self.book.refresh_from_db()
+        reservation.refresh_from_db()
+        self.assertEqual((self.book.available_copies, self.book.reserved_copies), (0, 0))
+        self.assertEqual(reservation.status, 'borrowed')
+
+    def test_copy_changes_bump_updated_at(self):
+        before = self.book.updated_at
+        reserve_copy(self.book.id)
+        self.book.refresh_from_db()
+        self.assertGreater(self.book.updated_at, before)
+
+
+class UnreadCountTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('reader', password='x')
+        for title in ('one', 'two'):
+            NotificationManager.create_notification(self.user, 'system', title=title, message='m')
+
+    def test_login_does_not_reset_counter(self):
+        client = Client()
+        client.force_login(self.user)
+        self.user.userprofile.save()
+
+        response = client.get('/api/notifications/unread-count/')
+        self.assertEqual(response.json()['unread_count'], 2)
+        self.assertEqual(UnreadNotificationCount.objects.get(user=self.user).count, 2)
+
+    def test_adjust_unread_counts_never_goes_below_zero(self):
+        other = User.objects.create_user('other', password='x')
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            adjust_unread_counts({self.user.id: -5, other.id: 3})
+
+        self.assertEqual(get_unread_count(self.user.id), 0)
+        self.assertEqual(get_unread_count(other.id), 3)
+        self.assertEqual(len(callbacks), 2)
+
+    def test_mark_notifications_read_decrements_by_unread_marked(self):
+        first = Notification.objects.filter(user=self.user).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(mark_notifications_read(self.user.id, [first.id]), 1)
+            self.assertEqual(mark_notifications_read(self.user.id, [first.id]), 0)
+        self.assertEqual(get_unread_count(self.user.id), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(mark_notifications_read(self.user.id), 1)
+        self.assertEqual(get_unread_count(self.user.id), 0)
+
+    def test_delete_notifications_only_counts_unread(self):
+        read, unread = Notification.objects.filter(user=self.user)
+        mark_notifications_read(self.user.id, [read.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(delete_notifications(self.user.id, [read.id, unread.id]), 2)
+        self.assertEqual(get_unread_count(self.user.id), 0)
+        self.assertFalse(Notification.objects.filter(user=self.user).exists())
+
+    def test_reconcile_repairs_drifted_and_missing_counters(self):
+        other = User.objects.create_user('other', password='x')
+        Notification.objects.create(user=other, notification_type='system', title='t', message='m')
+        UnreadNotificationCount.objects.filter(user=self.user).update(count=7)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(reconcile_unread_counts(batch_size=1), 2)
+        self.assertEqual(get_unread_count(self.user.id), 2)
+        self.assertEqual(get_unread_count(other.id), 1)
+        self.assertEqual(reconcile_unread_counts(), 0)
+
+
+async def read_events(stream, count):
+    """The next `count` SSE messages of `stream` as (event, data) pairs"""
+    events = []
+    while len(events) < count:
+        chunk = await asyncio.wait_for(stream.__anext__(), 5)
+        if chunk.startswith('event: '):
+            name, data = chunk.split('\n')[:2]
+            events.append((name[len('event: '):], json.loads(data[len('data: '):])))
+    return events
+
+
+@override_settings(NOTIFICATION_STREAM_BROKER='library.stream_utils.LocalBroker')
+class NotificationStreamTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('reader', password='x')
+
+    async def test_event_is_sent_once_the_transaction_commits(self):
+        stream = event_stream(self.user.id)
+        self.assertEqual(await read_events(stream, 2), [
+            ('unread_count', {'count': 0}), ('reservation_count', {'count': 0})])
+
+        @sync_to_async
+        def publish():
+            with transaction.atomic():
+                publish_event(self.user.id, 'reservation', {'book_id': 1}, counts=('reservations',))
+                queued = get_broker()._subscriptions[self.user.id]
+                return sum(subscription.queue.qsize() for subscription in queued)
+
+        self.assertEqual(await publish(), 0)
+        self.assertEqual(await read_events(stream, 2), [
+            ('reservation', {'book_id': 1}), ('reservation_count', {'count': 0})])
+        await stream.aclose()
+
+    async def test_overflow_asks_the_client_to_resync(self):
+        stream = event_stream(self.user.id)
+        await read_events(stream, 2)
+        for number in range(STREAM_QUEUE_SIZE + 5):
+            get_broker().publish(self.user.id, {'type': 'notification', 'data': {'id': number}})
+        await asyncio.sleep(0)
+
+        events = await read_events(stream, STREAM_QUEUE_SIZE + 3)
+        self.assertEqual(events[STREAM_QUEUE_SIZE - 1], ('notification', {'id': STREAM_QUEUE_SIZE - 1}))
+        self.assertEqual([name for name, _ in events[STREAM_QUEUE_SIZE:]],
+                         ['resync', 'unread_count', 'reservation_count'])
+        await stream.aclose()
+
+    async def test_disconnect_unsubscribes(self):
+        stream = event_stream(self.user.id)
+        await read_events(stream, 2)
+        self.assertEqual(get_broker().connection_count(), 1)
+
+        await stream.aclose()
+        self.assertEqual(get_broker().connection_count(), 0)
+
+    def test_wsgi_request_gets_a_snapshot(self):
+        NotificationManager.create_notification(self.user, 'system', title='t', message='m')
+        client = Client()
+        client.force_login(self.user)
+
+        response = client.get('/api/notifications/stream/')
+        body = b''.join(response.streaming_content).decode()
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertTrue(body.startswith('retry: 30000\n\n'))
+        self.assertIn('event: unread_count\ndata: {"count": 1}\n\n', body)
+
+    @override_settings(NOTIFICATION_STREAM_BROKER='library.stream_utils.DatabaseBroker',
+                       NOTIFICATION_STREAM_POLL_INTERVAL=0.05)
+    async def test_database_broker_delivers_rows_from_other_processes(self):
+        stream = event_stream(self.user.id)
+        await read_events(stream, 2)
+
+        # What another process's publish leaves behind
+        await sync_to_async(StreamEvent.objects.create)(user_id=self.user.id, event={
+            'type': 'unread_changed', 'data': None, 'counts': {'unread_count': 3}})
+        self.assertEqual(await read_events(stream, 1), [('unread_count', {'count': 3})])
+        await stream.aclose()
+
+
+class AchievementTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('reader', password='x')
+        self.bookworm = Achievement.objects.create(
+            name='Bookworm', description='d', achievement_type='books_read', requirement=2)
+        self.explorer = Achievement.objects.create(
+            name='Explorer', description='d', achievement_type='genres_explored', requirement=2)
+
+    def read(self, *genres):
+        for genre in genres:
+            book = Book.objects.create(
+                title=f'{genre} book', author='Author', isbn=str(9780000000100 + Book.objects.count()),
+                genre=genre, publication_year=2024)
+            Transaction.objects.create(
+                user=self.user, book=book, status='returned',
+                due_date=timezone.now() + timedelta(days=14), return_date=timezone.now())
+
+    def progress(self, achievement):
+        return UserAchievement.objects.get(user=self.user, achievement=achievement).progress
+
+    def achievement_notifications(self):
+        return Notification.objects.filter(user=self.user, notification_type='achievement')
+
+    def test_first_award_notifies_once_per_achievement(self):
+        self.read('Fantasy', 'Horror')
+
+        awarded = evaluate_achievements([self.user.id])
+        self.assertEqual(sorted(awarded[self.user.id]), ['Bookworm', 'Explorer'])
+        self.assertEqual((self.progress(self.bookworm), self.progress(self.explorer)), (2, 2))
+        self.assertEqual(self.achievement_notifications().count(), 2)
+
+    def test_progress_is_recorded_without_an_award(self):
+        self.read('Fantasy')
+
+        self.assertEqual(evaluate_achievements([self.user.id]), {})
+        self.assertEqual((self.progress(self.bookworm), self.progress(self.explorer)), (1, 1))
+        self.assertFalse(self.achievement_notifications().exists())
+
+    def test_earned_achievement_is_not_awarded_again(self):
+        self.read('Fantasy', 'Horror')
+        evaluate_achievements([self.user.id])
+        self.read('Poetry')
+
+        self.assertEqual(evaluate_achievements([self.user.id]), {})
+        self.assertEqual(self.progress(self.bookworm), 2)
+        self.assertEqual(self.achievement_notifications().count(), 2)
+
+    def test_genres_explored_counts_distinct_genres(self):
+        self.read('Fantasy', 'Fantasy', 'Fantasy')
+
+        self.assertEqual(evaluate_achievements([self.user.id]), {self.user.id: ['Bookworm']})
+        self.assertEqual(self.progress(self.explorer), 1)
+
+
+class BookImportTests(TestCase):
+    RECORDS = [
+        {'isbn': '978-0-00-000001-1', 'title': 'First', 'author': 'A', 'genre': 'fantasy',
+         'publication_year': 2001, 'total_copies': 4},
+        {'isbn': '9780000000028', 'title': 'Second', 'author': 'B', 'genre': 'Horror',
+         'publication_year': 2002},
+    ]
+
+    def import_records(self, records):
+        written, errors = 0, []
+        for _, valid, batch_errors in iter_validated_batches(records, batch_size=2):
+            written += upsert_books(valid)
+            errors += batch_errors
+        return written, errors
+
+    def test_formats_stream_the_same_records(self):
+        as_json = list(iter_book_records(StringIO(json.dumps(self.RECORDS)), 'json'))
+        as_jsonl = list(iter_book_records(
+            StringIO('\n'.join(json.dumps(record) for record in self.RECORDS)), 'jsonl'))
+        fixture = [{'model': 'library.book', 'fields': record} for record in self.RECORDS]
+        as_fixture = list(iter_book_records(StringIO(json.dumps(fixture)), 'json'))
+        as_csv = list(iter_book_records(StringIO(
+            'isbn,title,author,genre,publication_year\n9780000000028,Second,B,Horror,2002\n'), 'csv'))
+
+        self.assertEqual(as_json, self.RECORDS)
+        # Elements split across read chunks
+        self.assertEqual(list(iter_json_array(StringIO(json.dumps(self.RECORDS)), chunk_size=7)),
+                         self.RECORDS)
+        self.assertEqual(as_jsonl, self.RECORDS)
+        self.assertEqual(as_fixture, self.RECORDS)
+        self.assertEqual(as_csv[0]['title'], 'Second')
+
+    def test_malformed_record_is_reported_and_skipped(self):
+        records = self.RECORDS + [
+            {'isbn': '9780000000035', 'title': 'Bad', 'author': 'C', 'genre': 'Horror',
+             'publication_year': 'soon'},
+            {'isbn': '9780000000042', 'title': 'Bad', 'author': 'C', 'genre': 'Unknown',
+             'publication_year': 2003},
+        ]
+
+        written, errors = self.import_records(records)
+        self.assertEqual(written, 2)
+        self.assertEqual([number for number, _ in errors], [2, 3])
+        self.assertEqual(Book.objects.count(), 2)
+
+    def test_reimport_updates_existing_books(self):
+        self.import_records(self.RECORDS)
+        book = Book.objects.get(isbn='9780000000011')
+        self.assertEqual((book.genre, book.total_copies, book.available_copies), ('Fantasy', 4, 4))
+
+        written, _ = self.import_records([dict(self.RECORDS[0], title='First, revised', total_copies=2)])
+        self.assertEqual(written, 1)
+        self.assertEqual(Book.objects.count(), 2)
+        book.refresh_from_db()
+        self.assertEqual((book.title, book.total_copies, book.available_copies), ('First, revised', 2, 2))
+
+    def test_record_without_total_copies_keeps_stock(self):
+        self.import_records(self.RECORDS)
+        Book.objects.filter(isbn='9780000000011').update(available_copies=3, reserved_copies=3)
+
+        record = dict(self.RECORDS[0])
+        del record['total_copies']
+        self.import_records([record])
+
+        book = Book.objects.get(isbn='9780000000011')
+        self.assertEqual((book.total_copies, book.available_copies, book.reserved_copies), (4, 3, 3))
+
+        self.import_records([dict(record, total_copies=1)])
+        book.refresh_from_db()
+        self.assertEqual((book.total_copies, book.available_copies, book.reserved_copies), (1, 1, 1))
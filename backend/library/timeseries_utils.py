@@ -0,0 +1,121 @@
+# library/timeseries_utils.py
+import logging
+from datetime import datetime, time, timedelta
+
+from django.db.models import Count, DateField
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+GRANULARITIES = ('day', 'week', 'month')
+
+
+def bucket_start(day, granularity):
+    """First date of the bucket containing `day` (weeks start on Monday)"""
+    if granularity == 'day':
+        return day
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    raise ValueError(f"Unknown granularity: {granularity}")
+
+
+def next_bucket(day, granularity):
+    if granularity == 'day':
+        return day + timedelta(days=1)
+    if granularity == 'week':
+        return day + timedelta(weeks=1)
+    if day.month == 12:
+        return day.replace(year=day.year + 1, month=1, day=1)
+    return day.replace(month=day.month + 1, day=1)
+
+
+def bucket_range(start, end, granularity):
+    """Every bucket start date from `start` to `end` inclusive"""
+    buckets = []
+    current = bucket_start(start, granularity)
+    while current <= end:
+        buckets.append(current)
+        current = next_bucket(current, granularity)
+    return buckets
+
+
+def day_bounds(start, end):
+    """Aware [lower, upper) datetimes covering the local calendar days start..end"""
+    tz = timezone.get_current_timezone()
+    lower = timezone.make_aware(datetime.combine(start, time.min), tz)
+    upper = timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min), tz)
+    return lower, upper
+
+
+def _bounded(queryset, date_field, start, end):
+    """Filter a datetime column to the local calendar days start..end"""
+    lower, upper = day_bounds(start, end)
+    return queryset.filter(**{
+        f'{date_field}__gte': lower,
+        f'{date_field}__lt': upper,
+    })
+
+
+def time_series(queryset, date_field, start, end, granularity='day', **aggregates):
+    """
+    Aggregate `queryset` into date buckets between `start` and `end`
+    (dates, inclusive) with a single GROUP BY query.
+
+    Returns one dict per bucket, oldest first, with the bucket's start
+    date under 'period' and every aggregate (default: count) - buckets
+    without rows are filled with zeros.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unknown granularity: {granularity}")
+    aggregates = aggregates or {'count': Count('id')}
+
+    rows = _bounded(queryset, date_field, start, end).annotate(
+        period=Trunc(date_field, granularity, output_field=DateField())
+    ).values('period').annotate(**aggregates).order_by('period')
+    by_period = {row['period']: row for row in rows}
+
+    series = []
+    for period in bucket_range(start, end, granularity):
+        row = by_period.get(period, {})
+        series.append({
+            'period': period,
+            **{name: row.get(name) or 0 for name in aggregates}
+        })
+    return series
+
+
+def grouped_time_series(queryset, date_field, group_field, start, end,
+                        granularity='day', groups=None, **aggregates):
+    """
+    Like time_series(), split by `group_field`, still in a single query.
+
+    Returns {group value: series}. Pass `groups` to fix which groups are
+    returned (missing ones get an all-zero series).
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unknown granularity: {granularity}")
+    aggregates = aggregates or {'count': Count('id')}
+
+    rows = _bounded(queryset, date_field, start, end).annotate(
+        period=Trunc(date_field, granularity, output_field=DateField())
+    ).values(group_field, 'period').annotate(**aggregates).order_by(group_field, 'period')
+
+    found = {}
+    for row in rows:
+        found.setdefault(row[group_field], {})[row['period']] = row
+
+    periods = bucket_range(start, end, granularity)
+    return {
+        group: [
+            {
+                'period': period,
+                **{name: found.get(group, {}).get(period, {}).get(name) or 0
+                   for name in aggregates}
+            }
+            for period in periods
+        ]
+        for group in (groups if groups is not None else found)
+    }
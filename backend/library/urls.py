@@ -27,12 +27,15 @@ urlpatterns = [
 
     # ===== BOOKS & SEARCH =====
     path('books/', views.book_list, name='book_list'),
+    path('books/catalog/', views.book_catalog, name='book_catalog'),
     path('books/search/', views.search_books, name='search_books'),
+    path('books/suggest/', views.suggest_books, name='suggest_books'),
     path('books/<int:book_id>/', views.book_detail, name='book_detail'),
     path('books/popular/', views.get_popular_books, name='get_popular_books'),
 
     # ===== USER ACTIONS =====
     path('books/<int:book_id>/borrow/', views.borrow_book, name='borrow_book'),
+    path('books/eligibility/', views.borrow_eligibility, name='borrow_eligibility'),
     path('books/<int:book_id>/rate/',
          views.handle_book_rating, name='handle_book_rating'),
     path('books/<int:book_id>/ratings/',
@@ -58,6 +61,7 @@ urlpatterns = [
          views.generate_return_qr, name='generate_return_qr'),
     path('fix-missing-qr/<int:transaction_id>/',
          views.fix_missing_qr, name='fix_missing_qr'),
+    path('qr/<str:token>.<str:fmt>', views.qr_image, name='qr_image'),
 
     # ===== USER PROFILE & TRANSACTIONS =====
     path('profile/', views.user_profile, name='user_profile'),
@@ -98,6 +102,7 @@ urlpatterns = [
          views.mark_notification_read, name='mark_notification_read'),
     path('notifications/read-all/', views.mark_all_notifications_read,
          name='mark_all_notifications_read'),
+    path('notifications/stream/', views.notification_stream, name='notification_stream'),
     path('notifications/unread-count/', views.get_unread_notification_count,
          name='unread_notification_count'),
     path('notifications/preferences/', views.notification_preferences,
@@ -112,6 +117,9 @@ urlpatterns = [
     # ===== ADMIN ENDPOINTS =====
     path('admin/stats/', views.admin_dashboard_stats,
          name='admin_dashboard_stats'),
+    path('admin/recommendations/cache-stats/',
+         views.admin_recommendation_cache_stats,
+         name='admin_recommendation_cache_stats'),
     path('admin/users/', views.admin_user_list, name='admin_user_list'),
     path('admin/transactions/', views.admin_transaction_list,
          name='admin_transaction_list'),
@@ -126,8 +134,16 @@ urlpatterns = [
          views.security_audit_logs, name='security_audit_logs'),
     path('admin/security/dashboard/',
          views.security_dashboard, name='security_dashboard'),
+    path('admin/reports/', views.admin_generate_report,
+         name='admin_generate_report'),
     path('admin/reports/pdf/', views.admin_generate_pdf_report,
          name='admin_generate_pdf_report'),
+    path('admin/reports/jobs/', views.admin_submit_report_job,
+         name='admin_submit_report_job'),
+    path('admin/reports/jobs/<int:job_id>/', views.admin_report_job,
+         name='admin_report_job'),
+    path('admin/reports/jobs/<int:job_id>/download/',
+         views.admin_report_job_download, name='admin_report_job_download'),
     path('admin/analytics/advanced/', views.admin_advanced_analytics,
          name='admin_advanced_analytics'),
 
@@ -1,15 +1,12 @@
 # library/utils.py
 import random
 import logging
-import qrcode
-import base64
-from io import BytesIO
-from django.core.mail import send_mail
-from django.conf import settings
 from django.db import models
 from django.utils import timezone
 from datetime import timedelta
 from .models import BookWaitlist
+from .mail_utils import queue_email
+from .qr_utils import qr_base64
 
 # Set up logger
 logger = logging.getLogger(__name__)
@@ -24,8 +21,9 @@ def generate_otp(length=6):
 
 def send_otp_email(email, otp_code):
     """
-    Sends an OTP code to the user's email address.
-    Returns True if successful, False otherwise.
+    Queues an OTP code email to the user's address (sent by the mail queue
+    worker, see mail_utils).
+    Returns True if queued, False otherwise.
     """
     subject = 'Your Infinitum Library Verification Code'
     message = f'''
@@ -42,18 +40,15 @@ def send_otp_email(email, otp_code):
     Happy Reading!
     The Infinitum Library Team
     '''
-    from_email = settings.DEFAULT_FROM_EMAIL  # We'll set this in settings.py
-    recipient_list = [email]
 
     try:
-        # This is the core Django function for sending email
-        send_mail(subject, message, from_email, recipient_list, fail_silently=False)
-        print(f"OTP email sent successfully to {email}") # Good for debugging
+        queue_email(email, subject, body=message, urgent=True)
+        logger.info(f"OTP email queued for {email}")
         return True
     except Exception as e:
         # It's very important to catch errors here so our server doesn't crash
         # if there's an email configuration problem.
-        print(f"Failed to send OTP email to {email}. Error: {str(e)}")
+        logger.error(f"Failed to queue OTP email to {email}. Error: {str(e)}")
         return False
     
 
@@ -61,29 +56,10 @@ def send_otp_email(email, otp_code):
 
 def generate_base64_qr(data):
     """
-    Generate QR code and return as base64 string
+    Generate QR code and return as base64 string (memoized, see qr_utils)
     """
     try:
-        # Create QR code
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=10,
-            border=4,
-        )
-        qr.add_data(data)
-        qr.make(fit=True)
-        
-        # Create image
-        img = qr.make_image(fill_color="black", back_color="white")
-        
-        # Convert to base64
-        buffer = BytesIO()
-        img.save(buffer, format="PNG")
-        img_str = base64.b64encode(buffer.getvalue()).decode()
-        
-        return img_str
-        
+        return qr_base64(data)
     except Exception as e:
         logger.error(f"QR generation error: {e}")
         raise Exception("Failed to generate QR code")
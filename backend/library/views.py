@@ -9,43 +9,67 @@ from django.core.exceptions import ValidationError
 from django.contrib.auth.models import User
 from django.db import transaction
 from django.db import IntegrityError
-from django.db.models.functions import TruncDate, TruncMonth
-from django.db.models import Q, Count, Sum, Avg, F, Case, When, Value, IntegerField, Max
+from django.db.models.functions import TruncDate, TruncMonth, Coalesce
+from django.db.models import Q, Count, Sum, Avg, F, Case, When, Value, IntegerField, Max, DecimalField
 from datetime import datetime, timedelta
 from django.utils import timezone
-from django.http import HttpResponse
-from django.template.loader import render_to_string
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
 from django.shortcuts import render
 from django.views.decorators.csrf import ensure_csrf_cookie
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth.hashers import make_password
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-from django.utils.timesince import timesince
 from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.conf import settings
 from .permissions import IsAdminUser, IsLibrarianUser
-from .utils import generate_base64_qr, add_to_waitlist, estimate_wait_time
+from .utils import add_to_waitlist, estimate_wait_time
 import re
-import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.feature_extraction.text import TfidfVectorizer
-import pandas as pd
 from collections import defaultdict
 import logging
-import weasyprint
 
 # Local imports - COMBINED into ONE import statement
 from .models import (
     Book, UserProfile, Transaction, PendingRegistration,
     PasswordResetToken, BookRating, BookReview, ReadingGoal,
-    UserAchievement, Achievement, Notification, UserNotificationPreference
+    UserAchievement, Achievement, Notification, UserNotificationPreference,
+    ReportJob
 )
 from .serializers import (
-    BookSerializer, UserSerializer, UserProfileSerializer,
+    BookSerializer, BookCatalogSerializer, UserSerializer, UserProfileSerializer,
     TransactionSerializer, BookRatingSerializer, BookReviewSerializer
 )
 from .utils import generate_otp, send_otp_email
 from .password_reset_utils import create_password_reset_token, send_password_reset_email
-from .notification_utils import NotificationManager
+from .notification_utils import (
+    FEED_MAX_PAGE_SIZE, NotificationManager, cached_feed_total, delete_notifications,
+    get_notification_feed, get_unread_count, mark_notifications_read, notification_feed_queryset
+)
+from .stream_utils import event_stream, snapshot_messages, stream_counts
+from .catalog_utils import get_catalog_stamp, catalog_etag, encode_cursor, decode_cursor
+from .search_utils import BookSearchIndex, SuggestIndex, post_filter_ranked
+from .export_utils import export_formats, parse_date_range, streaming_export_response, streaming_json_response
+from .qr_utils import (
+    QR_FORMATS, borrow_qr_payload, payload_from_token, qr_digest, qr_response_fields,
+    render_qr, return_qr_payload, stored_qr_value, transaction_qr_fields
+)
+from .timeseries_utils import GRANULARITIES, bucket_range, bucket_start, day_bounds, time_series
+from .stats_utils import get_daily_stats, get_stats_series, get_stats_totals
+from .report_utils import report_range, submit_report
+from .eligibility_utils import (
+    MAX_BATCH_BOOKS, batch_eligibility, check_eligibility, get_borrowing_summary,
+    invalidate_borrowing_summary
+)
+from .inventory_utils import (
+    complete_return, create_direct_issue, create_reservation, end_reservation, issue_reservation
+)
+from .recommendation_utils import (
+    ContentRecommender, CoBorrowIndex, RecommendationCache
+)
 
 logger = logging.getLogger(__name__)
 
@@ -79,6 +103,71 @@ def book_list(request):
     return Response(serializer.data)
 
 
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def book_catalog(request):
+    """
+    Cursor-paginated, field-selectable book catalog.
+
+    Pages are ordered by (title, id); pass `next_cursor` back as ?cursor=
+    for the following page. ?fields=id,title,... trims every item and
+    ?genre= filters. ETag/Last-Modified come from the catalog version
+    stamp, so clients can revalidate unchanged pages with a 304.
+    """
+    try:
+        limit = min(max(int(request.GET.get('limit', 50)), 1), 200)
+    except ValueError:
+        return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+    fields = [f.strip() for f in request.GET.get('fields', '').split(',') if f.strip()] or None
+    unknown_fields = set(fields or ()) - set(BookCatalogSerializer.Meta.fields)
+    if unknown_fields:
+        return Response({
+            'error': f"Unknown fields: {', '.join(sorted(unknown_fields))}",
+            'available_fields': BookCatalogSerializer.Meta.fields
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    cursor = request.GET.get('cursor')
+    genre = request.GET.get('genre')
+
+    stamp = get_catalog_stamp()
+    etag = catalog_etag(stamp, limit, cursor, fields, genre)
+    last_modified = int(stamp[0].timestamp()) if stamp[0] else None
+    not_modified = get_conditional_response(
+        request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return not_modified
+
+    books = Book.objects.order_by('title', 'id')
+    if genre:
+        books = books.filter(genre=genre)
+    if cursor:
+        try:
+            after_title, after_id = decode_cursor(cursor)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        books = books.filter(
+            Q(title__gt=after_title) | Q(title=after_title, id__gt=after_id))
+
+    page = list(books[:limit + 1])
+    has_more = len(page) > limit
+    page = page[:limit]
+
+    serializer = BookCatalogSerializer(
+        page, many=True, fields=fields, context={'request': request})
+    response = Response({
+        'results': serializer.data,
+        'next_cursor': encode_cursor(page[-1].title, page[-1].id) if has_more else None,
+        'has_more': has_more,
+        'total_books': stamp[1]
+    })
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def book_detail(request, book_id):
@@ -95,6 +184,11 @@ def book_detail(request, book_id):
 def search_books(request):
     """
     Searches for books with multiple filters: title, author, genre, year range, and availability.
+
+    ?q= is matched against the in-process BM25 index (title, author,
+    description) and results come back best match first; the other
+    filters are applied to the ranked hits. Pass ?page= (and optionally
+    ?page_size=) for a paginated envelope instead of the full list.
     """
     query = request.GET.get('q', '')
     genre = request.GET.get('genre', '')
@@ -105,27 +199,84 @@ def search_books(request):
         'available_only', 'false').lower() == 'true'
 
     books = Book.objects.all()
+    filtered = False
 
-    if query:
-        books = books.filter(
-            Q(title__icontains=query) |
-            Q(author__icontains=query) |
-            Q(description__icontains=query)
-        )
     if genre:
         books = books.filter(genre=genre)
+        filtered = True
     if author:
         books = books.filter(author__icontains=author)
+        filtered = True
     if year_from:
         books = books.filter(publication_year__gte=year_from)
+        filtered = True
     if year_to:
         books = books.filter(publication_year__lte=year_to)
+        filtered = True
     if available_only:
         books = books.filter(available_copies__gt=0)
+        filtered = True
+
+    if query.strip():
+        ranked_ids = [book_id for book_id, _ in BookSearchIndex.get().search(query)]
+        if filtered:
+            ranked_ids = post_filter_ranked(ranked_ids, books)
+    else:
+        ranked_ids = None
+        books = books.order_by('title')
+
+    page = request.GET.get('page')
+    if page is None:
+        if ranked_ids is not None:
+            rows = Book.objects.in_bulk(ranked_ids)
+            books = [rows[book_id] for book_id in ranked_ids if book_id in rows]
+        serializer = BookSerializer(books, many=True)
+        return Response(serializer.data)
 
-    books = books.order_by('title')
-    serializer = BookSerializer(books, many=True)
-    return Response(serializer.data)
+    try:
+        page = max(int(page), 1)
+        page_size = min(max(int(request.GET.get('page_size', 20)), 1), 100)
+    except ValueError:
+        return Response({'error': 'page and page_size must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+
+    offset = (page - 1) * page_size
+    if ranked_ids is not None:
+        total = len(ranked_ids)
+        page_ids = ranked_ids[offset:offset + page_size]
+        rows = Book.objects.in_bulk(page_ids)
+        page_books = [rows[book_id] for book_id in page_ids if book_id in rows]
+    else:
+        total = books.count()
+        page_books = list(books[offset:offset + page_size])
+
+    serializer = BookSerializer(page_books, many=True)
+    return Response({
+        'results': serializer.data,
+        'pagination': {
+            'page': page,
+            'page_size': page_size,
+            'total': total,
+            'has_next': offset + page_size < total
+        }
+    })
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def suggest_books(request):
+    """
+    Typo-tolerant autocomplete over book titles and authors.
+    ?q= is the partially typed text, ?limit= caps the suggestions (max 20).
+    """
+    query = request.GET.get('q', '')
+    try:
+        limit = min(max(int(request.GET.get('limit', 8)), 1), 20)
+    except ValueError:
+        return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response({
+        'query': query,
+        'suggestions': SuggestIndex.get().suggest(query, limit)
+    })
 
 # --- Authentication Endpoints ---
 
@@ -411,18 +562,12 @@ def security_dashboard(request):
         today = timezone.now().date()
         week_ago = today - timedelta(days=7)
 
-        # Security metrics
-        total_events = AuditLog.objects.count()
-        recent_events = AuditLog.objects.filter(
-            timestamp__date__gte=week_ago).count()
-        permission_denials = AuditLog.objects.filter(
-            action_type='permission_denied',
-            timestamp__date__gte=week_ago
-        ).count()
-        role_changes = AuditLog.objects.filter(
-            action_type='role_change',
-            timestamp__date__gte=week_ago
-        ).count()
+        # Security metrics, from the DailyLibraryStats rollup
+        week_stats = get_daily_stats(week_ago, today)
+        total_events = get_stats_totals()['audit_events']
+        recent_events = sum(day['audit_events'] for day in week_stats)
+        permission_denials = sum(day['permission_denials'] for day in week_stats)
+        role_changes = sum(day['role_changes'] for day in week_stats)
 
         # Recent security events
         recent_security_events = AuditLog.objects.filter(
@@ -537,7 +682,7 @@ def user_reservations(request):
                 'book_title': reservation.book.title,
                 'book_author': reservation.book.author,
                 'qr_generated_at': reservation.qr_generated_at.isoformat() if reservation.qr_generated_at else None,
-                'qr_data': reservation.qr_data
+                **transaction_qr_fields(reservation)
             }
             
             # Try to add cover image safely
@@ -621,13 +766,10 @@ def cancel_reservation(request, transaction_id):
         
         book = reservation.book
         
-        # Free up the reserved copy
-        book.reserved_copies -= 1
-        book.save()
-        
-        # Update reservation status
-        reservation.status = 'cancelled'
-        reservation.save()
+        # Free up the reserved copy (fails if another request got there first)
+        if not end_reservation(reservation, 'cancelled'):
+            raise Transaction.DoesNotExist
+        RecommendationCache.bump(request.user.id)
         
         # Send cancellation notification to user
         from .notification_utils import NotificationManager
@@ -671,10 +813,10 @@ def borrow_book(request, book_id):
         # Check if this is a confirmation request
         confirmation = request.data.get('confirmation', False)
 
+        book = Book.objects.get(id=book_id)
+
         # If not confirmed, return confirmation required message
         if not confirmation:
-            book = Book.objects.get(id=book_id)
-
             # Get book details for confirmation message
             book_details = {
                 'title': book.title,
@@ -686,71 +828,35 @@ def borrow_book(request, book_id):
             return Response({
                 'requires_confirmation': True,
                 'message': f'Do you want to reserve "{book.title}" by {book.author} for library pickup?',
-                'book_details': book_details
+                'book_details': book_details,
+                # Cached summary - the confirmed request re-checks against the database
+                'eligibility': check_eligibility(book, get_borrowing_summary(request.user.id))
             }, status=status.HTTP_200_OK)
 
         # If confirmed, proceed with RESERVATION (not borrowing)
-        user_profile = UserProfile.objects.get(user=request.user)
-        book = Book.objects.get(id=book_id)
-
-        # ✅ UPDATED: Check effective availability (available - reserved)
-        if book.effectively_available <= 0:
-            return Response({'error': 'No copies available for reservation'}, status=status.HTTP_400_BAD_REQUEST)
-
-        # 🆕 ENHANCED: Check for unpaid fines before allowing reservation
-        unpaid_fines = Transaction.objects.filter(
-            user=request.user,
-            fine_amount__gt=0,
-            fine_paid=False
-        ).aggregate(Sum('fine_amount'))['fine_amount__sum'] or 0
-
-        if unpaid_fines > 0:
-            return Response({
-                'error': f'You have outstanding fines of ₹{unpaid_fines}. Please pay before reserving more books.',
-                'unpaid_fines': unpaid_fines,  # 🆕 Send fine amount to frontend
-                'block_reservation': True  # 🆕 Flag for frontend
-            }, status=status.HTTP_400_BAD_REQUEST)
-
-        # Check 2: Already has active reservation or borrow for this book
-        existing_transaction = Transaction.objects.filter(
-            book=book,
-            user=request.user,
-            return_date__isnull=True
-        ).exclude(
-            status__in=['cancelled', 'returned']  # ✅ EXCLUDE both cancelled and returned
-        ).exists()
-        
-        if existing_transaction:
-            return Response({
-                'error': 'You already have an active reservation or borrow for this book.',
-                'already_borrowed': True
-            }, status=status.HTTP_400_BAD_REQUEST)
-
-        # Check 3: Borrowing limit reached (count both borrowed AND reserved books)
-        current_active = Transaction.objects.filter(
-            user=request.user,
-            return_date__isnull=True
-        ).exclude(status='cancelled').count()
-
-        if current_active >= user_profile.borrowing_limit:
-            return Response({
-                'error': f'Borrowing limit reached. You can only have {user_profile.borrowing_limit} active books (including reservations) at a time.'
-            }, status=status.HTTP_400_BAD_REQUEST)
+        # ✅ Availability, unpaid fines, an existing reservation/borrow of this
+        # book and the borrowing limit (borrowed AND reserved books) are all
+        # checked from one fresh query
+        summary = get_borrowing_summary(request.user.id, use_cache=False)
+        eligibility = check_eligibility(book, summary)
+        if not eligibility['eligible']:
+            eligibility.pop('eligible')
+            eligibility.pop('reason')
+            return Response(eligibility, status=status.HTTP_400_BAD_REQUEST)
 
         # Calculate due date based on user type (will start from actual borrow date)
+        user_profile = UserProfile.objects.only('borrowing_period').get(user=request.user)
         due_date = timezone.now() + timedelta(days=user_profile.borrowing_period)
 
         # ✅ Create RESERVATION (not borrow) - status is 'pending'
-        transaction = Transaction.objects.create(
-            book=book,
-            user=request.user,
-            due_date=due_date,  # This will be updated when book is actually issued
-            status='pending'
-        )
-
-        # ✅ INCREASE reserved copies (but don't decrease available copies yet)
-        book.reserved_copies += 1
-        book.save()
+        # The copy is held with a conditional UPDATE, so concurrent requests
+        # for the last copy cannot both succeed
+        # (due_date will be updated when book is actually issued)
+        transaction = create_reservation(book, request.user, due_date)
+        if transaction is None:
+            return Response({'error': 'No copies available for reservation'}, status=status.HTTP_400_BAD_REQUEST)
+        book.refresh_from_db(fields=['available_copies', 'reserved_copies'])
+        RecommendationCache.bump(request.user.id)
 
         # ✅ Send ONLY reservation confirmation
         from .notification_utils import NotificationManager
@@ -781,7 +887,37 @@ def borrow_book(request, book_id):
         return Response({'error': 'Book not found'}, status=status.HTTP_404_NOT_FOUND)
     except UserProfile.DoesNotExist:
         return Response({'error': 'User profile not found'}, status=status.HTTP_404_NOT_FOUND)
-    
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def borrow_eligibility(request):
+    """
+    Whether the user may reserve each of ?ids=1,2,3 (up to MAX_BATCH_BOOKS),
+    with their fines, active count and limit - one query per call at most.
+    """
+    try:
+        book_ids = list(dict.fromkeys(
+            int(book_id) for book_id in request.GET.get('ids', '').split(',') if book_id.strip()))
+    except ValueError:
+        return Response({'error': 'ids must be a comma-separated list of book ids'}, status=status.HTTP_400_BAD_REQUEST)
+    if not book_ids:
+        return Response({'error': 'ids is required'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(book_ids) > MAX_BATCH_BOOKS:
+        return Response({'error': f'At most {MAX_BATCH_BOOKS} books per request'}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        summary, results = batch_eligibility(request.user.id, book_ids)
+    except UserProfile.DoesNotExist:
+        return Response({'error': 'User profile not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    return Response({
+        'unpaid_fines': summary['unpaid_fines'],
+        'active_count': summary['active_count'],
+        'borrowing_limit': summary['borrowing_limit'],
+        'books': {str(book_id): result for book_id, result in results.items()},
+    })
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def return_book(request, transaction_id):
@@ -818,12 +954,10 @@ def return_book(request, transaction_id):
             transaction.fine_amount = 0.00
             fine_details = None
 
-        transaction.return_date = timezone.now()
-        transaction.save()
+        if not complete_return(transaction):
+            return Response({'error': 'Book already returned'}, status=status.HTTP_400_BAD_REQUEST)
 
         book = transaction.book
-        book.available_copies += 1
-        book.save()
 
         # 🎯 ENHANCED NOTIFICATIONS (SAFE UPDATE)
         from .notification_utils import NotificationManager
@@ -973,6 +1107,7 @@ def pay_all_fines(request):
 
         total_amount = sum(fine.fine_amount for fine in unpaid_fines)
         unpaid_fines.update(fine_paid=True, fine_paid_date=timezone.now())
+        invalidate_borrowing_summary(request.user.id)
 
         return Response({
             'success': f'All fines totaling ₹{total_amount} paid successfully',
@@ -1041,174 +1176,81 @@ def get_enhanced_user_preferences(user):
     return preferences
 
 
-def get_enhanced_content_based_recommendations(user, borrowed_book_ids, limit=8):
+def rank_recommendations(user, borrowed_book_ids, limit=12):
     """
-    Enhanced content-based filtering with multiple similarity factors
+    Ranked (book_id, score) pairs for a user - always returns books
     """
-    user_preferences = get_enhanced_user_preferences(user)
-
-    if not user_preferences['genres'] and not user_preferences['authors']:
-        return get_popular_books_queryset(borrowed_book_ids, limit)
-
-    # Get all available books excluding borrowed ones
-    books = Book.objects.filter(available_copies__gt=0).exclude(
-        id__in=borrowed_book_ids)
-
-    scored_books = []
-    for book in books:
-        score = 0
-
-        # Genre matching (highest weight)
-        genre_score = user_preferences['genres'].get(book.genre, 0)
-        score += 3 * genre_score
-
-        # Author matching (medium weight)
-        author_score = user_preferences['authors'].get(book.author, 0)
-        score += 2 * author_score
-
-        # Recent interest boost
-        if book.genre in user_preferences['recent_genres']:
-            score += 1.5
-
-        # Popularity boost (low weight)
-        borrow_count = Transaction.objects.filter(book=book).count()
-        score += 0.1 * min(borrow_count, 20)  # Cap at 20
+    borrowed_book_ids = list(borrowed_book_ids)
+    ranked = []
+    seen = set(borrowed_book_ids)
 
-        # Only include books with some relevance
-        if score > 0:
-            scored_books.append((book, score))
-
-    # Sort by score and return top books
-    scored_books.sort(key=lambda x: x[1], reverse=True)
-    result = [book for book, score in scored_books[:limit]]
-
-    print(
-        f"🎯 Content-based recommendations: {len(result)} books with scores {[score for _, score in scored_books[:3]]}")
-    return result
+    def add(candidates, quota):
+        added = 0
+        for book_id, score in candidates:
+            if added >= quota or len(ranked) >= limit:
+                break
+            if book_id not in seen:
+                seen.add(book_id)
+                ranked.append((book_id, score))
+                added += 1
 
+    # Strategy 1: Personalized (content) and co-borrowed (collaborative)
+    personalized, collaborative = [], []
+    try:
+        user_preferences = get_enhanced_user_preferences(user)
+        if user_preferences['genres'] or user_preferences['authors']:
+            personalized = ContentRecommender.get().rank(
+                user_preferences, borrowed_book_ids, limit * 2)
+    except Exception as e:
+        logger.warning(f"Personalized recommendations failed: {e}")
 
-def get_enhanced_collaborative_recommendations(user, borrowed_book_ids, limit=5):
-    """
-    Improved collaborative filtering using multiple factors
-    """
-    user_prefs = get_enhanced_user_preferences(user)
-    user_genres = set(user_prefs['genres'].keys())
+    try:
+        index = CoBorrowIndex.get()
+        if index is not None:
+            collaborative = index.rank(borrowed_book_ids, limit=limit * 2)
+    except Exception as e:
+        logger.warning(f"Collaborative recommendations failed: {e}")
 
-    if not user_genres:
-        return Book.objects.none()
+    # Rankings come from in-memory indexes; check availability in one query
+    available = set(Book.objects.filter(
+        id__in=[book_id for book_id, _ in personalized + collaborative],
+        available_copies__gt=0
+    ).values_list('id', flat=True))
+    add([c for c in personalized if c[0] in available], 6)
+    add([c for c in collaborative if c[0] in available], 6)
 
-    # Find users with substantial overlap
-    similar_users = User.objects.filter(
-        transaction__book__genre__in=user_genres
-    ).exclude(id=user.id).annotate(
-        common_genres=Count('transaction__book__genre',
-                            filter=Q(transaction__book__genre__in=user_genres)),
-        total_books=Count('transaction')
-    ).filter(
-        common_genres__gte=1,  # At least 1 genre in common
-        total_books__gte=2     # At least 2 books read
-    ).order_by('-common_genres')[:8]  # Get top 8 similar users
+    # Strategy 2: Always include popular books
+    popular = Book.objects.filter(
+        available_copies__gt=0
+    ).exclude(id__in=borrowed_book_ids).annotate(
+        borrow_count=Count('transaction')
+    ).order_by('-borrow_count').values_list('id', 'borrow_count')[:8]
+    add(popular, limit)
 
-    if not similar_users:
-        return Book.objects.none()
+    # Strategy 3: FINAL FALLBACK - any available books
+    if not ranked:
+        add(((book_id, 0) for book_id in Book.objects.filter(
+            available_copies__gt=0
+        ).exclude(id__in=borrowed_book_ids).values_list('id', flat=True)[:limit]), limit)
 
-    # Get books borrowed by similar users
-    recommended_books = Book.objects.filter(
-        transaction__user__in=similar_users,
-        available_copies__gt=0
-    ).exclude(
-        id__in=borrowed_book_ids
-    ).annotate(
-        borrow_count=Count('transaction'),
-        similar_user_count=Count('transaction__user', distinct=True)
-    ).order_by('-similar_user_count', '-borrow_count')[:limit]
+    # Last resort
+    if not ranked:
+        add(((book_id, 0) for book_id in
+             Book.objects.values_list('id', flat=True)[:limit]), limit)
 
-    print(
-        f"👥 Collaborative recommendations: {recommended_books.count()} from {len(similar_users)} similar users")
-    return recommended_books
+    return ranked
 
 
 def get_cached_recommendations(user, borrowed_book_ids):
     """
-    GUARANTEED working recommendations - always returns books
+    Recommendations for a user, served from the versioned ranking cache
     """
-    cache_key = f"user_{user.id}_recommendations"
-    cached_recommendations = cache.get(cache_key)
-
-    if cached_recommendations is not None:
-        return cached_recommendations
-
-    print(f"🎯 Generating guaranteed recommendations for {user.username}")
-
-    # ALWAYS return books - multiple fallback strategies
-    all_books = []
-    
-    # Strategy 1: Try personalized recommendations
-    try:
-        # Simple but effective: books from genres user borrowed before
-        user_books = Transaction.objects.filter(user=user).select_related('book')
-        if user_books.exists():
-            user_genres = user_books.values_list('book__genre', flat=True).distinct()
-            if user_genres:
-                personalized = Book.objects.filter(
-                    genre__in=user_genres,
-                    available_copies__gt=0
-                ).exclude(id__in=borrowed_book_ids).distinct()[:6]
-                all_books.extend(list(personalized))
-                print(f"✅ Added {len(personalized)} personalized books")
-    except Exception as e:
-        print(f"⚠️ Personalized failed: {e}")
+    ranked = RecommendationCache.get_or_set(
+        user.id, lambda: rank_recommendations(user, borrowed_book_ids))
 
-    # Strategy 2: Always include popular books
-    try:
-        popular = Book.objects.filter(
-            available_copies__gt=0
-        ).exclude(id__in=borrowed_book_ids).annotate(
-            borrow_count=Count('transaction')
-        ).order_by('-borrow_count')[:8]
-        
-        # Add only new books
-        existing_ids = [b.id for b in all_books]
-        for book in popular:
-            if book.id not in existing_ids and len(all_books) < 12:
-                all_books.append(book)
-        print(f"✅ Added {len(popular)} popular books")
-    except Exception as e:
-        print(f"⚠️ Popular books failed: {e}")
-
-    # Strategy 3: FINAL FALLBACK - any available books
-    if not all_books:
-        print("🆘 Using final fallback - any available books")
-        all_books = Book.objects.filter(available_copies__gt=0).exclude(
-            id__in=borrowed_book_ids
-        )[:12]
-
-    # Ensure we have books
-    if not all_books:
-        print("🚨 CRITICAL: No books found at all!")
-        all_books = Book.objects.all()[:12]  # Last resort
-
-    print(f"🎉 Final: {len(all_books)} books for recommendations")
-    
-    # Cache for 15 minutes (shorter for testing)
-    cache.set(cache_key, all_books, 900)
-    return all_books
-
-def filter_out_user_reservations(books, user):
-    """
-    Simple filter to remove books that user has already reserved or borrowed
-    """
-    # Get books user has active reservations for
-    reserved_books = Transaction.objects.filter(
-        user=user,
-        status__in=['pending', 'borrowed']  # Both reserved and currently borrowed
-    ).values_list('book_id', flat=True)
-    
-    # Filter out reserved books
-    available_books = [book for book in books if book.id not in reserved_books]
-    
-    print(f"📚 Filtered {len(books)} -> {len(available_books)} books (removed {len(books) - len(available_books)} reserved books)")
-    return available_books
+    # Rankings are cached as ids; hydrate the rows in one query
+    books = Book.objects.in_bulk([book_id for book_id, _ in ranked])
+    return [books[book_id] for book_id, _ in ranked if book_id in books]
 
 
 @api_view(['GET'])
@@ -1282,8 +1324,6 @@ def book_recommendations(request):
             all_recommendations = get_popular_books_queryset(borrowed_book_ids)
             strategy = "fallback-popular"
 
-        all_recommendations = filter_out_user_reservations(all_recommendations, request.user)
-
         serializer = BookSerializer(
             all_recommendations, many=True, context={'request': request})
 
@@ -1430,17 +1470,10 @@ def librarian_manual_issue(request):
         book = Book.objects.get(id=book_id)
         user = User.objects.get(username=username)
 
-        if book.available_copies <= 0:
+        transaction = create_direct_issue(book, user, timezone.now() + timedelta(weeks=2))
+        if transaction is None:
             return Response({'error': 'No copies available'}, status=status.HTTP_400_BAD_REQUEST)
 
-        transaction = Transaction.objects.create(
-            book=book,
-            user=user,
-            due_date=timezone.now() + timedelta(weeks=2)
-        )
-        book.available_copies -= 1
-        book.save()
-
         serializer = TransactionSerializer(transaction)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     except Book.DoesNotExist:
@@ -1463,20 +1496,9 @@ def librarian_manual_return(request, transaction_id):
         if transaction.return_date:
             return Response({'error': 'Book already returned'}, status=status.HTTP_400_BAD_REQUEST)
 
-        today = timezone.now().date()
-        due_date = transaction.due_date.date()
-
-        if today > due_date:
-            days_overdue = (today - due_date).days
-            fine_per_day = 5  # ₹5 per day fine
-            transaction.fine_amount = days_overdue * fine_per_day
-
-        transaction.return_date = timezone.now()
-        transaction.save()
-
-        book = transaction.book
-        book.available_copies += 1
-        book.save()
+        # complete_return stores the fine for any overdue days
+        if not complete_return(transaction):
+            return Response({'error': 'Book already returned'}, status=status.HTTP_400_BAD_REQUEST)
 
         serializer = TransactionSerializer(transaction)
         return Response({'success': 'Book returned successfully', 'transaction': serializer.data})
@@ -1494,17 +1516,19 @@ def admin_dashboard_stats(request):
     if not _check_admin_permission(request):
         return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
 
+    # Transaction totals come from the DailyLibraryStats rollup
+    totals = get_stats_totals()
+
     total_books = Book.objects.count()
     total_users = User.objects.count()
-    total_transactions = Transaction.objects.count()
+    total_transactions = totals['borrows']
     active_borrows = Transaction.objects.filter(
         return_date__isnull=True).count()
     overdue_books = Transaction.objects.filter(
         return_date__isnull=True,
         due_date__lt=timezone.now()
     ).count()
-    total_fines = Transaction.objects.aggregate(
-        Sum('fine_amount'))['fine_amount__sum'] or 0
+    total_fines = totals['fines_assessed']
 
     popular_books = Book.objects.annotate(
         borrow_count=Count('transaction')
@@ -1522,41 +1546,140 @@ def admin_dashboard_stats(request):
     })
 
 
+@api_view(['GET', 'DELETE'])
+@permission_classes([IsAdminUser])
+def admin_recommendation_cache_stats(request):
+    """
+    Hit/miss/eviction counters of the recommendation cache, summed over
+    every process sharing the default cache. DELETE resets the counters.
+    """
+    if not _check_admin_permission(request):
+        return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+
+    if request.method == 'DELETE':
+        RecommendationCache.reset_stats()
+
+    return Response(RecommendationCache.stats())
+
+
+ADMIN_USER_LIST_COLUMNS = (
+    'id', 'username', 'email', 'first_name', 'last_name', 'date_joined',
+    'user_type', 'phone', 'borrowed_count', 'current_borrows', 'total_fines'
+)
+
+# (header, lookup) of every column in transaction exports
+TRANSACTION_EXPORT_COLUMNS = (
+    ('id', 'id'),
+    ('user_id', 'user_id'),
+    ('username', 'user__username'),
+    ('book_id', 'book_id'),
+    ('book_title', 'book__title'),
+    ('isbn', 'book__isbn'),
+    ('status', 'status'),
+    ('issue_date', 'issue_date'),
+    ('due_date', 'due_date'),
+    ('return_date', 'return_date'),
+    ('fine_amount', 'fine_amount'),
+    ('fine_paid', 'fine_paid'),
+)
+
+
+def _export_format_error(fmt):
+    return Response({
+        'error': f'Cannot export as "{fmt}"',
+        'allowed_formats': export_formats()
+    }, status=status.HTTP_400_BAD_REQUEST)
+
+
+def _range_suffix(start, end):
+    return f"_{start or 'start'}_{end or 'today'}" if start or end else ''
+
+
 @api_view(['GET'])
 @permission_classes([IsAdminUser])
 def admin_user_list(request):
     """
     Retrieves a list of all users with their profile details and borrowing statistics.
     Accessible only by admins.
+
+    Statistics are computed in one annotated query. Optional parameters:
+    ?ordering= any column (prefix '-' for descending), ?user_type= filter,
+    ?page=/?page_size= for a paginated envelope, ?start_date=/?end_date=
+    (YYYY-MM-DD) to filter on date_joined, and ?export=json|csv|jsonl|parquet
+    to stream every row as a download.
     """
     if not _check_admin_permission(request):
         return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
 
-    users = User.objects.all().select_related('userprofile')
-    user_data = []
-
-    for user in users:
-        profile = user.userprofile
-        borrowed_count = Transaction.objects.filter(user=user).count()
-        current_borrows = Transaction.objects.filter(
-            user=user, return_date__isnull=True).count()
-        total_fines = Transaction.objects.filter(user=user).aggregate(
-            Sum('fine_amount'))['fine_amount__sum'] or 0
-
-        user_data.append({
-            'id': user.id,
-            'username': user.username,
-            'email': user.email,
-            'first_name': user.first_name,
-            'last_name': user.last_name,
-            'user_type': profile.user_type,
-            'phone': profile.phone,
-            'borrowed_count': borrowed_count,
-            'current_borrows': current_borrows,
-            'total_fines': total_fines,
-            'date_joined': user.date_joined
-        })
-    return Response(user_data)
+    ordering = request.GET.get('ordering', 'id')
+    if ordering.lstrip('-') not in ADMIN_USER_LIST_COLUMNS:
+        return Response({
+            'error': f'Cannot order by "{ordering}"',
+            'allowed_ordering': sorted(ADMIN_USER_LIST_COLUMNS)
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    users = User.objects.values(
+        'id', 'username', 'email', 'first_name', 'last_name', 'date_joined',
+        user_type=F('userprofile__user_type'),
+        phone=F('userprofile__phone'),
+    ).annotate(
+        borrowed_count=Count('transaction'),
+        current_borrows=Count(
+            'transaction', filter=Q(transaction__return_date__isnull=True)),
+        total_fines=Coalesce(
+            Sum('transaction__fine_amount'), Value(0),
+            output_field=DecimalField(max_digits=10, decimal_places=2)),
+    ).order_by(ordering, 'id' if ordering.lstrip('-') != 'id' else 'username')
+
+    try:
+        start, end = parse_date_range(request.GET)
+    except ValueError as e:
+        return Response({'error': f'Invalid date range: {e}'}, status=status.HTTP_400_BAD_REQUEST)
+    date_filter = Q()
+    if start:
+        date_filter &= Q(date_joined__gte=day_bounds(start, start)[0])
+    if end:
+        date_filter &= Q(date_joined__lt=day_bounds(end, end)[1])
+    users = users.filter(date_filter)
+
+    user_type = request.GET.get('user_type')
+    if user_type:
+        users = users.filter(userprofile__user_type=user_type)
+
+    fmt = request.GET.get('export')
+    if fmt == 'json':
+        return streaming_json_response(users.iterator(chunk_size=2000), 'users.json')
+    if fmt:
+        if fmt not in export_formats():
+            return _export_format_error(fmt)
+        return streaming_export_response(
+            users, [(column, column) for column in ADMIN_USER_LIST_COLUMNS],
+            fmt, f'users{_range_suffix(start, end)}')
+
+    page = request.GET.get('page')
+    if page is None:
+        return Response(list(users))
+
+    try:
+        page = max(int(page), 1)
+        page_size = min(max(int(request.GET.get('page_size', 50)), 1), 500)
+    except ValueError:
+        return Response({'error': 'page and page_size must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+
+    total = User.objects.filter(date_filter)
+    if user_type:
+        total = total.filter(userprofile__user_type=user_type)
+    total = total.count()
+    offset = (page - 1) * page_size
+    return Response({
+        'users': list(users[offset:offset + page_size]),
+        'pagination': {
+            'page': page,
+            'page_size': page_size,
+            'total': total,
+            'has_next': offset + page_size < total
+        }
+    })
 
 
 @api_view(['GET'])
@@ -1565,12 +1688,25 @@ def admin_transaction_list(request):
     """
     Retrieves a list of all transactions with filtering options by status, user, and book.
     Accessible only by admins.
+
+    ?start_date=/?end_date= (YYYY-MM-DD) filter on issue date, and
+    ?export=csv|jsonl|parquet streams the matching rows as a flat download
+    instead of serializing them.
     """
     if not _check_admin_permission(request):
         return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
 
     transactions = Transaction.objects.all().select_related('book', 'user')
 
+    try:
+        start, end = parse_date_range(request.GET)
+    except ValueError as e:
+        return Response({'error': f'Invalid date range: {e}'}, status=status.HTTP_400_BAD_REQUEST)
+    if start:
+        transactions = transactions.filter(issue_date__gte=day_bounds(start, start)[0])
+    if end:
+        transactions = transactions.filter(issue_date__lt=day_bounds(end, end)[1])
+
     status_filter = request.GET.get('status', '')
     if status_filter == 'active':
         transactions = transactions.filter(return_date__isnull=True)
@@ -1589,6 +1725,14 @@ def admin_transaction_list(request):
     if book_filter:
         transactions = transactions.filter(book__title__icontains=book_filter)
 
+    fmt = request.GET.get('export')
+    if fmt:
+        if fmt not in export_formats():
+            return _export_format_error(fmt)
+        return streaming_export_response(
+            transactions.order_by('id'), TRANSACTION_EXPORT_COLUMNS,
+            fmt, f'transactions{_range_suffix(start, end)}')
+
     serializer = TransactionSerializer(transactions, many=True)
     return Response(serializer.data)
 
@@ -1658,34 +1802,89 @@ def admin_generate_report(request):
     """
     Generates a report (e.g., monthly) with statistics on borrows, returns, and fines.
     Accessible only by admins.
+
+    ?start_date=/?end_date= (YYYY-MM-DD) select any range (type=custom);
+    the monthly report covers the current month. Totals are aggregated in
+    the database - the rows themselves are streamed by the
+    'transactions_export' URL (?export=csv|jsonl|parquet) in the response.
     """
     if not _check_admin_permission(request):
         return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
 
-    report_type = request.GET.get('type', 'monthly')
-    start_date = request.GET.get('start_date')
-    end_date = request.GET.get('end_date')
-
-    if report_type == 'monthly':
-        start_of_month = timezone.now().replace(
-            day=1, hour=0, minute=0, second=0, microsecond=0)
-        transactions = Transaction.objects.filter(
-            issue_date__gte=start_of_month)
+    today = timezone.localdate()
+    try:
+        start, end = parse_date_range(request.GET, today.replace(day=1), today)
+    except ValueError as e:
+        return Response({'error': f'Invalid date range: {e}'}, status=status.HTTP_400_BAD_REQUEST)
+
+    report_type = request.GET.get('type', 'custom' if 'start_date' in request.GET else 'monthly')
+    if report_type not in ('monthly', 'custom'):
+        return Response({'error': 'Invalid report type'}, status=status.HTTP_400_BAD_REQUEST)
+
+    lower, upper = day_bounds(start, end)
+    totals = Transaction.objects.filter(issue_date__gte=lower, issue_date__lt=upper).aggregate(
+        total_borrows=Count('id'),
+        total_returns=Count('id', filter=Q(return_date__isnull=False)),
+        total_fines=Coalesce(Sum('fine_amount'), Value(0),
+                             output_field=DecimalField(max_digits=10, decimal_places=2)),
+    )
+
+    export_url = request.build_absolute_uri(reverse('admin_transaction_list'))
+    range_query = f'start_date={start}&end_date={end}'
+    return Response({
+        'report_type': report_type,
+        'period': start.strftime('%B %Y') if report_type == 'monthly' else f'{start} to {end}',
+        'start_date': start,
+        'end_date': end,
+        **totals,
+        'transactions_export': {
+            fmt: f'{export_url}?{range_query}&export={fmt}'
+            for fmt in export_formats() if fmt != 'json'
+        },
+    })
 
-        total_borrows = transactions.count()
-        total_returns = transactions.filter(return_date__isnull=False).count()
-        total_fines = transactions.aggregate(Sum('fine_amount'))[
-            'fine_amount__sum'] or 0
 
-        return Response({
-            'report_type': 'monthly',
-            'period': start_of_month.strftime('%B %Y'),
-            'total_borrows': total_borrows,
-            'total_returns': total_returns,
-            'total_fines': total_fines,
-            'transactions': TransactionSerializer(transactions, many=True).data
-        })
-    return Response({'error': 'Invalid report type'}, status=status.HTTP_400_BAD_REQUEST)
+def _report_job_data(request, job):
+    data = {
+        'job_id': job.id,
+        'report_type': job.report_type,
+        'start_date': job.start_date,
+        'end_date': job.end_date,
+        'status': job.status,
+        'status_url': request.build_absolute_uri(reverse('admin_report_job', args=[job.id])),
+        'created_at': job.created_at,
+        'finished_at': job.finished_at,
+    }
+    if job.status == 'done':
+        data['download_url'] = request.build_absolute_uri(
+            reverse('admin_report_job_download', args=[job.id]))
+    elif job.status == 'failed':
+        data['error'] = job.error
+    return data
+
+
+def _report_request_range(params):
+    """(report type, start, end) of a report request, or raises ValueError"""
+    report_type = params.get('type', 'monthly')
+    start, end = parse_date_range(params)
+    return (report_type, *report_range(report_type, start, end))
+
+
+def _report_pdf_response(request, job):
+    """Serve a finished report; its PDF is content-addressed, so cache it"""
+    etag = f'"{job.content_hash}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = FileResponse(
+            default_storage.open(job.file.name), content_type='application/pdf',
+            as_attachment=True,
+            filename=f'{job.report_type}_report_{job.start_date}_{job.end_date}.pdf')
+    response['ETag'] = etag
+    if job.immutable:
+        patch_cache_control(response, private=True, max_age=365 * 86400, immutable=True)
+    else:
+        patch_cache_control(response, private=True, max_age=getattr(settings, 'REPORT_MUTABLE_TTL', 600))
+    return response
 
 
 @api_view(['GET'])
@@ -1694,39 +1893,70 @@ def admin_generate_pdf_report(request):
     """
     Generates a PDF report (e.g., monthly) with library statistics.
     Accessible only by admins.
+
+    PDFs are rendered by a background worker. A finished report for the
+    requested range is returned straight away; otherwise a job is queued
+    and 202 returned with its status_url to poll.
     """
     if not _check_admin_permission(request):
         return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
 
-    report_type = request.GET.get('type', 'monthly')
-    start_date = request.GET.get('start_date')
-    end_date = request.GET.get('end_date')
+    try:
+        report_type, start, end = _report_request_range(request.GET)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-    if report_type == 'monthly':
-        start_of_month = timezone.now().replace(
-            day=1, hour=0, minute=0, second=0, microsecond=0)
-        transactions = Transaction.objects.filter(
-            issue_date__gte=start_of_month)
-
-        total_borrows = transactions.count()
-        total_returns = transactions.filter(return_date__isnull=False).count()
-        total_fines = transactions.aggregate(Sum('fine_amount'))[
-            'fine_amount__sum'] or 0
-
-        html_string = render_to_string('monthly_report.html', {
-            'period': start_of_month.strftime('%B %Y'),
-            'total_borrows': total_borrows,
-            'total_returns': total_returns,
-            'total_fines': total_fines,
-            'transactions': transactions
-        })
+    job, _ = submit_report(report_type, start, end, request.user)
+    if job.status == 'done':
+        return _report_pdf_response(request, job)
+    return Response(_report_job_data(request, job), status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def admin_submit_report_job(request):
+    """
+    Queue a PDF report (type, start_date, end_date) for background
+    rendering, reusing a finished or in-progress job for the same range.
+    """
+    if not _check_admin_permission(request):
+        return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+
+    try:
+        report_type, start, end = _report_request_range(request.data)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-        pdf_file = weasyprint.HTML(string=html_string).write_pdf()
-        response = HttpResponse(pdf_file, content_type='application/pdf')
-        response[
-            'Content-Disposition'] = f'attachment; filename="monthly_report_{start_of_month.strftime("%Y_%m")}.pdf"'
-        return response
-    return Response({'error': 'Invalid report type'}, status=status.HTTP_400_BAD_REQUEST)
+    job, created = submit_report(report_type, start, end, request.user)
+    return Response(
+        _report_job_data(request, job),
+        status=status.HTTP_202_ACCEPTED if job.status != 'done' else status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def admin_report_job(request, job_id):
+    """Status of a report job (download_url once it is done)"""
+    if not _check_admin_permission(request):
+        return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+    try:
+        job = ReportJob.objects.get(id=job_id)
+    except ReportJob.DoesNotExist:
+        return Response({'error': 'Report job not found'}, status=status.HTTP_404_NOT_FOUND)
+    return Response(_report_job_data(request, job))
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def admin_report_job_download(request, job_id):
+    """Download the PDF of a finished report job"""
+    if not _check_admin_permission(request):
+        return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+    try:
+        job = ReportJob.objects.get(id=job_id, status='done')
+    except ReportJob.DoesNotExist:
+        return Response({'error': 'Report is not ready'}, status=status.HTTP_404_NOT_FOUND)
+    return _report_pdf_response(request, job)
 
 # --- Other Views (potentially for rendering HTML pages) ---
 
@@ -1758,24 +1988,28 @@ def admin_advanced_analytics(request):
     if not _check_admin_permission(request):
         return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
 
+    try:
+        trend_days = min(max(int(request.GET.get('trend_days', 7)), 1), 366)
+        growth_days = min(max(int(request.GET.get('growth_days', 30)), 1), 366 * 5)
+    except ValueError:
+        return Response({'error': 'trend_days and growth_days must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+    granularity = request.GET.get('granularity', 'day')
+    if granularity not in GRANULARITIES:
+        return Response({'error': f'granularity must be one of {", ".join(GRANULARITIES)}'}, status=status.HTTP_400_BAD_REQUEST)
+
     try:
         # Time periods
         today = timezone.now().date()
-        seven_days_ago = today - timedelta(days=7)
-        thirty_days_ago = today - timedelta(days=30)
+
+        # Closed days come from the DailyLibraryStats rollup, today is live
+        today_stats = get_daily_stats(today, today)[0]
+        totals = get_stats_totals(include_genres=True)
 
         # 📊 Library Health Metrics
         library_health = {
-            'books_borrowed_today': Transaction.objects.filter(
-                issue_date__date=today
-            ).count(),
-            'books_returned_today': Transaction.objects.filter(
-                return_date__date=today
-            ).count(),
-            'overdue_books_count': Transaction.objects.filter(
-                return_date__isnull=True,
-                due_date__lt=timezone.now()
-            ).count(),
+            'books_borrowed_today': today_stats['borrows'],
+            'books_returned_today': today_stats['returns'],
+            'overdue_books_count': today_stats['overdue_snapshot'],
             'active_users_today': User.objects.filter(
                 last_login__date=today
             ).count(),
@@ -1789,10 +2023,11 @@ def admin_advanced_analytics(request):
             'most_borrowed_books': list(Book.objects.annotate(
                 borrow_count=Count('transaction')
             ).order_by('-borrow_count')[:5].values('id', 'title', 'author', 'borrow_count')),
-            'popular_genres': list(Book.objects.values('genre').annotate(
-                count=Count('id'),
-                borrow_count=Count('transaction')
-            ).order_by('-borrow_count')[:5]),
+            'popular_genres': [
+                {'genre': genre['genre'], 'count': genre['total_books'],
+                 'borrow_count': genre['total_borrows']}
+                for genre in get_genre_borrow_counts(totals['genre_borrows'])[:5]
+            ],
             'active_readers': list(User.objects.annotate(
                 books_borrowed=Count('transaction')
             ).order_by('-books_borrowed')[:5].values('id', 'username', 'books_borrowed'))
@@ -1800,23 +2035,24 @@ def admin_advanced_analytics(request):
 
         # 💰 Financial Analytics
         financial_analytics = {
-            'total_fines_collected': float(Transaction.objects.filter(
-                fine_paid=True
-            ).aggregate(Sum('fine_amount'))['fine_amount__sum'] or 0),
+            'total_fines_collected': float(totals['fines_collected']),
             'outstanding_fines': float(Transaction.objects.filter(
                 fine_amount__gt=0,
                 fine_paid=False
             ).aggregate(Sum('fine_amount'))['fine_amount__sum'] or 0),
-            'fines_today': float(Transaction.objects.filter(
-                fine_paid_date__date=today
-            ).aggregate(Sum('fine_amount'))['fine_amount__sum'] or 0)
+            'fines_today': float(today_stats['fines_collected'])
         }
 
         # 📅 Trends & Growth
         trends_analytics = {
-            'borrow_trend_7_days': get_borrow_trend(7),
-            'user_growth_30_days': get_user_growth(30),
-            'genre_popularity_trend': get_genre_trends()
+            'borrow_trend_7_days': get_borrow_trend(trend_days, granularity),
+            'user_growth_30_days': get_user_growth(growth_days, granularity),
+            'genre_popularity_trend': get_genre_trends(genre_borrows=totals['genre_borrows']),
+            'window': {
+                'trend_days': trend_days,
+                'growth_days': growth_days,
+                'granularity': granularity
+            }
         }
 
         return Response({
@@ -1835,57 +2071,72 @@ def admin_advanced_analytics(request):
         return Response({'error': 'Failed to generate analytics'}, status=500)
 
 
-def get_borrow_trend(days=7):
+def get_borrow_trend(days=7, granularity='day'):
     """Get borrowing trends for the last N days"""
     end_date = timezone.now().date()
     start_date = end_date - timedelta(days=days-1)
 
-    # Simple approach without TruncDate
-    trends = []
-    for i in range(days):
-        current_date = start_date + timedelta(days=i)
-        count = Transaction.objects.filter(
-            issue_date__date=current_date
-        ).count()
-        trends.append({
-            'date': current_date.strftime('%Y-%m-%d'),
-            'borrows': count
-        })
+    return [
+        {'date': bucket['period'].strftime('%Y-%m-%d'), 'borrows': bucket['borrows']}
+        for bucket in get_stats_series(start_date, end_date, granularity, fields=('borrows',))
+    ]
 
-    return trends
 
-
-def get_user_growth(days=30):
+def get_user_growth(days=30, granularity='day'):
     """Get user growth over the last N days"""
     end_date = timezone.now().date()
     start_date = end_date - timedelta(days=days-1)
 
     growth_data = []
     cumulative = 0
-
-    for i in range(days):
-        current_date = start_date + timedelta(days=i)
-        new_users = User.objects.filter(
-            date_joined__date=current_date
-        ).count()
-        cumulative += new_users
-
+    for bucket in get_stats_series(start_date, end_date, granularity, fields=('new_users',)):
+        cumulative += bucket['new_users']
         growth_data.append({
-            'date': current_date.strftime('%Y-%m-%d'),
-            'new_users': new_users,
+            'date': bucket['period'].strftime('%Y-%m-%d'),
+            'new_users': bucket['new_users'],
             'total_users': cumulative
         })
 
     return growth_data
 
 
-def get_genre_trends():
-    """Get genre popularity trends"""
-    genres = list(Book.objects.values('genre').annotate(
-        total_books=Count('id'),
-        total_borrows=Count('transaction')
-    ).filter(total_borrows__gt=0).order_by('-total_borrows')[:10])
+def get_genre_borrow_counts(genre_borrows):
+    """Books and all-time borrows per genre, most borrowed first"""
+    genres = [
+        {'genre': row['genre'], 'total_books': row['total_books'],
+         'total_borrows': genre_borrows.get(row['genre'] or '', 0)}
+        for row in Book.objects.values('genre').annotate(total_books=Count('id')).order_by()
+    ]
+    return sorted(genres, key=lambda genre: -genre['total_borrows'])
+
 
+def get_genre_trends(months=6, genre_borrows=None):
+    """Get genre popularity trends, with monthly borrows for each top genre"""
+    if genre_borrows is None:
+        genre_borrows = get_stats_totals(include_genres=True)['genre_borrows']
+    genres = [
+        genre for genre in get_genre_borrow_counts(genre_borrows)
+        if genre['total_borrows'] > 0
+    ][:10]
+
+    end_date = timezone.now().date()
+    start_date = end_date.replace(day=1)
+    for _ in range(months - 1):
+        start_date = bucket_start(start_date - timedelta(days=1), 'month')
+
+    periods = bucket_range(start_date, end_date, 'month')
+    monthly = {genre['genre'] or '': dict.fromkeys(periods, 0) for genre in genres}
+    for stats in get_daily_stats(start_date, end_date):
+        period = bucket_start(stats['date'], 'month')
+        for genre, borrows in stats['genre_borrows'].items():
+            if genre in monthly:
+                monthly[genre][period] += borrows
+
+    for genre in genres:
+        genre['monthly_borrows'] = [
+            {'month': period.strftime('%Y-%m'), 'borrows': borrows}
+            for period, borrows in monthly[genre['genre'] or ''].items()
+        ]
     return genres
 
 # Add to views.py - Update the generate_borrow_qr function
@@ -1922,18 +2173,17 @@ def generate_borrow_qr(request, book_id):
         if existing_active_qr and existing_active_qr.qr_data:
             return Response({
                 'success': 'Using existing QR code',
-                'qr_data': existing_active_qr.qr_data,
+                **transaction_qr_fields(existing_active_qr),
                 'transaction_id': existing_active_qr.id,
                 'expires_at': existing_active_qr.get_qr_expiry_time().isoformat() if existing_active_qr.get_qr_expiry_time() else None,
                 'type': 'qr_pending'
             })
 
         # Generate QR data
-        qr_payload = f"BORROW:{reservation.id}:{book.id}:{user.id}"
-        qr_data = generate_base64_qr(qr_payload)
+        qr_payload = borrow_qr_payload(reservation)
 
         # Save QR data to reservation
-        reservation.qr_data = qr_data
+        reservation.qr_data = stored_qr_value(qr_payload)
         reservation.qr_generated_at = timezone.now()
         reservation.save()
 
@@ -1947,7 +2197,7 @@ def generate_borrow_qr(request, book_id):
 
         return Response({
             'success': 'QR code generated for library pickup!',
-            'qr_data': qr_data,
+            **qr_response_fields(qr_payload),
             'transaction_id': reservation.id,
             'expires_at': reservation.get_qr_expiry_time().isoformat(),
             'type': 'qr_pending'
@@ -1973,16 +2223,15 @@ def fix_missing_qr(request, transaction_id):
         )
 
         # Generate QR data
-        qr_payload = f"BORROW:{transaction.id}:{transaction.book.id}:{request.user.id}"
-        qr_data = generate_base64_qr(qr_payload)
+        qr_payload = borrow_qr_payload(transaction)
 
         # Update transaction
-        transaction.qr_data = qr_data
+        transaction.qr_data = stored_qr_value(qr_payload)
         transaction.save()
 
         return Response({
             'success': 'QR data added to existing transaction',
-            'qr_data': qr_data,
+            **qr_response_fields(qr_payload),
             'transaction_id': transaction.id,
             'expires_at': transaction.get_qr_expiry_time()
         })
@@ -1990,6 +2239,30 @@ def fix_missing_qr(request, transaction_id):
     except Transaction.DoesNotExist:
         return Response({'error': 'Transaction not found'}, status=404)
 
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def qr_image(request, token, fmt):
+    """
+    Serve a QR image from a signed token (see qr_utils.qr_url).
+    Images are content-addressed, so they are cacheable for a day.
+    """
+    if fmt not in QR_FORMATS:
+        return Response({'error': f'Unknown QR format "{fmt}"'}, status=status.HTTP_404_NOT_FOUND)
+    payload = payload_from_token(token)
+    if payload is None:
+        return Response({'error': 'Invalid QR token'}, status=status.HTTP_404_NOT_FOUND)
+
+    etag = f'"{qr_digest(payload, fmt)}"'
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is None:
+        response = HttpResponse(render_qr(payload, fmt), content_type=QR_FORMATS[fmt])
+    else:
+        response = not_modified
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, max_age=86400, immutable=True)
+    return response
+
 # In views.py - Add this endpoint
 
 @api_view(['GET'])
@@ -2080,8 +2353,7 @@ def validate_borrow_qr(request):
 
         # Check if QR is expired
         if not transaction.is_qr_valid():
-            transaction.status = 'expired'
-            transaction.save()
+            end_reservation(transaction, 'expired')
             return Response({
                 'valid': False,
                 'error': 'QR code has expired (24 hours limit)'
@@ -2134,8 +2406,7 @@ def validate_borrow_transaction(request, transaction_id):
         expiry_time = transaction.qr_generated_at + \
             timedelta(hours=transaction.qr_expiry_hours)
         if timezone.now() > expiry_time:
-            transaction.status = 'cancelled'
-            transaction.save()
+            end_reservation(transaction, 'cancelled')
             return Response({'valid': False, 'error': 'QR code has expired'})
 
         # Check if already used
@@ -2311,7 +2582,7 @@ def user_pending_transactions(request):
                 'expiry_time': expiry_time,
                 'hours_remaining': round(hours_remaining, 1),
                 'is_expired': hours_remaining <= 0,
-                'qr_data': transaction.qr_data
+                **transaction_qr_fields(transaction)
             })
 
         return Response(transactions_data)
@@ -2374,22 +2645,14 @@ def issue_book_via_qr(request):
         if not transaction.is_qr_valid():
             return Response({'error': 'QR expired'}, status=400)
 
-        book = transaction.book
-
-        # ✅ UPDATE: Convert reservation to actual borrow
-        # Reduce available copies (was already reserved)
-        book.available_copies -= 1
-        # Reduce reserved copies (reservation is being converted to borrow)
-        book.reserved_copies -= 1
-        book.save()
-
-        # Update transaction status to BORROWED and set actual issue date
-        transaction.status = 'borrowed'
-        transaction.issued_at = timezone.now()
+        # ✅ UPDATE: Convert reservation to actual borrow - the reserved copy
+        # leaves the shelf and the transaction becomes BORROWED in one step
         # ✅ Set actual due date from today (not from reservation date)
         user_profile = UserProfile.objects.get(user=transaction.user)
-        transaction.due_date = timezone.now() + timedelta(days=user_profile.borrowing_period)
-        transaction.save()
+        due_date = timezone.now() + timedelta(days=user_profile.borrowing_period)
+        if not issue_reservation(transaction, due_date):
+            return Response({'error': 'Reservation already processed or no copy left to issue'}, status=409)
+        RecommendationCache.bump(transaction.user_id)
 
         # ✅ NOW send the borrow success notification (after QR scan)
         from .notification_utils import NotificationManager
@@ -2469,23 +2732,9 @@ def return_book_via_qr(request, transaction_id):
         if transaction.return_date:
             return Response({'error': 'Book already returned'})
 
-        # Calculate fine if overdue
-        today = timezone.now().date()
-        due_date = transaction.due_date.date()
-
-        if today > due_date:
-            days_overdue = (today - due_date).days
-            fine_per_day = 5  # ₹5 per day fine
-            transaction.fine_amount = days_overdue * fine_per_day
-
-        # Update transaction
-        transaction.return_date = timezone.now()
-        transaction.save()
-
-        # Update book available copies
-        book = transaction.book
-        book.available_copies += 1
-        book.save()
+        # Update transaction (and its fine, if overdue) and book available copies
+        if not complete_return(transaction):
+            return Response({'error': 'Book already returned'})
 
         return Response({
             'success': 'Book returned successfully',
@@ -2511,12 +2760,11 @@ def generate_return_qr(request, transaction_id):
         )
         
         # Generate return QR data
-        qr_payload = f"RETURN:{transaction.id}:{transaction.book.id}:{request.user.id}"
-        qr_data = generate_base64_qr(qr_payload)
+        qr_payload = return_qr_payload(transaction)
         
         return Response({
             'success': 'Return QR generated successfully',
-            'qr_data': qr_data,
+            **qr_response_fields(qr_payload),
             'transaction_id': transaction.id,
             'book_title': transaction.book.title,
             'due_date': transaction.due_date.strftime('%Y-%m-%d')
@@ -2609,26 +2857,16 @@ def process_book_return(request):
             return_date__isnull=True
         )
         
-        # Calculate fine
         today = timezone.now().date()
         due_date = transaction.due_date.date()
-        fine_amount = 0
-        
-        if today > due_date:
-            days_overdue = (today - due_date).days
-            fine_per_day = 5
-            fine_amount = days_overdue * fine_per_day
-            transaction.fine_amount = fine_amount
-        
-        # Update transaction
-        transaction.return_date = timezone.now()
-        transaction.status = 'returned'
-        transaction.save()
         
-        # Update book availability
+        # Update transaction (and its fine, if overdue) and book availability
+        if not complete_return(transaction, status='returned'):
+            raise Transaction.DoesNotExist
+        fine_amount = transaction.fine_amount
         book = transaction.book
-        book.available_copies += 1
-        book.save()
+        book.refresh_from_db(fields=['available_copies', 'reserved_copies'])
+        RecommendationCache.bump(transaction.user_id)
         
         # Send notifications
         from .notification_utils import NotificationManager
@@ -2703,14 +2941,9 @@ def process_return(request, return_request_id):
             id=return_request_id, status='pending')
         transaction = return_request.transaction
 
-        # Process return
-        transaction.return_date = timezone.now()
-        transaction.save()
-
-        # Update book availability
-        book = transaction.book
-        book.available_copies += 1
-        book.save()
+        # Process return and update book availability
+        if not complete_return(transaction):
+            return Response({'error': 'Book already returned'}, status=400)
 
         # Mark return request as completed
         return_request.status = 'completed'
@@ -3305,12 +3538,29 @@ def handle_book_rating(request, book_id):
         if not rating_value or not 1 <= int(rating_value) <= 5:
             return Response({'error': 'Rating must be between 1 and 5'}, status=400)
 
-        # Create or update rating
-        rating, created = BookRating.objects.update_or_create(
-            user=request.user,
-            book=book,
-            defaults={'rating': rating_value}
-        )
+        # Create or update rating, keeping Book's aggregates in step
+        rating_value = int(rating_value)
+        with transaction.atomic():
+            # Lock the book row so concurrent ratings apply one at a time
+            Book.objects.select_for_update().only('id').get(id=book.id)
+            rating = BookRating.objects.filter(
+                user=request.user, book=book).first()
+            created = rating is None
+            if created:
+                rating = BookRating.objects.create(
+                    user=request.user, book=book, rating=rating_value)
+                Book.objects.filter(id=book.id).update(
+                    rating_sum=F('rating_sum') + rating_value,
+                    rating_count=F('rating_count') + 1,
+                    updated_at=timezone.now()
+                )
+            elif rating.rating != rating_value:
+                Book.objects.filter(id=book.id).update(
+                    rating_sum=F('rating_sum') + (rating_value - rating.rating),
+                    updated_at=timezone.now()
+                )
+                rating.rating = rating_value
+                rating.save(update_fields=['rating'])
 
         serializer = BookRatingSerializer(rating)
         action = 'added' if created else 'updated'
@@ -3322,8 +3572,15 @@ def handle_book_rating(request, book_id):
     elif request.method == 'DELETE':
         # Delete rating
         try:
-            rating = BookRating.objects.get(user=request.user, book=book)
-            rating.delete()
+            with transaction.atomic():
+                Book.objects.select_for_update().only('id').get(id=book.id)
+                rating = BookRating.objects.get(user=request.user, book=book)
+                Book.objects.filter(id=book.id).update(
+                    rating_sum=F('rating_sum') - rating.rating,
+                    rating_count=F('rating_count') - 1,
+                    updated_at=timezone.now()
+                )
+                rating.delete()
             return Response({'success': 'Rating deleted successfully'})
         except BookRating.DoesNotExist:
             return Response({'error': 'Rating not found'}, status=404)
@@ -3419,13 +3676,13 @@ def get_popular_books(request):
     """
     Get popular books based on ratings
     """
-    from django.db.models import Avg, Count
+    from django.db.models import ExpressionWrapper, FloatField
 
-    popular_books = Book.objects.annotate(
-        avg_rating=Avg('bookrating__rating'),
-        rating_count=Count('bookrating')
-    ).filter(
+    popular_books = Book.objects.filter(
         rating_count__gte=1  # At least one rating
+    ).annotate(
+        avg_rating=ExpressionWrapper(
+            F('rating_sum') * 1.0 / F('rating_count'), output_field=FloatField())
     ).order_by('-avg_rating', '-rating_count')[:10]  # Top 10
 
     serializer = BookSerializer(
@@ -3484,27 +3741,18 @@ def user_reading_dashboard(request):
                 'is_completed': ua.progress >= ua.achievement.requirement
             })
 
-        # Get reading history (last 6 months)
-        from datetime import timedelta
-        from django.db.models import Count
-
-        six_months_ago = timezone.now() - timedelta(days=180)
-        reading_history = Transaction.objects.filter(
-            user=user,
-            return_date__isnull=False,
-            return_date__gte=six_months_ago
-        ).extra({
-            'month': "EXTRACT(month FROM return_date)",
-            'year': "EXTRACT(year FROM return_date)"
-        }).values('year', 'month').annotate(
-            books_read=Count('id')
-        ).order_by('year', 'month')
+        # Get reading history (last 6 months), one bucket per month
+        reading_history = time_series(
+            Transaction.objects.filter(user=user, return_date__isnull=False),
+            'return_date', today - timedelta(days=180), today,
+            'month', books_read=Count('id')
+        )
 
         # Format reading history for charts
         reading_history_data = []
         for entry in reading_history:
             reading_history_data.append({
-                'month': f"{int(entry['month'])}/{int(entry['year'])}",
+                'month': f"{entry['period'].month}/{entry['period'].year}",
                 'books_read': entry['books_read']
             })
 
@@ -3637,122 +3885,51 @@ def check_new_achievements(request):
 @permission_classes([IsAuthenticated])
 def get_user_notifications(request):
     """
-    Get all notifications for the current user - ENHANCED with reservation support
+    Get notifications for the current user, newest first.
+
+    Pages are keyset-paginated on (created_at, id); pass `next_cursor`
+    back as ?cursor= for the following page. ?page_size= (or ?limit=)
+    sets the page length. total_count is cached briefly, so it can lag
+    behind a notification that has just arrived.
     """
     try:
-        # Get page parameters for infinite scroll
-        page = int(request.GET.get('page', 1))
-        page_size = int(request.GET.get('page_size', 20))
-
-        # Get filter parameters
-        status_filter = request.GET.get('status', 'all')
-        
-        # ENHANCED: Handle multiple category parameters for reservation types
-        categories = request.GET.getlist('category')  # Get all category parameters
-        date_filter = request.GET.get('date_range', 'all')
-
-        # Start building the query
-        notifications = Notification.objects.filter(user=request.user)
-
-        # Apply status filter
-        if status_filter == 'unread':
-            notifications = notifications.filter(is_read=False)
-        elif status_filter == 'read':
-            notifications = notifications.filter(is_read=True)
-
-        # ENHANCED: Apply category filter for multiple notification types
-        if categories:
-            # If multiple categories specified, use OR condition
-            category_query = Q()
-            for category in categories:
-                category_query |= Q(notification_type=category)
-            notifications = notifications.filter(category_query)
-
-        # Apply date filter
-        if date_filter != 'all':
-            today = timezone.now().date()
-            if date_filter == 'today':
-                notifications = notifications.filter(created_at__date=today)
-            elif date_filter == 'week':
-                week_ago = today - timedelta(days=7)
-                notifications = notifications.filter(created_at__date__gte=week_ago)
-            elif date_filter == 'month':
-                month_ago = today - timedelta(days=30)
-                notifications = notifications.filter(created_at__date__gte=month_ago)
-
-        # Order by newest first
-        notifications = notifications.order_by('-created_at')
-
-        # Calculate pagination for infinite scroll
-        total_count = notifications.count()
-        total_pages = (total_count + page_size - 1) // page_size
-
-        # Get current page
-        start_index = (page - 1) * page_size
-        end_index = start_index + page_size
-
-        paginated_notifications = notifications[start_index:end_index]
-
-        # Serialize notifications
-        notifications_data = []
-        for notification in paginated_notifications:
-            notification_data = {
-                'id': notification.id,
-                'type': notification.notification_type,
-                'title': notification.title,
-                'message': notification.message,
-                'is_read': notification.is_read,
-                'created_at': notification.created_at,
-                'action_url': notification.action_url,
-                'time_ago': timesince(notification.created_at)
-            }
-            
-            # Add related book information if available
-            if notification.related_book:
-                notification_data['related_book_id'] = notification.related_book.id
-                notification_data['related_book_title'] = notification.related_book.title
-                if notification.related_book.cover_image:
-                    try:
-                        notification_data['related_book_cover'] = request.build_absolute_uri(
-                            notification.related_book.cover_image.url
-                        )
-                    except:
-                        notification_data['related_book_cover'] = None
-                else:
-                    notification_data['related_book_cover'] = None
-            else:
-                notification_data['related_book_id'] = None
-                notification_data['related_book_title'] = None
-                notification_data['related_book_cover'] = None
-            
-            # Add related transaction information if available
-            if notification.related_transaction:
-                notification_data['related_transaction_id'] = notification.related_transaction.id
-            else:
-                notification_data['related_transaction_id'] = None
-                
-            notifications_data.append(notification_data)
-
-        return Response({
-            'notifications': notifications_data,
-            'pagination': {
-                'current_page': page,
-                'page_size': page_size,
-                'total_count': total_count,
-                'total_pages': total_pages,
-                'has_next': page < total_pages
-            },
-            'filters': {
-                'status': status_filter,
-                'categories': categories,
-                'date_range': date_filter
-            }
-        })
+        page_size = int(request.GET.get('page_size', request.GET.get('limit', 20)))
+    except ValueError:
+        return Response({'error': 'page_size must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+    page_size = min(max(page_size, 1), FEED_MAX_PAGE_SIZE)
+
+    cursor = request.GET.get('cursor')
+    status_filter = request.GET.get('status', 'all')
+    # Multiple category parameters are ORed (e.g. all reservation types)
+    categories = request.GET.getlist('category')
+    date_filter = request.GET.get('date_range', 'all')
+    filters = {'status': status_filter, 'categories': categories, 'date_range': date_filter}
 
+    try:
+        notifications_data, next_cursor = get_notification_feed(
+            request.user.id, cursor=cursor, page_size=page_size,
+            media_origin=request.build_absolute_uri('/').rstrip('/'), **filters)
+        total_count = cached_feed_total(
+            request.user.id, notification_feed_queryset(request.user.id, **filters),
+            status_filter, sorted(categories), date_filter)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         logger.error(f"Error fetching notifications: {e}")
         return Response({'error': 'Failed to load notifications'}, status=500)
 
+    return Response({
+        'notifications': notifications_data,
+        'pagination': {
+            'page_size': page_size,
+            'next_cursor': next_cursor,
+            'has_next': next_cursor is not None,
+            'total_count': total_count,
+            'total_is_approximate': True
+        },
+        'filters': filters
+    })
+
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
@@ -3761,10 +3938,9 @@ def mark_notification_read(request, notification_id):
     Mark a notification as read
     """
     try:
-        notification = Notification.objects.get(
-            id=notification_id, user=request.user)
-        notification.is_read = True
-        notification.save()
+        if not mark_notifications_read(request.user.id, [notification_id]):
+            if not Notification.objects.filter(id=notification_id, user=request.user).exists():
+                raise Notification.DoesNotExist
 
         return Response({'success': 'Notification marked as read'})
 
@@ -3782,10 +3958,7 @@ def mark_all_notifications_read(request):
     Mark all notifications as read for the current user
     """
     try:
-        updated_count = Notification.objects.filter(
-            user=request.user,
-            is_read=False
-        ).update(is_read=True)
+        updated_count = mark_notifications_read(request.user.id)
 
         return Response({
             'success': f'Marked {updated_count} notifications as read'
@@ -3801,20 +3974,40 @@ def mark_all_notifications_read(request):
 def get_unread_notification_count(request):
     """
     Get count of unread notifications for the current user
+
+    Served from the maintained counter rather than a COUNT(*).
     """
     try:
-        count = Notification.objects.filter(
-            user=request.user,
-            is_read=False
-        ).count()
-
-        return Response({'unread_count': count})
+        return Response({'unread_count': get_unread_count(request.user.id)})
 
     except Exception as e:
         logger.error(f"Error counting unread notifications: {e}")
         return Response({'error': 'Failed to get notification count'}, status=500)
 
 
+async def notification_stream(request):
+    """
+    Server-Sent Events stream of the current user's new notifications,
+    unread count and reservation changes, replacing the bell's polling.
+
+    Needs an ASGI server to hold connections open; under WSGI it sends
+    the current counts and asks the client to reconnect later.
+    """
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+
+    if isinstance(request, ASGIRequest):
+        content = event_stream(user.id)
+    else:
+        content = snapshot_messages(await stream_counts(user.id))
+    response = StreamingHttpResponse(content, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @api_view(['GET', 'PUT'])
 @permission_classes([IsAuthenticated])
 def notification_preferences(request):
@@ -3906,11 +4099,8 @@ def bulk_mark_notifications_read(request):
         if not notification_ids:
             return Response({'error': 'No notification IDs provided'}, status=400)
 
-        # Update notifications
-        updated_count = Notification.objects.filter(
-            id__in=notification_ids,
-            user=request.user
-        ).update(is_read=True)
+        # Only notifications that were unread count as updated
+        updated_count = mark_notifications_read(request.user.id, notification_ids)
 
         return Response({
             'success': f'Marked {updated_count} notifications as read',
@@ -3934,11 +4124,7 @@ def bulk_delete_notifications(request):
         if not notification_ids:
             return Response({'error': 'No notification IDs provided'}, status=400)
 
-        # Delete notifications
-        deleted_count, _ = Notification.objects.filter(
-            id__in=notification_ids,
-            user=request.user
-        ).delete()
+        deleted_count = delete_notifications(request.user.id, notification_ids)
 
         return Response({
             'success': f'Deleted {deleted_count} notifications',
@@ -3966,7 +4152,8 @@ def bulk_archive_notifications(request):
         updated_count = Notification.objects.filter(
             id__in=notification_ids,
             user=request.user
-        ).update(is_read=True)
+        ).count()
+        mark_notifications_read(request.user.id, notification_ids)
 
         return Response({
             'success': f'Archived {updated_count} notifications',
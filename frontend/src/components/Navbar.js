@@ -4,6 +4,7 @@ import { Link } from 'react-router-dom';
 import './Navbar.css';
 import NotificationBell from './NotificationBell';
 import PermissionWrapper from './Security/PermissionWrapper';
+import useNotificationStream from '../hooks/useNotificationStream';
 
 const Navbar = ({ user, onLogout }) => {
   const [isSidebarVisible, setIsSidebarVisible] = useState(false);
@@ -15,6 +16,11 @@ const Navbar = ({ user, onLogout }) => {
     }
   }, [user]);
 
+  // Reservation changes (including expiry) are pushed by the server
+  useNotificationStream({
+    reservation_count: ({ count }) => setReservationsCount(count),
+  }, Boolean(user));
+
   const fetchReservationsCount = async () => {
     try {
       const response = await fetch('http://localhost:8000/api/user/reservations/count/', {
@@ -1,6 +1,7 @@
 // frontend/src/components/NotificationBell.js
 import React, { useState, useEffect, useRef } from 'react';
 import { useNavigate } from 'react-router-dom';
+import useNotificationStream from '../hooks/useNotificationStream';
 
 const NotificationBell = () => {
   const [notifications, setNotifications] = useState([]);
@@ -62,9 +63,11 @@ const NotificationBell = () => {
         const newNotifications = data.notifications || [];
         setNotifications(newNotifications);
         
-        // Calculate unread count
-        const unread = newNotifications.filter(n => !n.is_read).length;
-        setUnreadCount(unread);
+        // The stream sends the real unread count; estimate it only when polling
+        if (!streaming) {
+          const unread = newNotifications.filter(n => !n.is_read).length;
+          setUnreadCount(unread);
+        }
       }
     } catch (error) {
       console.error('Error fetching notifications:', error);
@@ -73,13 +76,23 @@ const NotificationBell = () => {
     }
   };
 
+  // New notifications and unread counts are pushed by the server
+  const streaming = useNotificationStream({
+    notification: (notification) => {
+      setNotifications(prev => [notification, ...prev].slice(0, 5));
+    },
+    unread_count: ({ count }) => setUnreadCount(count),
+    resync: () => fetchNotifications(),
+  });
+
   useEffect(() => {
     fetchNotifications();
-    
-    // Refresh notifications every 30 seconds
+
+    // Without EventSource, fall back to refreshing every 30 seconds
+    if (streaming) return undefined;
     const interval = setInterval(fetchNotifications, 30000);
     return () => clearInterval(interval);
-  }, []);
+  }, [streaming]);
 
   // Play sound when new notifications arrive - IMPROVED LOGIC
   useEffect(() => {
@@ -22,7 +22,7 @@ const NotificationsPage = ({ user }) => {
     const [notifications, setNotifications] = useState([]);
     const [loading, setLoading] = useState(false);
     const [hasMore, setHasMore] = useState(true);
-    const [page, setPage] = useState(1);
+    const [nextCursor, setNextCursor] = useState(null);
     const [selectedNotifications, setSelectedNotifications] = useState([]);
     const [filters, setFilters] = useState({
         status: 'all',
@@ -101,9 +101,8 @@ const NotificationsPage = ({ user }) => {
     };
 
     // Build API URL with filters
-    const buildApiUrl = (pageNum = 1) => {
+    const buildApiUrl = (cursor = null) => {
         const params = new URLSearchParams({
-            page: pageNum,
             page_size: 20,
             status: filters.status,
             date_range: filters.date_range
@@ -120,17 +119,21 @@ const NotificationsPage = ({ user }) => {
             }
         }
 
+        if (cursor) {
+            params.append('cursor', cursor);
+        }
+
         return `http://localhost:8000/api/notifications/?${params}`;
     };
 
     // Fetch notifications with filters
-    const fetchNotifications = useCallback(async (pageNum = 1, append = false) => {
+    const fetchNotifications = useCallback(async (cursor = null, append = false) => {
         if (loading) return;
 
         setLoading(true);
         try {
             const response = await fetch(
-                buildApiUrl(pageNum),
+                buildApiUrl(cursor),
                 { credentials: 'include' }
             );
 
@@ -144,7 +147,7 @@ const NotificationsPage = ({ user }) => {
                 }
 
                 setHasMore(data.pagination.has_next);
-                setPage(pageNum);
+                setNextCursor(data.pagination.next_cursor);
             }
         } catch (error) {
             console.error('Error fetching notifications:', error);
@@ -156,10 +159,10 @@ const NotificationsPage = ({ user }) => {
     // Reset and fetch when filters change
     useEffect(() => {
         setNotifications([]);
-        setPage(1);
+        setNextCursor(null);
         setHasMore(true);
         setSelectedNotifications([]);
-        fetchNotifications(1);
+        fetchNotifications();
     }, [filters]);
 
     // Infinite scroll handler
@@ -169,9 +172,9 @@ const NotificationsPage = ({ user }) => {
             return;
         }
         if (!loading && hasMore) {
-            fetchNotifications(page + 1, true);
+            fetchNotifications(nextCursor, true);
         }
-    }, [loading, hasMore, page, fetchNotifications]);
+    }, [loading, hasMore, nextCursor, fetchNotifications]);
 
     // Add scroll event listener
     useEffect(() => {
@@ -251,7 +254,7 @@ const NotificationsPage = ({ user }) => {
                 alert(`✅ ${result.success}`);
 
                 if (action === 'delete' && notifications.length === selectedNotifications.length) {
-                    fetchNotifications(1);
+                    fetchNotifications();
                 }
             } else {
                 const error = await response.json();
@@ -14,10 +14,25 @@ const ReportGeneration = () => {
             if (startDate) params.append('start_date', startDate);
             if (endDate) params.append('end_date', endDate);
 
-            const response = await fetch(`http://localhost:8000/api/admin/reports/pdf/?${params}`, {
+            let response = await fetch(`http://localhost:8000/api/admin/reports/pdf/?${params}`, {
                 credentials: 'include',
             });
 
+            // Reports are rendered in the background: poll the job until its PDF is ready
+            if (response.status === 202) {
+                let job = await response.json();
+                while (job.status === 'pending' || job.status === 'running') {
+                    await new Promise((resolve) => setTimeout(resolve, 2000));
+                    const statusResponse = await fetch(job.status_url, { credentials: 'include' });
+                    if (!statusResponse.ok) break;
+                    job = await statusResponse.json();
+                }
+                if (job.status !== 'done') {
+                    throw new Error(job.error || 'Report generation failed');
+                }
+                response = await fetch(job.download_url, { credentials: 'include' });
+            }
+
             if (response.ok) {
                 // Create a blob from the PDF stream
                 const blob = await response.blob();
@@ -0,0 +1,60 @@
+import { useEffect, useRef } from 'react';
+
+const STREAM_URL = 'http://localhost:8000/api/notifications/stream/';
+const STREAM_EVENTS = ['notification', 'unread_count', 'reservation', 'reservation_count', 'resync'];
+
+// One EventSource per tab, shared by every component using the hook
+let source = null;
+const listeners = new Set();
+
+const dispatch = (type) => (event) => {
+    const data = JSON.parse(event.data);
+    listeners.forEach(listener => listener(type, data));
+};
+
+const connect = () => {
+    if (source || typeof EventSource === 'undefined') {
+        return;
+    }
+    source = new EventSource(STREAM_URL, { withCredentials: true });
+    STREAM_EVENTS.forEach(type => source.addEventListener(type, dispatch(type)));
+};
+
+const disconnect = () => {
+    if (source && listeners.size === 0) {
+        source.close();
+        source = null;
+    }
+};
+
+/**
+ * Subscribe to pushed notification events ({ notification, unread_count,
+ * reservation, reservation_count, resync }: handler(data)). Returns false
+ * when the browser has no EventSource, so callers can fall back to polling.
+ */
+const useNotificationStream = (handlers, enabled = true) => {
+    const handlersRef = useRef(handlers);
+    handlersRef.current = handlers;
+
+    useEffect(() => {
+        if (!enabled) {
+            return undefined;
+        }
+        const listener = (type, data) => {
+            const handler = handlersRef.current[type];
+            if (handler) {
+                handler(data);
+            }
+        };
+        listeners.add(listener);
+        connect();
+        return () => {
+            listeners.delete(listener);
+            disconnect();
+        };
+    }, [enabled]);
+
+    return typeof EventSource !== 'undefined';
+};
+
+export default useNotificationStream;